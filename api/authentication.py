@@ -0,0 +1,123 @@
+"""
+Token authentication for the mobile API that does not hit the database on
+every request.
+
+The token -> user mapping (with role and employee id) is cached in the shared
+cache for API_TOKEN_CACHE_TTL seconds and in process memory for
+CACHE_L1_TTL seconds. Entries are dropped on logout (token deletion) and
+whenever the user is saved, e.g. deactivated. Dropping only reaches other
+processes through a shared cache, so when the shared cache is per-process
+memory (development) every request checks the database instead.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from main_app.cache_utils import local_cache, shared_cache_is_local
+from main_app.models import CustomUser
+
+# Loaded on the cached user; anything else is fetched lazily on first access
+CACHED_USER_FIELDS = (
+    'id', 'email', 'first_name', 'last_name', 'user_type',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+# Saves touching only these fields do not change what the cache holds
+_ACTIVITY_FIELDS = {'is_online', 'last_seen', 'last_login'}
+
+
+def _token_cache_key(key):
+    # Never put the raw token into cache keys
+    return f"auth_token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def invalidate_token(key):
+    cache_key = _token_cache_key(key)
+    cache.delete(cache_key)
+    local_cache().delete(cache_key)
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def _field_order():
+    # from_db() expects values in the model's concrete field order
+    return [field.attname for field in CustomUser._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+
+
+def _load(key):
+    """Cacheable description of the token's user, or None for an unknown token"""
+    token = Token.objects.select_related('user', 'user__employee').filter(key=key).first()
+    if token is None:
+        return None
+    user = token.user
+    employee = getattr(user, 'employee', None)
+    return {
+        'fields': [getattr(user, field) for field in _field_order()],
+        'employee_id': employee.id if employee else None,
+    }
+
+
+def _build_user(entry):
+    """A CustomUser with only CACHED_USER_FIELDS loaded; save() writes just those"""
+    user = CustomUser.from_db(connection.alias, _field_order(), entry['fields'])
+    user.employee_id = entry['employee_id']
+    return user
+
+
+def _cached_entry(key):
+    """``_load(key)`` through the process and shared caches"""
+    cache_key = _token_cache_key(key)
+    l1 = local_cache()
+    entry = l1.get(cache_key)
+    if entry is None:
+        entry = cache.get(cache_key)
+        if entry is None:
+            entry = _load(key)
+            if entry is None:
+                return None
+            cache.set(cache_key, entry, getattr(settings, 'API_TOKEN_CACHE_TTL', 300))
+        l1.set(cache_key, entry, getattr(settings, 'CACHE_L1_TTL', 5))
+    return entry
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in for TokenAuthentication. ``request.user.employee_id`` is set for
+    employees (None otherwise) so views can skip the Employee lookup.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = _load(key) if shared_cache_is_local() else _cached_entry(key)
+        if entry is None:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        user = _build_user(entry)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        token = Token(key=key, user_id=user.id)
+        token._state.adding = False
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def drop_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+def drop_user_tokens(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and set(update_fields) <= _ACTIVITY_FIELDS:
+        return
+    invalidate_user_tokens(instance.pk)
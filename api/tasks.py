@@ -1,8 +1,10 @@
 from celery import shared_task
-from services.ai_processor import AITextProcessor
+from services.ai_processor import AIBatchProcessor, AITextProcessor
 from main_app.models import JobCardAction, StaffScoresDaily, Employee
 from datetime import datetime, timedelta
 from django.db.models import Sum, Count
+from django.utils import timezone
+from main_app.date_utils import day_q
 
 
 @shared_task
@@ -18,12 +20,23 @@ def process_field_report(jobcard_action_id):
         return {'status': 'error', 'message': str(e)}
 
 
+@shared_task
+def process_pending_field_reports():
+    """
+    Process queued field reports in batches with concurrent AI extraction,
+    after requeueing reports left PROCESSING by a worker that died
+    """
+    requeued = AIBatchProcessor.requeue_stale()
+    processed = AIBatchProcessor().run()
+    return f"Processed {processed} field reports ({requeued} stale claims requeued)"
+
+
 @shared_task
 def calculate_daily_scores():
     """
     Calculate daily performance scores for all staff
     """
-    today = datetime.now().date()
+    today = timezone.localdate()
     yesterday = today - timedelta(days=1)
     
     # Get all active employees
@@ -31,22 +44,18 @@ def calculate_daily_scores():
     
     for employee in employees:
         # Calculate yesterday's performance
-        jobs_completed = JobCardAction.objects.filter(
+        jobs_completed = JobCardAction.objects.for_day(yesterday).filter(
             actor=employee.admin,
-            timestamp__date=yesterday,
             action='COMPLETE'
         ).count()
         
-        orders_count = employee.order_set.filter(
-            created_at__date=yesterday
-        ).count()
+        orders_count = employee.order_set.for_day(yesterday).count()
         
-        bales_total = employee.order_set.filter(
-            created_at__date=yesterday
-        ).aggregate(total=Sum('total_bales'))['total'] or 0
+        bales_total = employee.order_set.for_day(yesterday).aggregate(
+            total=Sum('total_bales')
+        )['total'] or 0
         
-        payments_count = employee.admin.communicationlog_set.filter(
-            timestamp__date=yesterday,
+        payments_count = employee.admin.communicationlog_set.for_day(yesterday).filter(
             body__icontains='payment'
         ).count()
         
@@ -136,19 +145,18 @@ def send_daily_notifications():
     """
     from main_app.models import Notification
     
-    today = datetime.now().date()
+    today = timezone.localdate()
     
     # Get all employees with pending tasks
     employees = Employee.objects.filter(
-        jobcard__status__in=['PENDING', 'IN_PROGRESS'],
-        jobcard__due_at__date=today
+        day_q('jobcard__due_date', today),
+        jobcard__status__in=['PENDING', 'IN_PROGRESS']
     ).distinct()
     
     sent_count = 0
     for employee in employees:
-        pending_count = employee.jobcard_set.filter(
-            status__in=['PENDING', 'IN_PROGRESS'],
-            due_at__date=today
+        pending_count = employee.jobcard_set.for_day(today).filter(
+            status__in=['PENDING', 'IN_PROGRESS']
         ).count()
         
         if pending_count > 0:
@@ -177,8 +185,71 @@ def sync_google_drive_data():
 @shared_task
 def process_whatsapp_messages():
     """
-    Process incoming WhatsApp messages (placeholder for future implementation)
+    Drain the inbound webhook inbox (WhatsApp and email) in batches
     """
-    # This would process WhatsApp webhook messages
-    # For now, just return a placeholder
-    return "WhatsApp messages processed (placeholder)"
+    from services.inbound_processor import InboundMessageProcessor
+
+    processed = InboundMessageProcessor().drain()
+    return f"Processed {processed} inbound messages"
+
+
+@shared_task
+def run_export_job(job_id):
+    """
+    Write one background export (see services.exports) to storage
+    """
+    from services.exports import run_export_job as run_job
+
+    job = run_job(job_id)
+    if job is None:
+        return f"Export job {job_id} already claimed"
+    return f"Export job {job.id} {job.status.lower()}: {job.row_count} rows"
+
+
+@shared_task
+def run_pending_exports():
+    """
+    Run export jobs that were never handed to a worker
+    """
+    from services.exports import run_pending_exports as run_pending
+
+    return f"Ran {run_pending()} pending export jobs"
+
+
+@shared_task
+def flush_gps_buffer():
+    """
+    Write buffered GPS fixes (see services.gps_ingest) that no flusher process has taken yet
+    """
+    from services.gps_ingest import GPSBufferFlusher
+
+    return f"Flushed {GPSBufferFlusher().drain(max_batches=100)} GPS fixes"
+
+
+@shared_task
+def clean_gps_tracks(day=None, employee_ids=None):
+    """
+    Smooth GPS tracks and store route summaries (see services.track_cleaning)
+    for ``day``, or for today and yesterday
+    """
+    from services.track_cleaning import clean_days
+
+    if day:
+        days = [datetime.strptime(day, '%Y-%m-%d').date()]
+    else:
+        today = timezone.localdate()
+        days = [today - timedelta(days=1), today]
+    cleaned = sum(clean_days(target, employee_ids) for target in days)
+    return f"Cleaned {cleaned} GPS routes"
+
+
+@shared_task
+def geocode_customers(limit=None):
+    """
+    Look up coordinates for customers with an address but no location
+    (see services.geocoding)
+    """
+    from services.geocoding import geocode_pending
+
+    found, tried = geocode_pending(limit)
+    return f"Geocoded {found} of {tried} customers"
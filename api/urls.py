@@ -33,6 +33,9 @@ urlpatterns = [
     # Triggers
     path('integrations/gdrive/sync/', views.trigger_gdrive_sync, name='api_gdrive_sync'),
     path('integrations/whatsapp/process/', views.trigger_whatsapp_processing, name='api_whatsapp_process'),
+
+    # Monitoring
+    path('ai/metrics/', views.ai_pipeline_metrics, name='api_ai_metrics'),
     
     # ViewSets
     path('', include(router.urls)),
@@ -5,6 +5,7 @@ from rest_framework.authtoken.models import Token
 from django.contrib.auth import login
 from django.utils import timezone
 from django.db.models import Q, Sum, Count
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 from main_app.models import (
     CustomUser, Employee, Customer, JobCard, JobCardAction,
@@ -18,6 +19,10 @@ from .serializers import (
     PaymentSerializer, CommunicationLogSerializer,
     NotificationSerializer, ItemSerializer
 )
+from main_app.cache_utils import get_or_compute
+from .authentication import invalidate_token
+from services import reference_data
+from services.inbound_processor import enqueue_inbound
 import json
 
 def _point_in_polygon(point, polygon):
@@ -67,7 +72,10 @@ def logout_api(request):
     Mobile app logout endpoint
     """
     try:
-        request.user.auth_token.delete()
+        token = request.user.auth_token
+        key = token.key
+        token.delete()
+        invalidate_token(key)
         return Response({'message': 'Logged out successfully'})
     except:
         return Response({'error': 'Error logging out'}, status=status.HTTP_400_BAD_REQUEST)
@@ -239,9 +247,9 @@ class JobCardViewSet(viewsets.ModelViewSet):
             jobcard.status = request.data['status']
             jobcard.save()
         
-        # Trigger AI processing for the note text
-        from .tasks import process_field_report
-        process_field_report.delay(action.id)
+        # Queue the note text for batched AI processing
+        from services.ai_processor import queue_field_reports
+        queue_field_reports([action])
         
         return Response({
             'message': 'Task updated successfully',
@@ -307,9 +315,8 @@ def dashboard_stats(request):
     today = timezone.now().date()
     
     # Today's tasks
-    today_tasks = JobCard.objects.filter(
-        assigned_to=employee,
-        due_at__date=today
+    today_tasks = JobCard.objects.for_day(today).filter(
+        assigned_to=employee
     )
     
     # This month's performance
@@ -343,8 +350,12 @@ def dashboard_stats(request):
 @api_view(['GET'])
 def cities_list(request):
     """Get list of cities for working location selection"""
-    cities = City.objects.all().order_by('name')
-    return Response(CitySerializer(cities, many=True).data)
+    data = get_or_compute(
+        reference_data.CACHE_NAMESPACE, ('api_cities',),
+        lambda: list(CitySerializer(reference_data.cities(), many=True).data),
+        reference_data.REFERENCE_TTL,
+    )
+    return Response(data)
 
 
 @api_view(['GET'])
@@ -360,69 +371,29 @@ def notifications_list(request):
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def whatsapp_webhook(request):
-    """Inbound WhatsApp webhook handler (placeholder)."""
+    """Inbound WhatsApp webhook: store the payload and acknowledge immediately."""
+    if not isinstance(request.data, Mapping):
+        return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
     from_phone = request.data.get('from') or request.data.get('From')
-    body = request.data.get('body') or request.data.get('Body') or ''
-
-    # Try to match customer/contact by phone
-    customer = None
-    if from_phone:
-        customer = Customer.objects.filter(
-            Q(phone_primary__icontains=from_phone)
-        ).first()
-        if not customer:
-            contact = Customer.objects.filter(contacts__phone__icontains=from_phone).first()
-            if contact:
-                customer = contact
-
-    # Log communication
-    CommunicationLog.objects.create(
-        channel='WHATSAPP',
-        direction='IN',
-        customer=customer,
-        user=None,
-        subject='WhatsApp Message',
-        body=body,
-        linkages={'from': from_phone}
-    )
+    if not from_phone:
+        return Response({'error': 'Missing sender'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Notify owner if exists
-    if customer and customer.owner_staff:
-        Notification.objects.create(
-            user=customer.owner_staff.admin,
-            channel='PUSH',
-            title='New WhatsApp message',
-            message=f'Incoming WhatsApp from {from_phone} for customer {customer.name}',
-            sent_at=timezone.now()
-        )
+    # Customer matching, logging and notifications happen in process_whatsapp_messages
+    enqueue_inbound('WHATSAPP', request.data)
     return Response({'status': 'received'})
 
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def email_inbound(request):
-    """Inbound Email webhook handler (placeholder)."""
+    """Inbound Email webhook: store the payload and acknowledge immediately."""
+    if not isinstance(request.data, Mapping):
+        return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
     sender = request.data.get('from') or request.data.get('sender')
-    to = request.data.get('to')
-    subject = request.data.get('subject', '')
-    body = request.data.get('body', '')
-
-    # Try to match customer by email
-    customer = None
-    if sender:
-        customer = Customer.objects.filter(email__iexact=sender).first()
-        if not customer:
-            customer = Customer.objects.filter(contacts__email__iexact=sender).first()
-
-    CommunicationLog.objects.create(
-        channel='EMAIL',
-        direction='IN',
-        customer=customer,
-        user=None,
-        subject=subject,
-        body=body,
-        linkages={'from': sender, 'to': to}
-    )
+    if not sender:
+        return Response({'error': 'Missing sender'}, status=status.HTTP_400_BAD_REQUEST)
+
+    enqueue_inbound('EMAIL', request.data)
     return Response({'status': 'received'})
 
 
@@ -433,6 +404,17 @@ def trigger_gdrive_sync(request):
     return Response({'status': 'queued'})
 
 
+@api_view(['GET'])
+def ai_pipeline_metrics(request):
+    """
+    Field report pipeline throughput (reports/sec, model latency percentiles, hit rates)
+    """
+    if request.user.user_type != '1':
+        return Response({'error': 'Only admins can view AI metrics'}, status=status.HTTP_403_FORBIDDEN)
+    from services.ai_processor import AIPipelineMetrics
+    return Response(AIPipelineMetrics.snapshot())
+
+
 @api_view(['POST'])
 def trigger_whatsapp_processing(request):
     from .tasks import process_whatsapp_messages
@@ -32,6 +32,30 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.sync_google_drive_data',
         'schedule': 60.0 * 60.0 * 24.0,  # Daily
     },
+    'process-inbound-messages': {
+        'task': 'api.tasks.process_whatsapp_messages',
+        'schedule': 30.0,  # Safety net for drains the webhooks could not schedule
+    },
+    'process-field-reports': {
+        'task': 'api.tasks.process_pending_field_reports',
+        'schedule': 60.0,  # Every minute
+    },
+    'run-pending-exports': {
+        'task': 'api.tasks.run_pending_exports',
+        'schedule': 120.0,  # Picks up export jobs that could not be queued
+    },
+    'flush-gps-buffer': {
+        'task': 'api.tasks.flush_gps_buffer',
+        'schedule': 10.0,  # Safety net for the flush_gps_buffer process
+    },
+    'clean-gps-tracks': {
+        'task': 'api.tasks.clean_gps_tracks',
+        'schedule': 60.0 * 60.0,  # Hourly: smoothed tracks and route summaries for today and yesterday
+    },
+    'geocode-customers': {
+        'task': 'api.tasks.geocode_customers',
+        'schedule': 60.0 * 60.0,  # Hourly: customers whose address could not be geocoded when saved
+    },
 }
 
 app.conf.timezone = 'UTC'
@@ -76,11 +76,12 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main_app.middleware.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
     # Third Part Middleware
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'main_app.middleware.StaticFilesMiddleware',
 
     # My Middleware
     'main_app.middleware.LoginCheckMiddleWare',
@@ -111,13 +112,47 @@ ASGI_APPLICATION = 'axpect_tech_config.asgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Database
+# DATABASE_URL points at the primary. Connections are kept open for
+# DB_CONN_MAX_AGE seconds and checked before reuse. Set DB_PGBOUNCER=1 when
+# DATABASE_URL goes through pgbouncer in transaction pooling mode.
+# DATABASE_REPLICA_URL adds a read replica for dashboards, analytics and
+# exports (see main_app.db_routing).
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes')
+
+
+def _database(url, **options):
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_MAX_AGE > 0,
+        # Server-side cursors do not survive transaction pooling outside a transaction
+        disable_server_side_cursors=DB_PGBOUNCER,
+    )
+    if config['ENGINE'] == 'django.db.backends.postgresql':
+        config.setdefault('OPTIONS', {}).setdefault('connect_timeout', 5)
+    config.update(options)
+    return config
+
+
 # Use SQLite for local development if DATABASE_URL is not properly configured
 try:
     database_url = os.environ.get("DATABASE_URL")
     if database_url and not database_url.startswith("postgres://USER:PASSWORD"):
         DATABASES = {
-            "default": dj_database_url.parse(database_url)
+            "default": _database(database_url)
         }
+        replica_url = os.environ.get("DATABASE_REPLICA_URL")
+        if replica_url:
+            DATABASES["replica"] = _database(replica_url, TEST={'MIRROR': 'default'})
+        if DB_PGBOUNCER:
+            # Exports stream through server-side cursors opened inside a
+            # transaction, which transaction pooling supports
+            DATABASES["streaming"] = dict(
+                DATABASES.get("replica", DATABASES["default"]),
+                DISABLE_SERVER_SIDE_CURSORS=False, TEST={'MIRROR': 'default'},
+            )
     else:
         # Fallback to SQLite for local development
         DATABASES = {
@@ -135,6 +170,10 @@ except Exception:
         }
     }
 
+DATABASE_ROUTERS = ['main_app.db_routing.PrimaryReplicaRouter']
+# Seconds a user reads from the primary after writing, to cover replication lag
+DATABASE_REPLICA_LAG = int(os.environ.get('DATABASE_REPLICA_LAG', 10))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 if not DEBUG:
@@ -200,16 +239,12 @@ EMAIL_USE_TLS = True
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
-# Comment out for local development
-# prod_db = dj_database_url.config(conn_max_age=500)
-# DATABASES['default'].update(prod_db)
-
 # -----------------------------
 # REST Framework Configuration
 # -----------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -217,6 +252,8 @@ REST_FRAMEWORK = {
     ],
 }
 
+API_TOKEN_CACHE_TTL = 300  # seconds a token -> user mapping is trusted without a query
+
 # -----------------------------
 # CORS Configuration
 # -----------------------------
@@ -232,6 +269,100 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Inbound webhook inbox (WhatsApp / email)
+INBOUND_BATCH_SIZE = int(os.environ.get('INBOUND_BATCH_SIZE', 500))
+INBOUND_DRAIN_DELAY = 2  # seconds to coalesce a burst into one drain task
+
+# -----------------------------
+# Cache Configuration
+# -----------------------------
+# "default" is the shared L2 that every process must see: namespace versions,
+# single-flight locks, replica pins, GPS filter state and token revocation all
+# live there. It is Redis - REDIS_CACHE_URL, else REDIS_URL, else the Celery
+# broker. CACHE_BACKEND / CACHE_LOCATION override it explicitly, e.g.
+# CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache for development
+# with a single process.
+# "local" is the per-process L1 that main_app.cache_utils keeps in front of it.
+REDIS_CACHE_URL = (os.environ.get('REDIS_CACHE_URL') or os.environ.get('REDIS_URL')
+                   or CELERY_BROKER_URL)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', '')
+if CACHE_BACKEND:
+    _shared_cache = {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'axpect-shared'),
+    }
+else:
+    _shared_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+    }
+CACHES = {
+    'default': {**_shared_cache, 'KEY_PREFIX': 'axpect', 'TIMEOUT': 300},
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'axpect-l1',
+        'TIMEOUT': 5,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+CACHE_L1_TTL = 5  # seconds a value may be served from process memory
+CACHE_L1_VERSION_TTL = 2  # seconds another process may take to see a namespace bump
+CACHE_LOCK_TIMEOUT = 30  # single-flight recompute lock
+CACHE_LOCK_WAIT = 2  # how long callers wait for another process's recompute
+LIVE_LOCATION_CACHE_TTL = 900  # latest position per employee for the live location endpoints
+
+# GPS ingest buffer (services.gps_ingest). A Redis stream, on
+# GPS_BUFFER_REDIS_URL, else REDIS_URL, else the Celery broker. GPS_BUFFER=memory
+# selects a per-process queue instead, which loses buffered fixes on restart:
+# for development only.
+GPS_BUFFER = os.environ.get('GPS_BUFFER', 'redis')
+GPS_BUFFER_REDIS_URL = (os.environ.get('GPS_BUFFER_REDIS_URL') or os.environ.get('REDIS_URL')
+                        or CELERY_BROKER_URL)
+GPS_BUFFER_BATCH_SIZE = int(os.environ.get('GPS_BUFFER_BATCH_SIZE', 500))  # fixes per bulk insert
+GPS_BUFFER_FLUSH_MS = int(os.environ.get('GPS_BUFFER_FLUSH_MS', 500))  # longest a fix waits for its batch
+GPS_BUFFER_MAX_PENDING = int(os.environ.get('GPS_BUFFER_MAX_PENDING', 50000))  # back-pressure threshold
+GPS_BUFFER_CLAIM_IDLE_MS = 30000  # unacknowledged fixes are replayed after this long
+GPS_BUFFER_RETRY_AFTER = 5  # seconds devices are told to wait when the buffer is full
+GPS_INGEST_CONTEXT_TTL = 300
+# Ingest filter (services.gps_filter): which fixes are worth storing
+GPS_MIN_DISPLACEMENT_M = int(os.environ.get('GPS_MIN_DISPLACEMENT_M', 15))
+GPS_MIN_INTERVAL_S = int(os.environ.get('GPS_MIN_INTERVAL_S', 60))  # a stationary device is still stored this often
+GPS_MAX_ACCURACY_M = int(os.environ.get('GPS_MAX_ACCURACY_M', 100))
+GPS_IDEMPOTENCY_TTL = 86400  # how long (device, client timestamp) pairs are remembered
+GPS_MAX_BATCH_FIXES = 500
+# Track cleaning (services.track_cleaning): outlier gates and Kalman filter tuning
+GPS_MAX_SPEED_KMH = 200
+GPS_MAX_ACCELERATION_MS2 = 10
+GPS_KALMAN_ACCEL_NOISE = 1.5  # m/s^2, how sharply the filter expects speed to change
+GPS_KALMAN_RESET_S = 600  # the filter restarts after a gap this long
+GPS_KALMAN_MAX_REJECTS = 5  # ... or after this many outliers in a row
+GPS_CLEAN_DELAY = 30  # seconds after checkout before the day is cleaned
+# Stop detection and visit matching (services.dwell)
+GPS_STOP_RADIUS_M = 50  # fixes this close to a cluster's centre belong to it
+GPS_STOP_MIN_DWELL_S = 300  # shorter clusters are not stops
+GPS_STOP_MIN_FIXES = 3
+GPS_STOP_MAX_GAP_S = 1800  # a longer silence ends a stop
+GPS_STOP_MAX_NOISE = 2  # stray fixes in a row tolerated inside a stop
+GPS_VISIT_RADIUS_M = 150  # a stop this close to a customer's location is a visit
+# Customer geocoding (services.geocoding). Google's Geocoding API when
+# GOOGLE_MAPS_API_KEY is set, otherwise the Nominatim server at GEOCODING_URL.
+# Addresses are sent to that third party, so geocoding is off unless a
+# provider is configured or GEOCODING_ENABLED opts in (the public Nominatim
+# server when GEOCODING_URL is empty).
+GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', '')
+GEOCODING_URL = os.environ.get('GEOCODING_URL', '')
+GEOCODING_ENABLED = os.environ.get(
+    'GEOCODING_ENABLED', 'true' if GOOGLE_MAPS_API_KEY or GEOCODING_URL else 'false'
+).lower() in ('1', 'true', 'yes')
+GEOCODING_USER_AGENT = os.environ.get('GEOCODING_USER_AGENT', 'axpect-sms')
+GEOCODING_MIN_INTERVAL_S = 1  # across all processes; Nominatim's usage policy allows one request per second
+GEOCODING_BATCH_SIZE = 200  # customers per run
+GEOCODING_RETRY_DAYS = 7  # addresses that were not found are retried after this long
+# Customer location index (services.customer_locations)
+CUSTOMER_INDEX_SYNC_S = 5  # how stale the in-memory index may get
+CUSTOMER_INDEX_REBUILD_S = 3600
+NEARBY_CUSTOMERS_RADIUS_M = 2000  # default search radius for nearby customers
+
 # -----------------------------
 # Channels (WebSockets) Configuration
 # -----------------------------
@@ -248,3 +379,10 @@ CHANNEL_LAYERS = {
 # AI / OpenAI Configuration
 # -----------------------------
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+
+# Batched field report processing
+AI_BATCH_SIZE = int(os.environ.get('AI_BATCH_SIZE', 50))
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 4))  # parallel OpenAI calls per worker
+AI_RESULT_CACHE_TTL = 60 * 60 * 24 * 7
+AI_RULES_CONFIDENCE_THRESHOLD = 0.8  # rule engine results at or above this skip the model
+AI_CLAIM_TIMEOUT_S = 900  # PROCESSING logs claimed longer ago than this are requeued
@@ -16,12 +16,15 @@ admin.site.register(Department)
 admin.site.register(City)
 admin.site.register(Customer)
 admin.site.register(CustomerContact)
+admin.site.register(ContactIdentity)
 admin.site.register(Item)
 admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(JobCard)
 admin.site.register(JobCardAction)
 admin.site.register(CommunicationLog)
+admin.site.register(InboundMessage)
+admin.site.register(ExportJob)
 admin.site.register(Targets)
 
 # Additional PRD models
@@ -64,4 +67,6 @@ admin.site.register(GPSTrack)
 admin.site.register(GPSCheckIn)
 admin.site.register(EmployeeGeofence)
 admin.site.register(GPSRoute)
-admin.site.register(GPSSession)
\ No newline at end of file
+admin.site.register(GPSSession)
+admin.site.register(GPSStop)
+admin.site.register(JobCardVisit)
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Helpers for namespaced, versioned cache keys, and a two-tier read-through
+cache on top of them.
+
+The shared cache ("default", Redis in production) is L2. A per-process
+local-memory cache ("local") is L1 and absorbs repeated reads for a few
+seconds. A namespace is invalidated by bumping its version; the bump is
+visible immediately in the bumping process and within CACHE_L1_VERSION_TTL
+seconds everywhere else.
+
+The shared cache is an optimisation, never a dependency: when it is
+unreachable, reads fall back to L1 or to recomputing and invalidations are
+skipped (logged), so model saves keep working during an outage.
+"""
+import functools
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models.signals import post_delete, post_save
+
+try:
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - only the Redis backend raises these
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+# What a shared cache backend raises when its server is unreachable
+CACHE_ERRORS = (RedisError, OSError)
+
+
+def local_cache():
+    """The per-process L1 cache"""
+    return caches[getattr(settings, 'CACHE_L1_ALIAS', 'local')]
+
+
+def shared_cache_is_local():
+    """True when the shared cache lives in process memory, so other processes never see its writes"""
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+    return isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _version_key(namespace: str) -> str:
+    return f"ns:{namespace}:version"
+
+
+def _fresh_version() -> int:
+    # Time based so that an evicted version key never resurrects stale entries
+    return int(time.time() * 1000)
+
+
+def namespace_version(namespace: str) -> int:
+    """Current version number of a cache namespace"""
+    key = _version_key(namespace)
+    version = local_cache().get(key)
+    if version is not None:
+        return version
+    try:
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, _fresh_version(), None)
+            version = cache.get(key) or _fresh_version()
+    except CACHE_ERRORS as e:
+        # A fresh version only costs misses, which is safe while L2 is down
+        logger.warning("Shared cache unavailable reading namespace %s: %s", namespace, e)
+        version = _fresh_version()
+    local_cache().set(key, version, getattr(settings, 'CACHE_L1_VERSION_TTL', 2))
+    return version
+
+
+def make_key(namespace: str, *parts) -> str:
+    """Build a cache key that is invalidated whenever the namespace is bumped"""
+    return ":".join([namespace, str(namespace_version(namespace))] + [str(part) for part in parts])
+
+
+def bump_namespace(namespace: str):
+    """Invalidate every key of a namespace by moving it to a new version"""
+    key = _version_key(namespace)
+    try:
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            version = _fresh_version()
+            cache.set(key, version, None)
+    except CACHE_ERRORS as e:
+        # Other processes keep the old version until L2 is back; this one moves on
+        logger.warning("Shared cache unavailable, namespace %s not bumped: %s", namespace, e)
+        version = max(_fresh_version(), (local_cache().get(key) or 0) + 1)
+    local_cache().set(key, version, getattr(settings, 'CACHE_L1_VERSION_TTL', 2))
+
+
+def invalidate_on(namespace: str, *models):
+    """Bump ``namespace`` whenever an instance of one of ``models`` is saved or deleted"""
+    def receiver(sender, **kwargs):
+        bump_namespace(namespace)
+
+    for model in models:
+        for signal in (post_save, post_delete):
+            signal.connect(receiver, sender=model, weak=False,
+                           dispatch_uid=f'invalidate:{namespace}:{model._meta.label_lower}:{signal is post_save}')
+
+
+def _compute_once(key, compute, timeout):
+    """
+    Recompute a missing L2 entry with stampede protection: one caller takes a
+    lock and computes, the others wait briefly for its result.
+    """
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, getattr(settings, 'CACHE_LOCK_TIMEOUT', 30)):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + getattr(settings, 'CACHE_LOCK_WAIT', 2)
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    # The lock holder is slow or died; do not keep the request waiting
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+def get_or_compute(namespace: str, parts, compute, timeout=None, local_timeout=None):
+    """
+    Read-through lookup of ``make_key(namespace, *parts)``: L1, then L2, then
+    ``compute()`` (single-flight). ``timeout`` is the L2 TTL (None for the
+    cache default) and ``local_timeout`` the L1 TTL (CACHE_L1_TTL).
+    """
+    key = make_key(namespace, *parts)
+    if len(key) > 200:
+        key = f"{namespace}:{hashlib.sha1(key.encode()).hexdigest()}"
+    l1 = local_cache()
+    value = l1.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    try:
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = _compute_once(key, compute, timeout)
+    except CACHE_ERRORS as e:
+        logger.warning("Shared cache unavailable, computing %s directly: %s", key, e)
+        value = compute()
+    if local_timeout is None:
+        local_timeout = getattr(settings, 'CACHE_L1_TTL', 5)
+    if local_timeout:
+        l1.set(key, value, local_timeout)
+    return value
+
+
+def _key_part(value):
+    meta = getattr(value, '_meta', None)
+    if meta is not None:
+        return f"{meta.label_lower}.{value.pk}"
+    return value
+
+
+def cached(namespace: str, timeout=None, local_timeout=None, key=None):
+    """
+    Decorator caching a function's result through get_or_compute. The key is
+    built from the arguments (model instances by primary key) unless ``key``
+    maps the arguments to the key parts. ``func.invalidate()`` bumps the
+    namespace.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if key is not None:
+                parts = key(*args, **kwargs)
+            else:
+                parts = [func.__name__] + [_key_part(arg) for arg in args]
+                parts += [f"{name}={_key_part(value)}" for name, value in sorted(kwargs.items())]
+            return get_or_compute(namespace, parts, lambda: func(*args, **kwargs), timeout, local_timeout)
+
+        wrapper.invalidate = lambda: bump_namespace(namespace)
+        return wrapper
+    return decorator
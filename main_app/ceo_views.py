@@ -10,33 +10,24 @@ from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import UpdateView
 import csv
+from django.db.models import Value
+from django.db.models.functions import Concat
 from django.utils import timezone
 
 from .forms import *
 from .models import *
-from .utils import get_attendance_stats, format_user_display_name
+from .responses import FastJsonResponse
+from .utils import format_user_display_name
+from services import reference_data
+from services.customer_listing import customer_listing
+from services.dashboard_metrics import fragment_cache_context, org_dashboard_metrics
 
 
 def admin_home(request):
-    total_manager = Manager.objects.all().count()
-    total_employees = Employee.objects.all().count()
-    departments = Department.objects.all()
-    total_department = departments.count()
-    total_division = Division.objects.all().count()
-    total_attendance = Attendance.objects.filter(department__in=departments).count()
-    
-    # Use utility function for attendance stats
-    department_list, attendance_list = get_attendance_stats(departments)
-
     context = {
         'page_title': "Administrative Dashboard",
-        'total_employees': total_employees,
-        'total_manager': total_manager,
-        'total_division': total_division,
-        'total_department': total_department,
-        'department_list': department_list,
-        'attendance_list': attendance_list,
-
+        **org_dashboard_metrics(),
+        **fragment_cache_context(),
     }
     return render(request, 'ceo_template/home_content.html', context)
 
@@ -160,7 +151,7 @@ def add_department(request):
 
 
 def manage_manager(request):
-    allManager = CustomUser.objects.filter(user_type=2)
+    allManager = CustomUser.objects.filter(user_type=2).select_related('manager__division')
     context = {
         'allManager': allManager,
         'page_title': 'Manage Manager'
@@ -171,7 +162,7 @@ def manage_manager(request):
 def manage_employee(request):
     # Show ALL users that have Employee records, regardless of their primary user_type
     from .models import Employee
-    employee_users = Employee.objects.select_related('admin').all()
+    employee_users = Employee.objects.with_profile()
     # Extract the CustomUser objects from Employee records
     employees = [emp.admin for emp in employee_users]
     
@@ -202,57 +193,11 @@ def manage_department(request):
 
 
 def customers_manage(request):
-    """Enhanced customer management with filtering and pagination"""
-    # Get filter parameters
-    search_query = request.GET.get('search', '')
-    city_filter = request.GET.get('city', '')
-    active_filter = request.GET.get('active', '')
-    
-    # Base queryset
-    customers = Customer.objects.select_related('city', 'owner_staff__admin').order_by('-created_at')
-    
-    # Apply filters
-    if search_query:
-        from django.db import models
-        customers = customers.filter(
-            models.Q(name__icontains=search_query) |
-            models.Q(code__icontains=search_query) |
-            models.Q(email__icontains=search_query) |
-            models.Q(phone_primary__icontains=search_query)
-        )
-    
-    if city_filter:
-        customers = customers.filter(city_id=city_filter)
-    
-    if active_filter:
-        customers = customers.filter(active=active_filter == 'true')
-    
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(customers, 20)
-    page_number = request.GET.get('page')
-    customers_page = paginator.get_page(page_number)
-    
-    # Statistics
-    total_customers = Customer.objects.count()
-    active_customers = Customer.objects.filter(active=True).count()
-    inactive_customers = Customer.objects.filter(active=False).count()
-    
-    # Get cities for filter dropdown
-    cities = City.objects.all().order_by('name')
-    
+    """Customer management with filtering and keyset pagination"""
     context = {
-        'customers': customers_page,
-        'total_customers': total_customers,
-        'active_customers': active_customers,
-        'inactive_customers': inactive_customers,
-        'cities': cities,
-        'current_filters': {
-            'search': search_query,
-            'city': city_filter,
-            'active': active_filter,
-        },
-        'page_title': 'Customer Management'
+        **customer_listing(request.GET),
+        'cities': reference_data.cities(),
+        'page_title': 'Customer Management',
     }
     return render(request, "ceo_template/customers_manage.html", context)
 
@@ -580,17 +525,12 @@ def get_admin_attendance(request):
     try:
         department = get_object_or_404(Department, id=department_id)
         attendance = get_object_or_404(Attendance, id=attendance_date_id)
-        attendance_reports = AttendanceReport.objects.filter(attendance=attendance)
-        json_data = []
-        for report in attendance_reports:
-            data = {
-                "status": str(report.status),
-                "name": str(report.employee)
-            }
-            json_data.append(data)
-        return JsonResponse(json.dumps(json_data), safe=False)
+        attendance_reports = AttendanceReport.objects.filter(attendance=attendance).values(
+            'status', name=Concat('employee__admin__last_name', Value(', '), 'employee__admin__first_name')
+        )
+        return FastJsonResponse(attendance_reports, safe=False)
     except Exception as e:
-        return None
+        return FastJsonResponse({'status': 'ERROR', 'error': str(e)}, status=400)
 
 
 def admin_view_profile(request):
@@ -745,58 +685,7 @@ def admin_customer_list(request):
     if request.user.user_type != '1':
         messages.error(request, "Access denied. Only administrators can access this page.")
         return redirect('login_page')
-    
-    # Get filter parameters
-    search_query = request.GET.get('search', '')
-    city_filter = request.GET.get('city', '')
-    active_filter = request.GET.get('active', '')
-    
-    # Base queryset
-    customers = Customer.objects.select_related('city', 'owner_staff').order_by('-created_at')
-    
-    # Apply filters
-    if search_query:
-        customers = customers.filter(
-            models.Q(name__icontains=search_query) |
-            models.Q(code__icontains=search_query) |
-            models.Q(email__icontains=search_query) |
-            models.Q(phone_primary__icontains=search_query)
-        )
-    
-    if city_filter:
-        customers = customers.filter(city_id=city_filter)
-    
-    if active_filter:
-        customers = customers.filter(active=active_filter == 'true')
-    
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(customers, 20)
-    page_number = request.GET.get('page')
-    customers_page = paginator.get_page(page_number)
-    
-    # Statistics
-    total_customers = Customer.objects.count()
-    active_customers = Customer.objects.filter(active=True).count()
-    inactive_customers = Customer.objects.filter(active=False).count()
-    
-    # Get cities for filter dropdown
-    cities = City.objects.all().order_by('name')
-    
-    context = {
-        'page_title': 'Customer Management',
-        'customers': customers_page,
-        'total_customers': total_customers,
-        'active_customers': active_customers,
-        'inactive_customers': inactive_customers,
-        'cities': cities,
-        'current_filters': {
-            'search': search_query,
-            'city': city_filter,
-            'active': active_filter,
-        }
-    }
-    return render(request, 'ceo_template/customer_list.html', context)
+    return customers_manage(request)
 
 
 def admin_customer_create(request):
@@ -0,0 +1,62 @@
+"""
+Timezone-aware day windows.
+
+Filtering with ``field__date=day`` wraps the column in a DATE() cast, which
+stops the database from range-seeking the (employee, timestamp) style indexes.
+These helpers turn local calendar dates into half-open datetime ranges
+``[start, end)`` that can use those indexes.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def as_local_date(value):
+    """Coerce a date, datetime or 'YYYY-MM-DD' string to a local calendar date"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def start_of_day(day, tz=None):
+    """Aware datetime of local midnight at the start of ``day``"""
+    tz = tz or timezone.get_current_timezone()
+    return timezone.make_aware(datetime.combine(as_local_date(day), time.min), tz)
+
+
+def day_window(day, tz=None):
+    """(start, end) of one local day"""
+    day = as_local_date(day)
+    return start_of_day(day, tz), start_of_day(day + timedelta(days=1), tz)
+
+
+def date_range_window(start_date=None, end_date=None, tz=None):
+    """
+    (start, end) covering the inclusive local dates start_date..end_date.
+    Either side may be None for an open range.
+    """
+    start_date, end_date = as_local_date(start_date), as_local_date(end_date)
+    start = start_of_day(start_date, tz) if start_date else None
+    end = start_of_day(end_date + timedelta(days=1), tz) if end_date else None
+    return start, end
+
+
+def date_range_q(field, start_date=None, end_date=None, tz=None):
+    """Q object for ``field`` within the inclusive local dates, usable across relations"""
+    start, end = date_range_window(start_date, end_date, tz)
+    condition = Q()
+    if start is not None:
+        condition &= Q(**{f'{field}__gte': start})
+    if end is not None:
+        condition &= Q(**{f'{field}__lt': end})
+    return condition
+
+
+def day_q(field, day, tz=None):
+    """Q object for ``field`` on one local day"""
+    return date_range_q(field, day, day, tz)
@@ -0,0 +1,151 @@
+"""
+Database routing between the primary and an optional read replica.
+
+Writes always go to the primary ("default"). Reads go to the primary too,
+except inside ``using_replica()`` (or for querysets passed through
+``on_replica()``) where they are served by the "replica" alias when one is
+configured. Heavy, read-only screens (dashboards, analytics, exports) opt
+in; ingest and anything that reads its own writes stays on the primary.
+
+Replicas lag. A user who wrote something is pinned to the primary for
+DATABASE_REPLICA_LAG seconds (and for the rest of the request that wrote),
+so they always see their own changes. The pin is kept in the shared cache
+by main_app.middleware.ReplicaPinMiddleware.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+STREAMING_ALIAS = 'streaming'
+
+# Writes to these models never pin a user to the primary
+UNTRACKED_MODELS = {'sessions.session'}
+
+_use_replica = ContextVar('use_replica', default=False)
+_untracked = ContextVar('untracked_writes', default=False)
+_request_state = ContextVar('db_request_state', default=None)
+
+
+def replica_alias():
+    """The replica's alias, or None when no replica is configured"""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', REPLICA_ALIAS)
+    return alias if alias in settings.DATABASES else None
+
+
+def _pin_key(user_id):
+    return f"db:primary_pin:{user_id}"
+
+
+class RequestState:
+    """Per-request record of whether the current user must read from the primary"""
+
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self._pinned = None
+
+    @property
+    def user_id(self):
+        # Resolved late: DRF only authenticates token users inside the view
+        user = getattr(self.request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def pinned(self):
+        if self.wrote:
+            return True
+        if self._pinned is None:
+            user_id = self.user_id
+            self._pinned = bool(user_id and cache.get(_pin_key(user_id)))
+        return self._pinned
+
+
+def replica_read_alias():
+    """Alias a replica read should use now: the replica unless it is missing or the user is pinned"""
+    alias = replica_alias()
+    if alias is None:
+        return DEFAULT_DB_ALIAS
+    state = _request_state.get()
+    if state is not None and state.pinned():
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+def read_alias():
+    """Alias that reads should use right now"""
+    return replica_read_alias() if _use_replica.get() else DEFAULT_DB_ALIAS
+
+
+def streaming_alias():
+    """
+    Alias for long ``.iterator()`` reads. Under transaction pooling this is a
+    connection with server-side cursors enabled; iterate it inside
+    ``transaction.atomic(using=...)``.
+    """
+    if STREAMING_ALIAS in settings.DATABASES:
+        return STREAMING_ALIAS
+    return replica_alias() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def using_replica():
+    """Serve reads from the replica for the duration; also usable as a view decorator"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def on_replica(queryset):
+    """``queryset`` bound to the replica, honouring the read-your-writes pin"""
+    return queryset.using(replica_read_alias())
+
+
+@contextmanager
+def untracked_writes():
+    """Writes inside the block (e.g. presence updates) do not pin the user to the primary"""
+    token = _untracked.set(True)
+    try:
+        yield
+    finally:
+        _untracked.reset(token)
+
+
+@contextmanager
+def track_writes(request):
+    """Record writes made while handling ``request``; yields its RequestState"""
+    state = RequestState(request)
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+def pin_to_primary(user_id):
+    """Serve the user's replica reads from the primary until the replica has caught up"""
+    cache.set(_pin_key(user_id), 1, getattr(settings, 'DATABASE_REPLICA_LAG', 10))
+
+
+def _record_write(model):
+    state = _request_state.get()
+    if state is None or _untracked.get() or model._meta.label_lower in UNTRACKED_MODELS:
+        return
+    state.wrote = True
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        _record_write(model)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
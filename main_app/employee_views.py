@@ -4,6 +4,7 @@ from datetime import datetime
 
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
+from django.db.models import F
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,
                               redirect, render)
@@ -12,14 +13,19 @@ from django.views.decorators.csrf import csrf_exempt
 
 from .forms import *
 from .models import *
+from .responses import FastJsonResponse
+from services import reference_data
+from services.dashboard_metrics import employee_dashboard_metrics, fragment_cache_context
 from django.contrib.auth.decorators import login_required
 
 
 def employee_home(request):
     employee = get_object_or_404(Employee, admin=request.user)
-    total_department = Department.objects.filter(division=employee.division).count()
-    total_attendance = AttendanceReport.objects.filter(employee=employee).count()
-    total_present = AttendanceReport.objects.filter(employee=employee, status=True).count()
+    metrics = employee_dashboard_metrics(employee)
+    summary = metrics['attendance']
+    total_department = len(summary['departments'])
+    total_attendance = summary['total_attendance']
+    total_present = summary['total_present']
     if total_attendance == 0:  # Don't divide. DivisionByZero
         percent_absent = percent_present = 0
     else:
@@ -28,36 +34,14 @@ def employee_home(request):
     department_name = []
     data_present = []
     data_absent = []
-    departments = Department.objects.filter(division=employee.division)
-    for department in departments:
-        attendance = Attendance.objects.filter(department=department)
-        present_count = AttendanceReport.objects.filter(
-            attendance__in=attendance, status=True, employee=employee).count()
-        absent_count = AttendanceReport.objects.filter(
-            attendance__in=attendance, status=False, employee=employee).count()
-        department_name.append(department.name)
-        data_present.append(present_count)
-        data_absent.append(absent_count)
+    for department in summary['departments']:
+        department_name.append(department['name'])
+        data_present.append(department['present'])
+        data_absent.append(department['absent'])
     
-    # Get today's individual GPS attendance data
-    from django.utils import timezone
-    today = timezone.localdate()
     # Mock GPS attendance data until GPS models are created
     today_attendance = None
     
-    # Get task statistics
-    try:
-        total_tasks = EmployeeTask.objects.filter(employee=employee).count()
-        completed_tasks = EmployeeTask.objects.filter(employee=employee, status='completed').count()
-        pending_tasks = EmployeeTask.objects.filter(employee=employee, status__in=['assigned', 'in_progress']).count()
-        overdue_tasks = EmployeeTask.objects.filter(
-            employee=employee, 
-            status__in=['assigned', 'in_progress'],
-            due_date__lt=today
-        ).count()
-    except Exception:
-        total_tasks = completed_tasks = pending_tasks = overdue_tasks = 0
-    
     # Get recent performance ratings (mock data until GPS models are created)
     recent_ratings = []
     avg_rating = 0
@@ -67,7 +51,6 @@ def employee_home(request):
         'percent_present': percent_present,
         'percent_absent': percent_absent,
         'total_department': total_department,
-        'departments': departments,
         'data_present': data_present,
         'data_absent': data_absent,
         'data_name': department_name,
@@ -75,14 +58,14 @@ def employee_home(request):
         'employee': employee,
         'today_attendance': today_attendance,
         # Task statistics
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'pending_tasks': pending_tasks,
-        'overdue_tasks': overdue_tasks,
+        'total_tasks': metrics['total_tasks'],
+        'completed_tasks': metrics['completed_tasks'],
+        'pending_tasks': metrics['pending_tasks'],
+        'overdue_tasks': metrics['overdue_tasks'],
         # Performance ratings
         'recent_ratings': recent_ratings,
         'avg_rating': round(avg_rating, 1),
-
+        **fragment_cache_context(),
     }
     return render(request, 'employee_template/home_content.html', context)
 
@@ -108,17 +91,10 @@ def employee_view_attendance(request):
             attendance = Attendance.objects.filter(
                 date__range=(start_date, end_date), department=department)
             attendance_reports = AttendanceReport.objects.filter(
-                attendance__in=attendance, employee=employee)
-            json_data = []
-            for report in attendance_reports:
-                data = {
-                    "date":  str(report.attendance.date),
-                    "status": report.status
-                }
-                json_data.append(data)
-            return JsonResponse(json.dumps(json_data), safe=False)
+                attendance__in=attendance, employee=employee).values('status', date=F('attendance__date'))
+            return FastJsonResponse(attendance_reports, safe=False)
         except Exception as e:
-            return None
+            return FastJsonResponse({'status': 'ERROR', 'error': str(e)}, status=400)
 
 
 def employee_apply_leave(request):
@@ -335,7 +311,7 @@ def order_create(request, jobcard_id=None):
         'page_title': 'Create Order',
         'jobcard': jobcard,
         'customers': Customer.objects.filter(active=True).order_by('name'),
-        'items': Item.objects.all().order_by('name')
+        'items': reference_data.items()
     }
     return render(request, 'employee_template/order_form.html', context)
 
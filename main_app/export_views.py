@@ -0,0 +1,82 @@
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from .models import ExportJob
+from .responses import FastJsonResponse
+from services.exports import (CONTENT_TYPES, aiter_chunks, export_filename, get_dataset, needs_background_export,
+                              queue_export, stream_export)
+
+
+def _job_payload(job):
+    data = {
+        'job_id': job.id,
+        'dataset': job.dataset,
+        'format': job.format,
+        'status': job.status,
+        'row_count': job.row_count,
+        'error': job.error,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('export_job_status', args=[job.id]),
+    }
+    if job.status == 'DONE':
+        data['download_url'] = reverse('export_job_download', args=[job.id])
+    return data
+
+
+@login_required
+def export_data(request, dataset):
+    """
+    Export a dataset as CSV or XLSX (?format=csv|xlsx, start_date, end_date,
+    employee_id). Streams the file, or queues a background job when the export
+    is large or ?background=1 is given.
+    """
+    format_type = request.GET.get('format', 'csv')
+    filters = {
+        'start_date': request.GET.get('start_date') or None,
+        'end_date': request.GET.get('end_date') or None,
+        'employee_id': request.GET.get('employee_id') or None,
+    }
+    try:
+        if format_type not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported export format '{format_type}'")
+        if request.GET.get('background') or needs_background_export(request.user, dataset, **filters):
+            job = queue_export(request.user, dataset, format_type, **filters)
+            return FastJsonResponse(_job_payload(job), status=202)
+        content = stream_export(request.user, dataset, format_type, **filters)
+        if isinstance(request, ASGIRequest):
+            # A synchronous iterator would be buffered whole before sending
+            content = aiter_chunks(content)
+        response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[format_type])
+    except PermissionDenied as e:
+        return FastJsonResponse({'error': str(e)}, status=403)
+    except ValueError as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(get_dataset(dataset), format_type)}"'
+    return response
+
+
+def _get_job(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id)
+    if job.requested_by_id != request.user.id and request.user.user_type != '1':
+        raise Http404
+    return job
+
+
+@login_required
+def export_job_status(request, job_id):
+    return FastJsonResponse(_job_payload(_get_job(request, job_id)))
+
+
+@login_required
+def export_job_download(request, job_id):
+    job = _get_job(request, job_id)
+    if job.status != 'DONE' or not job.file:
+        return FastJsonResponse(_job_payload(job), status=409)
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.rsplit('/', 1)[-1],
+                        content_type=CONTENT_TYPES.get(job.format))
@@ -218,12 +218,12 @@ class JobCardForm(FormSettings):
         if self.user:
             if self.user.user_type == '1':  # Admin - can assign to anyone
                 from .models import Employee
-                self.fields['assigned_to'].queryset = Employee.objects.all().order_by('admin__first_name', 'admin__last_name')
+                self.fields['assigned_to'].queryset = Employee.objects.with_profile().order_by('admin__first_name', 'admin__last_name')
             elif self.user.user_type == '2':  # Manager - can assign to employees in their division
                 try:
                     from .models import Manager, Employee
                     manager = Manager.objects.get(admin=self.user)
-                    self.fields['assigned_to'].queryset = Employee.objects.filter(
+                    self.fields['assigned_to'].queryset = Employee.objects.with_profile().filter(
                         division=manager.division
                     ).order_by('admin__first_name', 'admin__last_name')
                 except Manager.DoesNotExist:
@@ -3,6 +3,8 @@ GPS utility functions for geofencing and location calculations
 """
 import math
 from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
 
@@ -189,6 +191,50 @@ def get_address_from_coordinates(latitude, longitude):
     return f"Location: {latitude:.6f}, {longitude:.6f}"
 
 
+def latest_position_key(employee_id):
+    return f"gps:latest:{employee_id}"
+
+
+def track_position(track):
+    """The fields of a GPSTrack that the live location endpoints report"""
+    smoothed = track.smoothed_latitude is not None and track.smoothed_longitude is not None
+    return {
+        'latitude': float(track.smoothed_latitude if smoothed else track.latitude),
+        'longitude': float(track.smoothed_longitude if smoothed else track.longitude),
+        'address': track.address,
+        'timestamp': track.timestamp,
+        'speed': track.speed,
+        'heading': track.heading,
+        'accuracy': track.accuracy,
+        'battery_level': track.battery_level,
+        'status': track.get_status_display(),
+    }
+
+
+def remember_position(track):
+    """Cache ``track`` as its employee's latest known position"""
+    remember_positions([track])
+
+
+def remember_positions(tracks):
+    """Cache the newest of ``tracks`` per employee unless a newer position is cached already; outliers are skipped"""
+    newest = {}
+    for track in tracks:
+        if track.is_outlier:
+            continue
+        current = newest.get(track.employee_id)
+        if current is None or track.timestamp >= current.timestamp:
+            newest[track.employee_id] = track
+    if not newest:
+        return
+    keys = {latest_position_key(employee_id): track for employee_id, track in newest.items()}
+    cached = cache.get_many(list(keys))
+    cache.set_many({
+        key: track_position(track) for key, track in keys.items()
+        if key not in cached or cached[key]['timestamp'] <= track.timestamp
+    }, getattr(settings, 'LIVE_LOCATION_CACHE_TTL', 900))
+
+
 def calculate_geofence_coverage(geofences, bounds):
     """Calculate what percentage of an area is covered by geofences"""
     # This is a simplified calculation
@@ -205,37 +251,42 @@ def calculate_geofence_coverage(geofences, bounds):
 
 
 def detect_anomalous_movement(gps_tracks, max_speed_kmh=200):
-    """Detect potentially anomalous GPS movements"""
+    """
+    GPS tracks (in time order) that the track cleaner rejects as outliers:
+    jumps implying more than ``max_speed_kmh`` or an implausible acceleration
+    (see services.track_cleaning)
+    """
+    from services.track_cleaning import clean_track, filter_params
+
     if len(gps_tracks) < 2:
         return []
-    
+
+    params = filter_params()._replace(max_speed=max_speed_kmh / 3.6)
+    cleaned = clean_track(
+        [track.timestamp.timestamp() for track in gps_tracks],
+        [float(track.latitude) for track in gps_tracks],
+        [float(track.longitude) for track in gps_tracks],
+        [track.accuracy for track in gps_tracks],
+        params,
+        smooth=False,
+    )
+
     anomalies = []
-    
-    for i in range(1, len(gps_tracks)):
-        prev_track = gps_tracks[i-1]
-        curr_track = gps_tracks[i]
-        
-        # Calculate speed between points
-        point1 = {
-            'lat': float(prev_track.latitude),
-            'lng': float(prev_track.longitude),
-            'timestamp': prev_track.timestamp
-        }
-        
-        point2 = {
-            'lat': float(curr_track.latitude),
-            'lng': float(curr_track.longitude),
-            'timestamp': curr_track.timestamp
-        }
-        
-        speed = calculate_speed(point1, point2)
-        
-        if speed > max_speed_kmh:
-            anomalies.append({
-                'track_id': curr_track.id,
-                'speed': speed,
-                'timestamp': curr_track.timestamp,
-                'message': f'Unusually high speed: {speed:.1f} km/h'
-            })
-    
+    previous = gps_tracks[0]
+    for track, outlier in zip(gps_tracks[1:], cleaned.outliers[1:]):
+        if not outlier:
+            previous = track
+            continue
+        speed = calculate_speed(
+            {'lat': float(previous.latitude), 'lng': float(previous.longitude), 'timestamp': previous.timestamp},
+            {'lat': float(track.latitude), 'lng': float(track.longitude), 'timestamp': track.timestamp},
+        )
+        anomalies.append({
+            'track_id': track.id,
+            'speed': speed,
+            'timestamp': track.timestamp,
+            'message': (f'Unusually high speed: {speed:.1f} km/h' if speed > max_speed_kmh
+                        else f'Implausible jump of {speed:.1f} km/h from the previous fix'),
+        })
+
     return anomalies
@@ -4,9 +4,11 @@ GPS Views for Staff Management System
 import json
 import math
 from datetime import datetime, date, timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, HttpResponse
 from django.contrib import messages
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
@@ -18,9 +20,18 @@ from .models import (
     Attendance, LeaveReportEmployee, LeaveReportManager, 
     FeedbackEmployee, FeedbackManager, NotificationEmployee, NotificationManager,
     GPSTrack, GPSCheckIn, EmployeeGeofence, 
-    GPSRoute, GPSSession
+    GPSRoute, GPSSession, UserStatus, JobCard
 )
-from .gps_utils import is_in_geofence, calculate_distance, get_location_type
+from .responses import FastJsonResponse
+from .gps_utils import is_in_geofence, calculate_distance, get_location_type, track_position, validate_coordinates
+from .date_utils import date_range_q
+from .db_routing import using_replica
+from .utils import async_login_required
+from services.gps_attendance import department_attendance_summary
+from services.gps_ingest import BufferFull, ingest_fixes
+from services.customer_locations import anearby_customers
+from services.live_locations import achecked_in_employee_ids, active_checkins, alatest_position, alatest_positions
+from services.track_cleaning import path_length, schedule_clean_day
 
 
 # ======================================
@@ -35,9 +46,8 @@ def employee_gps_dashboard(request):
     
     try:
         # Get today's check-in status from database
-        today_checkin = GPSCheckIn.objects.filter(
-            employee=employee,
-            check_in_time__date=today
+        today_checkin = GPSCheckIn.objects.for_day(today).filter(
+            employee=employee
         ).first()
         
         is_checked_out = today_checkin.check_out_time is not None if today_checkin else False
@@ -62,9 +72,8 @@ def employee_gps_dashboard(request):
     try:
         # Get this week's check-ins
         week_start = today - timedelta(days=7)
-        week_checkins = GPSCheckIn.objects.filter(
-            employee=employee,
-            check_in_time__date__gte=week_start
+        week_checkins = GPSCheckIn.objects.between(start_date=week_start).filter(
+            employee=employee
         )
         
         # Calculate total hours for the week
@@ -108,9 +117,8 @@ def employee_gps_checkin(request):
     today = timezone.localdate()
     
     # Check if employee already checked in today
-    existing_checkin = GPSCheckIn.objects.filter(
-        employee=employee,
-        check_in_time__date=today
+    existing_checkin = GPSCheckIn.objects.for_day(today).filter(
+        employee=employee
     ).first()
     
     if existing_checkin:
@@ -140,9 +148,8 @@ def employee_gps_checkout(request):
     today = timezone.localdate()
     
     # Check if employee has checked in today
-    active_checkin = GPSCheckIn.objects.filter(
+    active_checkin = GPSCheckIn.objects.for_day(today).filter(
         employee=employee,
-        check_in_time__date=today,
         check_out_time__isnull=True
     ).first()
     
@@ -173,9 +180,9 @@ def employee_gps_history(request):
     
     # Apply date filtering
     if start_date:
-        checkins = checkins.filter(check_in_time__date__gte=start_date)
+        checkins = checkins.between(start_date=start_date)
     if end_date:
-        checkins = checkins.filter(check_in_time__date__lte=end_date)
+        checkins = checkins.between(end_date=end_date)
     
     checkins = checkins.order_by('-check_in_time')[:50]
     
@@ -227,9 +234,8 @@ def manager_gps_dashboard(request):
     today = timezone.localdate()
     
     # Get real GPS data from database
-    today_checkins = GPSCheckIn.objects.filter(
-        employee__in=employees,
-        check_in_time__date=today
+    today_checkins = GPSCheckIn.objects.for_day(today).filter(
+        employee__in=employees
     ).select_related('employee', 'employee__admin')
     
     checked_in_count = today_checkins.count()
@@ -237,23 +243,8 @@ def manager_gps_dashboard(request):
     total_employees = employees.count()
     
     # Department statistics for manager's division only
-    department_stats = []
     try:
-        departments = Department.objects.filter(division=manager.division)
-            
-        for dept in departments:
-            dept_employees = employees.filter(department=dept)
-            dept_checked_in = GPSCheckIn.objects.filter(
-                employee__in=dept_employees,
-                check_in_time__date=today
-            ).count()
-            
-            department_stats.append({
-                'department': dept,
-                'employee_count': dept_employees.count(),
-                'checked_in_count': dept_checked_in,
-                'checked_in_percentage': round((dept_checked_in / dept_employees.count() * 100) if dept_employees.count() > 0 else 0, 1)
-            })
+        department_stats = department_attendance_summary(today, division=manager.division)
     except Exception:
         department_stats = []
     
@@ -279,7 +270,7 @@ def manager_employee_locations(request):
     # Get manager record and their division employees
     try:
         manager_record = Manager.objects.get(admin=request.user)
-        employees = Employee.objects.filter(division=manager_record.division)
+        employees = Employee.objects.with_profile().filter(division=manager_record.division)
         manager = manager_record
         
     except Manager.DoesNotExist:
@@ -291,16 +282,14 @@ def manager_employee_locations(request):
     employee_locations = []
     
     # Get today's check-ins for employees in manager's division
-    today_checkins = GPSCheckIn.objects.filter(
-        employee__in=employees,
-        check_in_time__date=today
+    today_checkins = GPSCheckIn.objects.for_day(today).filter(
+        employee__in=employees
     ).select_related('employee', 'employee__admin')
     
     for checkin in today_checkins:
         # Get latest GPS track for more accurate location
-        latest_track = GPSTrack.objects.filter(
-            employee=checkin.employee,
-            timestamp__date=today
+        latest_track = GPSTrack.objects.for_day(today).filter(
+            employee=checkin.employee
         ).order_by('-timestamp').first()
         
         location_info = {
@@ -328,6 +317,7 @@ def manager_employee_locations(request):
 
 
 @login_required
+@using_replica()
 def manager_attendance_reports(request):
     """Manager attendance reports and analytics"""
     from .models import Manager
@@ -335,7 +325,7 @@ def manager_attendance_reports(request):
     # Get manager record and their division employees
     try:
         manager_record = Manager.objects.get(admin=request.user)
-        employees = Employee.objects.filter(division=manager_record.division)
+        employees = Employee.objects.with_profile().filter(division=manager_record.division)
         manager = manager_record
         
     except Manager.DoesNotExist:
@@ -346,15 +336,13 @@ def manager_attendance_reports(request):
     today = timezone.localdate()
     month_start = today.replace(day=1)
     
-    month_attendance = GPSCheckIn.objects.filter(
-        employee__in=employees,
-        check_in_time__date__gte=month_start
+    month_attendance = GPSCheckIn.objects.between(start_date=month_start).filter(
+        employee__in=employees
     ).select_related('employee', 'employee__admin').order_by('-check_in_time')
     
     total_employees = employees.count()
-    checked_in_today = GPSCheckIn.objects.filter(
-        employee__in=employees,
-        check_in_time__date=today
+    checked_in_today = GPSCheckIn.objects.for_day(today).filter(
+        employee__in=employees
     ).count()
     
     context = {
@@ -408,16 +396,13 @@ def manager_employee_details(request, employee_id):
         start_date = end_date - timedelta(days=30)
     
     # Get employee's GPS check-ins
-    checkins = GPSCheckIn.objects.filter(
-        employee=employee,
-        check_in_time__date__gte=start_date,
-        check_in_time__date__lte=end_date
+    checkins = GPSCheckIn.objects.between(start_date, end_date).filter(
+        employee=employee
     ).order_by('-check_in_time')
     
     # Get today's check-in
-    today_checkin = GPSCheckIn.objects.filter(
-        employee=employee,
-        check_in_time__date=end_date
+    today_checkin = GPSCheckIn.objects.for_day(end_date).filter(
+        employee=employee
     ).first()
     
     # Calculate statistics
@@ -433,9 +418,8 @@ def manager_employee_details(request, employee_id):
     avg_hours = total_hours / completed_checkins if completed_checkins > 0 else 0
     
     # Get recent GPS tracks
-    recent_tracks = GPSTrack.objects.filter(
-        employee=employee,
-        timestamp__date__gte=start_date
+    recent_tracks = GPSTrack.objects.between(start_date=start_date).filter(
+        employee=employee
     ).order_by('-timestamp')[:20]
     
     # Get active session
@@ -452,7 +436,7 @@ def manager_employee_details(request, employee_id):
         date = end_date - timedelta(days=i)
         chart_labels.insert(0, date.strftime('%m/%d'))
         
-        daily_checkins = checkins.filter(check_in_time__date=date).count()
+        daily_checkins = checkins.for_day(date).count()
         chart_data.insert(0, daily_checkins)
     
     chart_data_json = {
@@ -487,6 +471,7 @@ def manager_employee_details(request, employee_id):
 # ======================================
 
 @login_required
+@using_replica()
 def admin_gps_dashboard(request):
     """CEO GPS tracking dashboard with real-time data"""
     from django.db.models import Count, Q
@@ -499,9 +484,9 @@ def admin_gps_dashboard(request):
     total_employees = all_employees.count()
     
     # Get real GPS data from database
-    today_checkins = GPSCheckIn.objects.filter(
-        check_in_time__date=today
-    ).select_related('employee', 'employee__admin', 'employee__department')
+    today_checkins = GPSCheckIn.objects.for_day(today).select_related(
+        'employee', 'employee__admin', 'employee__department'
+    )
     
     checked_in_today = today_checkins.count()
     active_sessions = today_checkins.filter(check_out_time__isnull=True)
@@ -534,20 +519,8 @@ def admin_gps_dashboard(request):
     recent_activity.sort(key=lambda x: x['time'], reverse=True)
     recent_activity = recent_activity[:20]
     
-    # Department statistics with real data
-    department_stats = []
-    for dept in Department.objects.all():
-        dept_employees = Employee.objects.filter(department=dept)
-        dept_checked_in = today_checkins.filter(employee__department=dept).count()
-        dept_active = active_sessions.filter(employee__department=dept).count()
-        
-        department_stats.append({
-            'department': dept,
-            'employee_count': dept_employees.count(),
-            'checked_in_count': dept_checked_in,
-            'active_count': dept_active,
-            'checked_in_percentage': round((dept_checked_in / dept_employees.count() * 100) if dept_employees.count() > 0 else 0, 1)
-        })
+    # Department statistics with real data (one annotated query)
+    department_stats = department_attendance_summary(today)
     
     # Organization Activity Map Data
     map_data = []
@@ -694,12 +667,10 @@ def api_department_details(request, department_id):
         employees = Employee.objects.filter(department=department).select_related('admin')
         
         employee_data = []
-        checked_in_count = 0
         
         # Get today's check-ins for department employees
-        dept_checkins = GPSCheckIn.objects.filter(
-            employee__in=employees,
-            check_in_time__date=today
+        dept_checkins = GPSCheckIn.objects.for_day(today).filter(
+            employee__in=employees
         ).select_related('employee', 'employee__admin')
         
         # Create a lookup dict for quick access
@@ -718,7 +689,6 @@ def api_department_details(request, department_id):
                     status = 'Checked In'
                     status_class = 'bg-success'
                     last_checkin = checkin.check_in_time.strftime('%I:%M %p')
-                checked_in_count += 1
             else:
                 status = 'Not Checked In'
                 status_class = 'bg-warning'
@@ -735,13 +705,13 @@ def api_department_details(request, department_id):
                 'duration_hours': checkin.duration_hours if checkin else 0
             })
         
-        # Calculate statistics
-        total_employees = employees.count()
-        participation_rate = (checked_in_count / total_employees * 100) if total_employees > 0 else 0
-        
-        # Get department GPS stats
+        # Department GPS stats from the shared department summary
+        summary = department_attendance_summary(today, department_ids=[department.id])[0]
+        total_employees = summary['employee_count']
+        checked_in_count = summary['checked_in_count']
+        participation_rate = summary['checked_in_percentage']
         total_checkins_today = checked_in_count
-        active_sessions = checked_in_count - sum(1 for emp in employee_data if emp['status'] == 'Checked Out')
+        active_sessions = summary['active_count']
         
         response_data = {
             'success': True,
@@ -762,16 +732,17 @@ def api_department_details(request, department_id):
             'employees': employee_data
         }
         
-        return JsonResponse(response_data)
+        return FastJsonResponse(response_data)
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
 
 
 @login_required
+@using_replica()
 def admin_location_analytics(request):
     """CEO location analytics and insights"""
     from django.db.models import Count, Avg, Sum, Q, F, ExpressionWrapper, DurationField
@@ -795,10 +766,7 @@ def admin_location_analytics(request):
         start_date = end_date - timedelta(days=30)
     
     # Base queryset for checkins
-    checkins_qs = GPSCheckIn.objects.filter(
-        check_in_time__date__gte=start_date,
-        check_in_time__date__lte=end_date
-    )
+    checkins_qs = GPSCheckIn.objects.between(start_date, end_date)
     
     # Apply department filter
     if department_filter:
@@ -826,8 +794,7 @@ def admin_location_analytics(request):
         avg_hours = avg_duration_result.total_seconds() / 3600
     
     # Current active checkins
-    current_checkins = GPSCheckIn.objects.filter(
-        check_in_time__date=end_date,
+    current_checkins = GPSCheckIn.objects.for_day(end_date).filter(
         check_out_time__isnull=True
     ).count()
     
@@ -844,27 +811,29 @@ def admin_location_analytics(request):
     )
     
     active_employees = Employee.objects.annotate(
-        checkin_count=Count('gps_checkins', filter=Q(
-            gps_checkins__check_in_time__date__gte=start_date,
-            gps_checkins__check_in_time__date__lte=end_date
+        checkin_count=Count('gps_checkins', filter=date_range_q(
+            'gps_checkins__check_in_time', start_date, end_date
         )),
-        avg_duration_seconds=Avg(duration_expression, filter=Q(
-            gps_checkins__check_in_time__date__gte=start_date,
-            gps_checkins__check_in_time__date__lte=end_date,
-            gps_checkins__check_out_time__isnull=False
-        )),
-        location_count=Count('gps_tracks', filter=Q(
-            gps_tracks__timestamp__date__gte=start_date,
-            gps_tracks__timestamp__date__lte=end_date
+        avg_duration_seconds=Avg(duration_expression, filter=date_range_q(
+            'gps_checkins__check_in_time', start_date, end_date
+        ) & Q(gps_checkins__check_out_time__isnull=False)),
+        location_count=Count('gps_tracks', filter=date_range_q(
+            'gps_tracks__timestamp', start_date, end_date
         ), distinct=True)
-    ).filter(checkin_count__gt=0).order_by('-checkin_count')[:10]
+    ).filter(checkin_count__gt=0).select_related('admin', 'department').order_by('-checkin_count')[:10]
     
+    # Distance travelled, measured on the smoothed tracks (see services.track_cleaning)
+    distances = dict(GPSRoute.objects.filter(
+        date__range=(start_date, end_date), employee__in=[employee.id for employee in active_employees]
+    ).values('employee_id').annotate(distance=Sum('total_distance_km')).values_list('employee_id', 'distance'))
+
     # Convert duration from seconds to hours for each employee
     for employee in active_employees:
         if employee.avg_duration_seconds:
             employee.avg_duration = employee.avg_duration_seconds.total_seconds() / 3600
         else:
             employee.avg_duration = 0
+        employee.distance_km = distances.get(employee.id) or 0
     
     # Location usage analysis
     office_geofences = EmployeeGeofence.objects.filter(
@@ -916,9 +885,8 @@ def admin_location_analytics(request):
     
     # Department statistics for charts
     department_stats = Department.objects.annotate(
-        checkin_count=Count('employee__gps_checkins', filter=Q(
-            employee__gps_checkins__check_in_time__date__gte=start_date,
-            employee__gps_checkins__check_in_time__date__lte=end_date
+        checkin_count=Count('employee__gps_checkins', filter=date_range_q(
+            'employee__gps_checkins__check_in_time', start_date, end_date
         ))
     ).filter(checkin_count__gt=0).order_by('-checkin_count')[:10]
     
@@ -926,7 +894,7 @@ def admin_location_analytics(request):
     daily_checkins = {}
     current_date = start_date
     while current_date <= end_date:
-        daily_count = checkins_qs.filter(check_in_time__date=current_date).count()
+        daily_count = checkins_qs.for_day(current_date).count()
         daily_checkins[current_date.strftime('%Y-%m-%d')] = daily_count
         current_date += timedelta(days=1)
     
@@ -970,78 +938,59 @@ def admin_location_analytics(request):
     
     # Handle export requests
     export_format = request.GET.get('export')
-    if export_format in ['csv', 'excel', 'pdf']:
+    if export_format in ['csv', 'excel']:
         return export_analytics_data(request, export_format, context)
     
     return render(request, 'ceo_template/location_analytics.html', context)
 
 
+def _analytics_report_rows(context):
+    """Rows of the location analytics report, section by section"""
+    yield ['Generated:', timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')]
+    yield ['Time Period:', f"{context['start_date']} to {context['end_date']}"]
+    yield []
+    yield ['Key Metrics']
+    yield ['Total Check-ins', context['total_checkins']]
+    yield ['Average Hours', round(context['avg_hours'], 1)]
+    yield ['Currently Active', context['current_checkins']]
+    yield ['Completion Rate', f"{context['avg_checkout_duration']:.1f}%"]
+    yield []
+    yield ['Location Usage']
+    yield ['Office Check-ins', context['office_checkins']]
+    yield ['Field Check-ins', context['field_checkins']]
+    yield ['Remote Check-ins', context['remote_checkins']]
+    yield []
+    yield ['Top Performing Employees']
+    yield ['Name', 'Department', 'Check-ins', 'Avg Duration (hrs)', 'GPS Points', 'Distance (km)']
+    for employee in context['active_employees']:
+        yield [
+            f"{employee.admin.first_name} {employee.admin.last_name}",
+            employee.department.name if employee.department else 'No Department',
+            employee.checkin_count or 0,
+            round(employee.avg_duration, 1) if getattr(employee, 'avg_duration', None) else 0.0,
+            employee.location_count or 0,
+            round(getattr(employee, 'distance_km', 0), 1),
+        ]
+
+
 def export_analytics_data(request, format_type, context):
-    """Export analytics data in various formats"""
-    import csv
-    from django.http import HttpResponse
-    from datetime import datetime
-    
-    if format_type == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="location_analytics_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        
-        writer = csv.writer(response)
-        
-        # Write summary data
-        writer.writerow(['Location Analytics Report'])
-        writer.writerow(['Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-        writer.writerow(['Time Period:', f"{context['start_date']} to {context['end_date']}"])
-        writer.writerow([])
-        
-        # Write key metrics
-        writer.writerow(['Key Metrics'])
-        writer.writerow(['Total Check-ins', context['total_checkins']])
-        writer.writerow(['Average Hours', f"{context['avg_hours']:.1f}"])
-        writer.writerow(['Currently Active', context['current_checkins']])
-        writer.writerow(['Completion Rate', f"{context['avg_checkout_duration']:.1f}%"])
-        writer.writerow([])
-        
-        # Write location usage
-        writer.writerow(['Location Usage'])
-        writer.writerow(['Office Check-ins', context['office_checkins']])
-        writer.writerow(['Field Check-ins', context['field_checkins']])
-        writer.writerow(['Remote Check-ins', context['remote_checkins']])
-        writer.writerow([])
-        
-        # Write top performers
-        writer.writerow(['Top Performing Employees'])
-        writer.writerow(['Name', 'Department', 'Check-ins', 'Avg Duration (hrs)', 'GPS Points'])
-        for employee in context['active_employees']:
-            writer.writerow([
-                f"{employee.admin.first_name} {employee.admin.last_name}",
-                employee.department.name if employee.department else 'No Department',
-                employee.checkin_count or 0,
-                f"{employee.avg_duration:.1f}" if hasattr(employee, 'avg_duration') and employee.avg_duration else '0.0',
-                employee.location_count or 0
-            ])
-        
-        return response
-    
-    elif format_type == 'excel':
-        # For Excel export, you would use openpyxl or xlsxwriter
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="location_analytics_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        
-        # Placeholder - would implement Excel export here
-        response.write(b'Excel export not yet implemented')
-        return response
-    
-    elif format_type == 'pdf':
-        # For PDF export, you would use reportlab or weasyprint
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="location_analytics_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        
-        # Placeholder - would implement PDF export here
-        response.write(b'PDF export not yet implemented')
-        return response
-    
-    return HttpResponse('Invalid export format', status=400)
+    """Export analytics data as a streamed CSV or XLSX report"""
+    from django.http import StreamingHttpResponse
+    from services.exports import CONTENT_TYPES, iter_csv, iter_xlsx
+
+    writers = {'csv': ('csv', iter_csv), 'excel': ('xlsx', iter_xlsx)}
+    if format_type not in writers:
+        return HttpResponse(f'{format_type.upper()} export is not available', status=400)
+
+    extension, writer = writers[format_type]
+    response = StreamingHttpResponse(
+        writer(['Location Analytics Report'], _analytics_report_rows(context)),
+        content_type=CONTENT_TYPES[extension],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="location_analytics_{timezone.localtime().strftime("%Y%m%d_%H%M%S")}.{extension}"'
+    )
+    return response
 
 
 @login_required
@@ -1074,10 +1023,8 @@ def admin_gps_employee_details(request, employee_id):
         start_date = end_date - timedelta(days=90)
     
     # Employee's GPS check-ins
-    checkins = GPSCheckIn.objects.filter(
-        employee=employee,
-        check_in_time__date__gte=start_date,
-        check_in_time__date__lte=end_date
+    checkins = GPSCheckIn.objects.between(start_date, end_date).filter(
+        employee=employee
     ).order_by('-check_in_time')[:50]
     
     # Calculate statistics
@@ -1099,9 +1046,8 @@ def admin_gps_employee_details(request, employee_id):
         avg_hours = avg_duration_result.total_seconds() / 3600
     
     # Recent GPS tracks
-    recent_tracks = GPSTrack.objects.filter(
-        employee=employee,
-        timestamp__date__gte=start_date
+    recent_tracks = GPSTrack.objects.between(start_date=start_date).filter(
+        employee=employee
     ).order_by('-timestamp')[:20]
     
     # Active session
@@ -1111,9 +1057,8 @@ def admin_gps_employee_details(request, employee_id):
     ).first()
     
     # Today's status
-    today_checkin = GPSCheckIn.objects.filter(
-        employee=employee,
-        check_in_time__date=end_date
+    today_checkin = GPSCheckIn.objects.for_day(end_date).filter(
+        employee=employee
     ).first()
     
     # Performance metrics
@@ -1127,7 +1072,7 @@ def admin_gps_employee_details(request, employee_id):
     daily_activity = {}
     for i in range(7):  # Last 7 days
         date = end_date - timedelta(days=i)
-        daily_checkins = checkins.filter(check_in_time__date=date).count()
+        daily_checkins = checkins.for_day(date).count()
         daily_activity[date.strftime('%Y-%m-%d')] = daily_checkins
     
     chart_data = {
@@ -1219,8 +1164,8 @@ def admin_geofence_management(request):
     # Get geofence data
     geofences = EmployeeGeofence.objects.all().select_related('department', 'city')
     active_locations = geofences.filter(is_active=True).count()
-    total_geofence_usage = GPSCheckIn.objects.filter(
-        check_in_time__date__gte=timezone.localdate() - timedelta(days=30)
+    total_geofence_usage = GPSCheckIn.objects.between(
+        start_date=timezone.localdate() - timedelta(days=30)
     ).count()
     avg_radius = geofences.aggregate(Avg('radius_meters'))['radius_meters__avg'] or 100
     
@@ -1248,7 +1193,7 @@ def admin_geofence_management(request):
 def api_gps_checkin(request):
     """API endpoint for GPS check-in"""
     if request.method != 'POST':
-        return JsonResponse({'error': 'Invalid method'}, status=405)
+        return FastJsonResponse({'error': 'Invalid method'}, status=405)
     
     try:
         employee = get_object_or_404(Employee, admin=request.user)
@@ -1270,23 +1215,22 @@ def api_gps_checkin(request):
         
         # Validate required GPS data
         if not latitude or not longitude:
-            return JsonResponse({'error': 'GPS coordinates (latitude/longitude) are required'}, status=400)
+            return FastJsonResponse({'error': 'GPS coordinates (latitude/longitude) are required'}, status=400)
         
         try:
             latitude = float(latitude)
             longitude = float(longitude)
         except (ValueError, TypeError):
-            return JsonResponse({'error': 'Invalid GPS coordinates. Please ensure numbers are provided.'}, status=400)
+            return FastJsonResponse({'error': 'Invalid GPS coordinates. Please ensure numbers are provided.'}, status=400)
         
         # Check if employee already checked in today
         today = timezone.localdate()
-        existing_checkin = GPSCheckIn.objects.filter(
-            employee=employee,
-            check_in_time__date=today
+        existing_checkin = GPSCheckIn.objects.for_day(today).filter(
+            employee=employee
         ).first()
         
         if existing_checkin:
-            return JsonResponse({'error': 'You have already checked in today'}, status=400)
+            return FastJsonResponse({'error': 'You have already checked in today'}, status=400)
         
         # Validate geofence if provided
         geofence = None
@@ -1302,7 +1246,7 @@ def api_gps_checkin(request):
             )
             
             if distance > geofence.radius_meters:
-                return JsonResponse({
+                return FastJsonResponse({
                     'error': f'You must be within {geofence.radius_meters}m of {geofence.name}'
                 }, status=400)
         
@@ -1337,14 +1281,14 @@ def api_gps_checkin(request):
             status='CHECKED_IN'
         )
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'checkin_id': checkin.id,
             'message': 'Check-in successful! GPS tracking started.'
         })
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
+        return FastJsonResponse({'error': str(e)}, status=400)
 
 
 @csrf_exempt
@@ -1352,21 +1296,20 @@ def api_gps_checkin(request):
 def api_gps_checkout(request):
     """API endpoint for GPS check-out"""
     if request.method != 'POST':
-        return JsonResponse({'error': 'Invalid method'}, status=405)
+        return FastJsonResponse({'error': 'Invalid method'}, status=405)
     
     try:
         employee = get_object_or_404(Employee, admin=request.user)
         today = timezone.localdate()
         
         # Check for today's active check-in
-        active_checkin = GPSCheckIn.objects.filter(
+        active_checkin = GPSCheckIn.objects.for_day(today).filter(
             employee=employee,
-            check_in_time__date=today,
             check_out_time__isnull=True
         ).first()
         
         if not active_checkin:
-            return JsonResponse({'error': 'No active check-in found. Please check in first.'}, status=400)
+            return FastJsonResponse({'error': 'No active check-in found. Please check in first.'}, status=400)
         
         # Handle both JSON and FormData requests
         if request.content_type == 'application/json':
@@ -1413,8 +1356,11 @@ def api_gps_checkout(request):
             address=address,
             status='CHECKED_OUT'
         )
+
+        # Smooth the day's track and record the distance once buffered fixes are written
+        schedule_clean_day(employee.id, today)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'checkout_id': active_checkin.id,
             'duration_hours': round(active_checkin.duration_hours or 0, 2),
@@ -1422,163 +1368,188 @@ def api_gps_checkout(request):
         })
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
+        return FastJsonResponse({'error': str(e)}, status=400)
 
 
-@csrf_exempt
-@login_required
-def api_gps_location_update(request):
-    """API endpoint for GPS location updates"""
+@async_login_required
+async def api_gps_location_update(request):
+    """
+    API endpoint for GPS location updates. Accepts one fix, or an offline
+    batch as JSON ``{"fixes": [...]}``. Fixes are filtered (duplicates,
+    inaccurate and stationary points are dropped and counted), buffered and
+    written in batches.
+
+    Rows are written after the response, so ``track_id`` is always null; it
+    is kept for older clients. ``ingest_id`` identifies the newest fix and
+    becomes its GPSTrack.ingest_id once written.
+    """
     if request.method != 'POST':
-        return JsonResponse({'error': 'Invalid method'}, status=405)
+        return FastJsonResponse({'error': 'Invalid method'}, status=405)
     
     try:
-        employee = get_object_or_404(Employee, admin=request.user)
-        
         # Handle both JSON and FormData requests
         if request.content_type == 'application/json':
             data = json.loads(request.body.decode('utf-8')) if request.body else {}
         else:
             data = request.POST
         
-        latitude = float(data.get('latitude'))
-        longitude = float(data.get('longitude'))
-        accuracy = float(data.get('accuracy', 0))
-        speed = float(data.get('speed', 0))
-        battery = int(data.get('battery', 100))
-        heading = float(data.get('heading', 0))
-        
-        # Get address from coordinates
-        address = get_address_from_coords(latitude, longitude)
-        
-        # Determine status based on active check-in
-        today = timezone.localdate()
-        active_checkin = GPSCheckIn.objects.filter(
-            employee=employee,
-            check_in_time__date=today,
-            check_out_time__isnull=True
-        ).first()
-        
-        status = 'WORKING' if active_checkin else 'CHECKED_OUT'
-        
-        # Create GPS track record
-        track = GPSTrack.objects.create(
-            employee=employee,
-            latitude=latitude,
-            longitude=longitude,
-            accuracy=accuracy,
-            speed=speed,
-            heading=heading,
-            battery_level=battery,
-            status=status,
-            address=address
-        )
-        
-        # Update user status
-        user_status, created = UserStatus.objects.get_or_create(
-            user=employee.admin,
-            defaults={'status_type': 'online', 'is_checked_in': bool(active_checkin)}
-        )
-        user_status.status_type = 'online'
-        user_status.is_checked_in = bool(active_checkin)
-        user_status.save()
-        
-        # Check geofence violations if employee is checked in
-        geofence_alerts = []
-        if active_checkin:
-            geofences = EmployeeGeofence.objects.filter(
-                department=employee.department,
-                is_active=True
-            )
-            
-            for geofence in geofences:
-                distance = calculate_distance(
-                    latitude, longitude,
-                    float(geofence.center_latitude),
-                    float(geofence.center_longitude)
-                )
-                
-                if distance > geofence.radius_meters:
-                    geofence_alerts.append({
-                        'type': 'outside_geofence',
-                        'message': f'Employee is {distance:.0f}m outside {geofence.name}',
-                        'geofence': geofence.name,
-                        'distance': distance
-                    })
-        
-        response_data = {
-            'success': True,
-            'track_id': track.id,
-            'status': status,
-            'address': address
-        }
-        
-        if geofence_alerts:
-            response_data['alerts'] = geofence_alerts
-        
-        return JsonResponse(response_data)
+        items = data['fixes'] if isinstance(data.get('fixes'), list) else [data]
+        max_fixes = getattr(settings, 'GPS_MAX_BATCH_FIXES', 500)
+        if not items or len(items) > max_fixes:
+            return FastJsonResponse({'error': f'Send between 1 and {max_fixes} fixes'}, status=400)
+        device_id = str(data.get('device_id') or request.headers.get('X-Device-Id', ''))[:128]
         
+        result = await sync_to_async(ingest_fixes)(request.user, items, device_id)
+    except BufferFull:
+        response = FastJsonResponse({'error': 'Location ingest is busy, retry shortly'}, status=503)
+        response['Retry-After'] = str(getattr(settings, 'GPS_BUFFER_RETRY_AFTER', 5))
+        return response
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
+        return FastJsonResponse({'error': str(e)}, status=400)
+    
+    latest = result['fixes'][-1]
+    response_data = {
+        'success': True,
+        'queued': bool(result['kept']),
+        'track_id': None,  # deprecated: see the docstring
+        'ingest_id': latest['ingest_id'],
+        'status': latest['status'],
+        'address': latest['address'],
+        'received': len(result['fixes']),
+        'accepted': len(result['kept']),
+        'dropped': result['dropped'],
+    }
+    
+    if result['alerts']:
+        response_data['alerts'] = result['alerts']
+    
+    return FastJsonResponse(response_data)
 
 
-@login_required
-def api_employee_current_location(request):
+# csrf_exempt() only wraps sync views in Django 4.2
+api_gps_location_update.csrf_exempt = True
+
+
+@async_login_required
+async def api_employee_current_location(request):
     """API endpoint to get employee's current location"""
     employee_id = request.GET.get('employee_id')
     
     if not employee_id:
-        return JsonResponse({'error': 'Employee ID required'}, status=400)
+        return FastJsonResponse({'error': 'Employee ID required'}, status=400)
     
-    employee = get_object_or_404(Employee, id=employee_id)
+    try:
+        employee = await Employee.objects.with_profile().aget(id=employee_id)
+    except (Employee.DoesNotExist, ValueError):
+        raise Http404('No Employee matches the given query.')
     
     # Check if requesting user has permission to view this employee's location
-    if request.user.user_type == '2':  # Manager
-        try:
-            manager = Manager.objects.get(admin=request.user)
-            if employee.division != manager.division:
-                return JsonResponse({'error': 'Permission denied'}, status=403)
-        except Manager.DoesNotExist:
-            return JsonResponse({'error': 'Manager profile not found'}, status=403)
-    elif request.user.user_type == '3':  # Employee
-        # Employees can only see their own location
-        if employee.admin != request.user:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-    # Admin (user_type == '1') can see all locations
+    denied = await _alocation_permission_error(request.user, employee)
+    if denied:
+        return denied
     
-    # Get latest GPS track
-    latest_track = GPSTrack.objects.filter(
-        employee=employee
-    ).order_by('-timestamp').first()
+    # Latest position, from the cache when possible
+    position = await alatest_position(employee.id)
     
-    if not latest_track:
-        return JsonResponse({'error': 'No location data found'}, status=404)
+    if not position:
+        return FastJsonResponse({'error': 'No location data found'}, status=404)
     
     # Get today's check-in status
     today = timezone.localdate()
-    active_checkin = GPSCheckIn.objects.filter(
-        employee=employee,
-        check_in_time__date=today,
-        check_out_time__isnull=True
-    ).first()
+    active_checkin = await active_checkins(today).filter(employee_id=employee.id).afirst()
+
+    # Customers around the employee, to suggest visits
+    nearby = await anearby_customers(position['latitude'], position['longitude'], limit=5, employee_id=employee.id)
     
-    return JsonResponse({
+    return FastJsonResponse({
         'employee_id': employee.id,
         'employee_name': f"{employee.admin.first_name} {employee.admin.last_name}",
         'department': employee.department.name if employee.department else 'No Department',
         'division': employee.division.name if employee.division else 'No Division',
-        'latitude': float(latest_track.latitude),
-        'longitude': float(latest_track.longitude),
-        'address': latest_track.address,
-        'timestamp': latest_track.timestamp.isoformat(),
-        'speed': latest_track.speed,
-        'heading': latest_track.heading,
-        'accuracy': latest_track.accuracy,
-        'battery_level': latest_track.battery_level,
-        'status': latest_track.get_status_display(),
+        **position,
+        'timestamp': position['timestamp'].isoformat(),
         'is_checked_in': bool(active_checkin),
         'check_in_time': active_checkin.check_in_time.isoformat() if active_checkin else None,
-        'work_summary': active_checkin.work_summary if active_checkin else ''
+        'work_summary': active_checkin.work_summary if active_checkin else '',
+        'nearby_customers': nearby,
+    })
+
+
+async def _alocation_permission_error(user, employee):
+    """An error response when ``user`` may not see ``employee``'s location, else None"""
+    if user.user_type == '2':  # Manager
+        manager = await Manager.objects.filter(admin_id=user.id).afirst()
+        if manager is None:
+            return FastJsonResponse({'error': 'Manager profile not found'}, status=403)
+        if employee.division_id != manager.division_id:
+            return FastJsonResponse({'error': 'Permission denied'}, status=403)
+    elif user.user_type == '3':  # Employee
+        # Employees can only see their own location
+        if employee.admin_id != user.id:
+            return FastJsonResponse({'error': 'Permission denied'}, status=403)
+    # Admin (user_type == '1') can see all locations
+    return None
+
+
+@async_login_required
+async def api_nearby_customers(request):
+    """
+    Customers near a point, closest first, with their distance. The point is
+    ``latitude``/``longitude``, an ``employee_id`` (their latest position) or
+    a ``job_card_id`` (its customer's location); ``radius_m`` and ``limit``
+    are optional. With an employee or job card, each customer carries the
+    assignee's open job card count so nearby visits can be suggested.
+    """
+    params = request.GET
+    employee = None
+    exclude_id = None
+    try:
+        limit = min(int(params.get('limit') or 10), 100)
+        if params.get('job_card_id'):
+            job_card = await JobCard.objects.select_related('customer', 'assigned_to').aget(id=params['job_card_id'])
+            employee = job_card.assigned_to
+            if employee is None:
+                if request.user.user_type != '1':
+                    return FastJsonResponse({'error': 'Permission denied'}, status=403)
+            else:
+                denied = await _alocation_permission_error(request.user, employee)
+                if denied:
+                    return denied
+            if job_card.customer is None or job_card.customer.latitude is None:
+                return FastJsonResponse({'error': 'The job card has no customer location'}, status=404)
+            latitude, longitude = job_card.customer.latitude, job_card.customer.longitude
+            exclude_id = job_card.customer_id
+        elif params.get('employee_id'):
+            employee = await Employee.objects.aget(id=params['employee_id'])
+            denied = await _alocation_permission_error(request.user, employee)
+            if denied:
+                return denied
+            position = await alatest_position(employee.id)
+            if not position:
+                return FastJsonResponse({'error': 'No location data found'}, status=404)
+            latitude, longitude = position['latitude'], position['longitude']
+        else:
+            latitude, longitude = params['latitude'], params['longitude']
+        valid, message = validate_coordinates(latitude, longitude)
+        if not valid:
+            return FastJsonResponse({'error': message}, status=400)
+        customers = await anearby_customers(
+            float(latitude), float(longitude), params.get('radius_m'),
+            # One extra in case the job card's own customer is among them
+            limit + (exclude_id is not None),
+            employee.id if employee else None,
+        )
+    except (JobCard.DoesNotExist, Employee.DoesNotExist):
+        raise Http404('Not found')
+    except (KeyError, ValueError):
+        return FastJsonResponse({'error': 'Give latitude and longitude, employee_id or job_card_id'}, status=400)
+
+    customers = [customer for customer in customers if customer['id'] != exclude_id][:limit]
+    return FastJsonResponse({
+        'latitude': float(latitude),
+        'longitude': float(longitude),
+        'customers': customers,
+        'count': len(customers),
     })
 
 
@@ -1625,65 +1596,57 @@ def is_in_geofence(latitude, longitude, geofence):
 # Additional Real-Time GPS API Endpoints
 # ======================================
 
-@login_required
-def api_team_locations(request):
+@async_login_required
+async def api_team_locations(request):
     """API endpoint to get all team member locations for managers/admins"""
     try:
         # Check user permissions
         if request.user.user_type == '2':  # Manager
-            try:
-                manager = Manager.objects.get(admin=request.user)
-                employees = Employee.objects.filter(division=manager.division)
-            except Manager.DoesNotExist:
-                return JsonResponse({'error': 'Manager profile not found'}, status=403)
+            manager = await Manager.objects.filter(admin_id=request.user.id).afirst()
+            if manager is None:
+                return FastJsonResponse({'error': 'Manager profile not found'}, status=403)
+            employees = Employee.objects.filter(division_id=manager.division_id)
         elif request.user.user_type == '1':  # Admin/CEO
             employees = Employee.objects.all()
         else:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
+            return FastJsonResponse({'error': 'Permission denied'}, status=403)
         
-        # Get latest location for each employee
-        team_locations = []
-        today = timezone.localdate()
+        # Latest location of every employee: cached positions plus one query for the rest
+        team = [employee async for employee in employees.select_related('admin', 'department')]
+        positions = await alatest_positions(employee.id for employee in team)
+        checked_in = await achecked_in_employee_ids(timezone.localdate(), employees)
+        now = timezone.now()
         
-        for employee in employees:
-            # Get latest GPS track
-            latest_track = GPSTrack.objects.filter(
-                employee=employee
-            ).order_by('-timestamp').first()
-            
-            if latest_track:
-                # Get today's check-in status
-                active_checkin = GPSCheckIn.objects.filter(
-                    employee=employee,
-                    check_in_time__date=today,
-                    check_out_time__isnull=True
-                ).first()
-                
-                team_locations.append({
-                    'employee_id': employee.id,
-                    'employee_name': f"{employee.admin.first_name} {employee.admin.last_name}",
-                    'department': employee.department.name if employee.department else 'No Department',
-                    'latitude': float(latest_track.latitude),
-                    'longitude': float(latest_track.longitude),
-                    'address': latest_track.address,
-                    'timestamp': latest_track.timestamp.isoformat(),
-                    'speed': latest_track.speed,
-                    'accuracy': latest_track.accuracy,
-                    'battery_level': latest_track.battery_level,
-                    'status': latest_track.get_status_display(),
-                    'is_checked_in': bool(active_checkin),
-                    'last_update_minutes': int((timezone.now() - latest_track.timestamp).total_seconds() / 60)
-                })
+        team_locations = []
+        for employee in team:
+            position = positions.get(employee.id)
+            if not position:
+                continue
+            team_locations.append({
+                'employee_id': employee.id,
+                'employee_name': f"{employee.admin.first_name} {employee.admin.last_name}",
+                'department': employee.department.name if employee.department else 'No Department',
+                'latitude': position['latitude'],
+                'longitude': position['longitude'],
+                'address': position['address'],
+                'timestamp': position['timestamp'].isoformat(),
+                'speed': position['speed'],
+                'accuracy': position['accuracy'],
+                'battery_level': position['battery_level'],
+                'status': position['status'],
+                'is_checked_in': employee.id in checked_in,
+                'last_update_minutes': int((now - position['timestamp']).total_seconds() / 60)
+            })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'team_locations': team_locations,
             'total_employees': len(team_locations),
-            'last_updated': timezone.now().isoformat()
+            'last_updated': now.isoformat()
         })
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 
 @login_required
@@ -1694,7 +1657,7 @@ def api_employee_route_history(request):
         date_str = request.GET.get('date', timezone.localdate().isoformat())
         
         if not employee_id:
-            return JsonResponse({'error': 'Employee ID required'}, status=400)
+            return FastJsonResponse({'error': 'Employee ID required'}, status=400)
         
         employee = get_object_or_404(Employee, id=employee_id)
         
@@ -1703,36 +1666,36 @@ def api_employee_route_history(request):
             try:
                 manager = Manager.objects.get(admin=request.user)
                 if employee.division != manager.division:
-                    return JsonResponse({'error': 'Permission denied'}, status=403)
+                    return FastJsonResponse({'error': 'Permission denied'}, status=403)
             except Manager.DoesNotExist:
-                return JsonResponse({'error': 'Manager profile not found'}, status=403)
+                return FastJsonResponse({'error': 'Manager profile not found'}, status=403)
         elif request.user.user_type == '3':  # Employee
             if employee.admin != request.user:
-                return JsonResponse({'error': 'Permission denied'}, status=403)
+                return FastJsonResponse({'error': 'Permission denied'}, status=403)
         
         # Parse date
         try:
             target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
-            return JsonResponse({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
+            return FastJsonResponse({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=400)
         
         # Get GPS tracks for the date
-        tracks = GPSTrack.objects.filter(
-            employee=employee,
-            timestamp__date=target_date
+        tracks = GPSTrack.objects.for_day(target_date).filter(
+            employee=employee
         ).order_by('timestamp')
         
         # Get check-in/check-out for the date
-        checkin = GPSCheckIn.objects.filter(
-            employee=employee,
-            check_in_time__date=target_date
+        checkin = GPSCheckIn.objects.for_day(target_date).filter(
+            employee=employee
         ).first()
         
+        # Smoothed positions where the track has been cleaned; rejected outliers are left out
         route_points = []
-        for track in tracks:
+        for track in tracks.filter(is_outlier=False):
+            position = track_position(track)
             route_points.append({
-                'latitude': float(track.latitude),
-                'longitude': float(track.longitude),
+                'latitude': position['latitude'],
+                'longitude': position['longitude'],
                 'timestamp': track.timestamp.isoformat(),
                 'address': track.address,
                 'speed': track.speed,
@@ -1740,12 +1703,15 @@ def api_employee_route_history(request):
                 'status': track.get_status_display()
             })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'employee_name': f"{employee.admin.first_name} {employee.admin.last_name}",
             'date': target_date.isoformat(),
             'route_points': route_points,
             'total_points': len(route_points),
+            'total_distance_km': round(path_length(
+                [point['latitude'] for point in route_points], [point['longitude'] for point in route_points]
+            ) / 1000, 2),
             'check_in_time': checkin.check_in_time.isoformat() if checkin else None,
             'check_out_time': checkin.check_out_time.isoformat() if checkin and checkin.check_out_time else None,
             'work_summary': checkin.work_summary if checkin else '',
@@ -1753,7 +1719,7 @@ def api_employee_route_history(request):
         })
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 
 @login_required
@@ -1766,19 +1732,18 @@ def api_geofence_status(request):
                 manager = Manager.objects.get(admin=request.user)
                 employees = Employee.objects.filter(division=manager.division)
             except Manager.DoesNotExist:
-                return JsonResponse({'error': 'Manager profile not found'}, status=403)
+                return FastJsonResponse({'error': 'Manager profile not found'}, status=403)
         elif request.user.user_type == '1':  # Admin/CEO
             employees = Employee.objects.all()
         else:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
+            return FastJsonResponse({'error': 'Permission denied'}, status=403)
         
         today = timezone.localdate()
         geofence_status = []
         
         # Get employees who are currently checked in
-        active_checkins = GPSCheckIn.objects.filter(
+        active_checkins = GPSCheckIn.objects.for_day(today).filter(
             employee__in=employees,
-            check_in_time__date=today,
             check_out_time__isnull=True
         ).select_related('employee', 'employee__admin', 'employee__department')
         
@@ -1828,7 +1793,7 @@ def api_geofence_status(request):
                 
                 geofence_status.append(employee_geofence_status)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'geofence_status': geofence_status,
             'total_active_employees': len(geofence_status),
@@ -1837,4 +1802,4 @@ def api_geofence_status(request):
         })
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
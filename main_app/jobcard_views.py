@@ -10,6 +10,8 @@ import json
 
 from .models import *
 from .forms import JobCardForm, JobCardUpdateForm, JobCardCommentForm, JobCardTimeLogForm
+from services.customer_locations import nearby_customers
+from services.jobcard_stats import admin_job_card_stats, employee_job_card_stats, manager_job_card_stats
 
 
 # ===============================
@@ -50,14 +52,8 @@ def admin_job_card_dashboard(request):
     page_number = request.GET.get('page')
     job_cards_page = paginator.get_page(page_number)
     
-    # Statistics
-    total_job_cards = JobCard.objects.count()
-    active_job_cards = JobCard.objects.filter(status__in=['PENDING', 'IN_PROGRESS']).count()
-    completed_job_cards = JobCard.objects.filter(status='COMPLETED').count()
-    overdue_job_cards = JobCard.objects.filter(
-        due_date__lt=timezone.now(),
-        status__in=['PENDING', 'IN_PROGRESS']
-    ).count()
+    # Statistics (one cached aggregate query)
+    stats = admin_job_card_stats()
     
     # Get users for assignment filter
     users = CustomUser.objects.filter(user_type__in=['2', '3']).order_by('first_name', 'last_name')
@@ -65,10 +61,10 @@ def admin_job_card_dashboard(request):
     context = {
         'page_title': 'Admin Job Card Dashboard',
         'job_cards': job_cards_page,
-        'total_job_cards': total_job_cards,
-        'active_job_cards': active_job_cards,
-        'completed_job_cards': completed_job_cards,
-        'overdue_job_cards': overdue_job_cards,
+        'total_job_cards': stats['total'],
+        'active_job_cards': stats['active'],
+        'completed_job_cards': stats['completed'],
+        'overdue_job_cards': stats['overdue'],
         'users': users,
         'status_choices': JobCard.STATUS_CHOICES,
         'priority_choices': JobCard.PRIORITY_CHOICES,
@@ -156,22 +152,16 @@ def manager_job_card_dashboard(request):
     page_number = request.GET.get('page')
     job_cards_page = paginator.get_page(page_number)
     
-    # Statistics
-    total_job_cards = job_cards.count()
-    active_job_cards = job_cards.filter(status__in=['PENDING', 'IN_PROGRESS']).count()
-    completed_job_cards = job_cards.filter(status='COMPLETED').count()
-    overdue_job_cards = job_cards.filter(
-        due_date__lt=timezone.now(),
-        status__in=['PENDING', 'IN_PROGRESS']
-    ).count()
+    # Statistics for the whole division scope (one cached aggregate query)
+    stats = manager_job_card_stats(request.user, manager)
     
     context = {
         'page_title': 'Manager Job Card Dashboard',
         'job_cards': job_cards_page,
-        'total_job_cards': total_job_cards,
-        'active_job_cards': active_job_cards,
-        'completed_job_cards': completed_job_cards,
-        'overdue_job_cards': overdue_job_cards,
+        'total_job_cards': stats['total'],
+        'active_job_cards': stats['active'],
+        'completed_job_cards': stats['completed'],
+        'overdue_job_cards': stats['overdue'],
         'status_choices': JobCard.STATUS_CHOICES,
         'priority_choices': JobCard.PRIORITY_CHOICES,
         'current_filters': {
@@ -234,9 +224,11 @@ def employee_job_card_dashboard(request):
         job_cards = JobCard.objects.filter(
             assigned_to=employee
         ).select_related('assigned_by', 'customer')
+        stats = employee_job_card_stats(employee)
     except AttributeError:
         # User doesn't have an employee profile
         job_cards = JobCard.objects.none()
+        stats = {'total': 0, 'active': 0, 'completed': 0, 'overdue': 0}
     
     # Apply filters
     if status_filter:
@@ -249,22 +241,13 @@ def employee_job_card_dashboard(request):
     page_number = request.GET.get('page')
     job_cards_page = paginator.get_page(page_number)
     
-    # Statistics
-    total_job_cards = job_cards.count()
-    active_job_cards = job_cards.filter(status__in=['PENDING', 'IN_PROGRESS']).count()
-    completed_job_cards = job_cards.filter(status='COMPLETED').count()
-    overdue_job_cards = job_cards.filter(
-        due_date__lt=timezone.now(),
-        status__in=['PENDING', 'IN_PROGRESS']
-    ).count()
-    
     context = {
         'page_title': 'My Job Cards',
         'job_cards': job_cards_page,
-        'total_job_cards': total_job_cards,
-        'active_job_cards': active_job_cards,
-        'completed_job_cards': completed_job_cards,
-        'overdue_job_cards': overdue_job_cards,
+        'total_job_cards': stats['total'],
+        'active_job_cards': stats['active'],
+        'completed_job_cards': stats['completed'],
+        'overdue_job_cards': stats['overdue'],
         'status_choices': JobCard.STATUS_CHOICES,
         'priority_choices': JobCard.PRIORITY_CHOICES,
         'current_filters': {
@@ -400,11 +383,23 @@ def job_card_detail(request, job_card_id):
         except Exception:
             pass
     
+    # Other customers around this one, to suggest combining visits
+    nearby = []
+    customer = job_card.customer
+    if customer is not None and customer.latitude is not None and customer.longitude is not None:
+        nearby = [
+            c for c in nearby_customers(customer.latitude, customer.longitude, limit=6,
+                                        employee_id=job_card.assigned_to_id)
+            if c['id'] != customer.id
+        ][:5]
+    
     context = {
         'page_title': f'Job Card - {job_card.job_card_number}',
         'job_card': job_card,
         'comments': comments,
         'time_logs': time_logs,
+        'visits': job_card.visits.select_related('stop'),
+        'nearby_customers': nearby,
         'update_form': update_form,
         'comment_form': comment_form,
         'time_log_form': time_log_form,
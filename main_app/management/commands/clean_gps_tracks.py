@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from services.track_cleaning import clean_days
+
+
+class Command(BaseCommand):
+    help = 'Smooth stored GPS tracks, flag outliers and rebuild route summaries for past days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Number of days back from today (default 30)')
+        parser.add_argument('--employee', type=int, action='append', dest='employee_ids',
+                            help='Only this employee id (repeatable)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        total = 0
+        for offset in range(options['days'] - 1, -1, -1):
+            day = today - timedelta(days=offset)
+            cleaned = clean_days(day, options['employee_ids'])
+            total += cleaned
+            if cleaned:
+                self.stdout.write(f'{day}: {cleaned} routes')
+        self.stdout.write(self.style.SUCCESS(f'Cleaned {total} GPS routes'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from services.gps_ingest import GPSBufferFlusher
+
+
+class Command(BaseCommand):
+    help = 'Write buffered GPS fixes to the database, continuously or (with --once) until the buffer is empty.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the buffer and exit')
+
+    def handle(self, *args, **options):
+        flusher = GPSBufferFlusher()
+        if options['once']:
+            self.stdout.write(self.style.SUCCESS(f'Flushed {flusher.drain()} GPS fixes'))
+            return
+        self.stdout.write(f'Flushing GPS fixes every {flusher.flush_ms} ms or {flusher.batch_size} fixes')
+        flusher.run_forever()
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services.geocoding import geocode_pending, pending_customers
+
+
+class Command(BaseCommand):
+    help = 'Look up coordinates for customers with an address but no location.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Most customers to geocode (default: all pending)')
+
+    def handle(self, *args, **options):
+        if not settings.GEOCODING_ENABLED:
+            self.stdout.write(self.style.WARNING(
+                'Geocoding is disabled: set GOOGLE_MAPS_API_KEY, GEOCODING_URL or GEOCODING_ENABLED'))
+            return
+        limit = options['limit'] or pending_customers().count()
+        if not limit:
+            self.stdout.write('No customers to geocode')
+            return
+        found, tried = geocode_pending(limit)
+        self.stdout.write(self.style.SUCCESS(f'Geocoded {found} of {tried} customers'))
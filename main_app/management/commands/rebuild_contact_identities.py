@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main_app.cache_utils import bump_namespace
+from main_app.models import ContactIdentity, Customer, CustomerContact
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the normalized phone/email index used to route inbound messages.'
+
+    def handle(self, *args, **options):
+        identities = []
+        for customer in Customer.objects.only('id', 'phone_primary', 'email').iterator():
+            identities.extend(ContactIdentity.identities_for(customer.phone_primary, customer.email, customer.id))
+        for contact in CustomerContact.objects.only('id', 'customer_id', 'phone', 'email').iterator():
+            identities.extend(ContactIdentity.identities_for(contact.phone, contact.email,
+                                                             contact.customer_id, contact.id))
+
+        with transaction.atomic():
+            ContactIdentity.objects.all().delete()
+            ContactIdentity.objects.bulk_create(identities, batch_size=1000)
+        bump_namespace('contact_identity')
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(identities)} contact identities'))
@@ -8,33 +8,24 @@ from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,redirect, render)
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
+from django.db.models import F, Value
+from django.db.models.functions import Concat
 from django.utils import timezone
 
 from .forms import *
 from .models import *
-from .utils import get_attendance_stats
+from .responses import FastJsonResponse
+from services.dashboard_metrics import fragment_cache_context, manager_dashboard_metrics
+from services.attendance import save_attendance_bulk, update_attendance_bulk
 
 
 def manager_home(request):
-    manager = get_object_or_404(Manager, admin=request.user)
-    total_employees = Employee.objects.filter(division=manager.division).count()
-    total_leave = LeaveReportManager.objects.filter(manager=manager).count()
-    departments = Department.objects.filter(division=manager.division)
-    total_department = departments.count()
-    total_attendance = Attendance.objects.filter(department__in=departments).count()
-    
-    # Use utility function for attendance stats
-    department_list, attendance_list = get_attendance_stats(departments)
-    
-
+    manager = get_object_or_404(Manager.objects.select_related('admin', 'division'), admin=request.user)
     context = {
         'page_title': 'Manager Panel - ' + str(manager.admin.last_name) + ' (' + str(manager.division) + ')',
-        'total_employees': total_employees,
-        'total_attendance': total_attendance,
-        'total_leave': total_leave,
-        'total_department': total_department,
-        'department_list': department_list,
-        'attendance_list': attendance_list,
+        'manager': manager,
+        **manager_dashboard_metrics(manager),
+        **fragment_cache_context(),
     }
     return render(request, 'manager_template/home_content.html', context)
 
@@ -55,17 +46,12 @@ def get_employees(request):
     department_id = request.POST.get('department')
     try:
         department = get_object_or_404(Department, id=department_id)
-        employees = Employee.objects.filter(division_id=department.division.id)
-        employee_data = []
-        for employee in employees:
-            data = {
-                "id": employee.id,
-                "name": employee.admin.last_name + " " + employee.admin.first_name
-            }
-            employee_data.append(data)
-        return JsonResponse(json.dumps(employee_data), content_type='application/json', safe=False)
+        employees = Employee.objects.filter(division_id=department.division_id).values(
+            'id', name=Concat('admin__last_name', Value(' '), 'admin__first_name')
+        )
+        return FastJsonResponse(employees, safe=False)
     except Exception as e:
-        return e
+        return FastJsonResponse({'status': 'ERROR', 'error': str(e)}, status=400)
 
 
 
@@ -74,28 +60,14 @@ def save_attendance(request):
     employee_data = request.POST.get('employee_ids')
     date = request.POST.get('date')
     department_id = request.POST.get('department')
-    employees = json.loads(employee_data)
     try:
-        department = get_object_or_404(Department, id=department_id)
-
-        # Check if an attendance object already exists for the given date
-        attendance, created = Attendance.objects.get_or_create(department=department, date=date)
-
-        for employee_dict in employees:
-            employee = get_object_or_404(Employee, id=employee_dict.get('id'))
-
-            # Check if an attendance report already exists for the employee and the attendance object
-            attendance_report, report_created = AttendanceReport.objects.get_or_create(employee=employee, attendance=attendance)
-
-            # Update the status only if the attendance report was newly created
-            if report_created:
-                attendance_report.status = employee_dict.get('status')
-                attendance_report.save()
-
+        employees = json.loads(employee_data)
+        department = Department.objects.get(id=department_id)
+        attendance, results = save_attendance_bulk(department, date, employees)
     except Exception as e:
-        return None
+        return JsonResponse({'status': 'ERROR', 'error': str(e)}, status=400)
 
-    return HttpResponse("OK")
+    return JsonResponse({'status': 'OK', 'attendance': attendance.id, 'results': results})
 
 
 def manager_update_attendance(request):
@@ -114,36 +86,28 @@ def get_employee_attendance(request):
     attendance_date_id = request.POST.get('attendance_date_id')
     try:
         date = get_object_or_404(Attendance, id=attendance_date_id)
-        attendance_data = AttendanceReport.objects.filter(attendance=date)
-        employee_data = []
-        for attendance in attendance_data:
-            data = {"id": attendance.employee.admin.id,
-                    "name": attendance.employee.admin.last_name + " " + attendance.employee.admin.first_name,
-                    "status": attendance.status}
-            employee_data.append(data)
-        return JsonResponse(json.dumps(employee_data), content_type='application/json', safe=False)
+        reports = AttendanceReport.objects.filter(attendance=date).values(
+            'status',
+            admin_id=F('employee__admin_id'),
+            name=Concat('employee__admin__last_name', Value(' '), 'employee__admin__first_name'),
+        )
+        return FastJsonResponse(reports, safe=False)
     except Exception as e:
-        return e
+        return FastJsonResponse({'status': 'ERROR', 'error': str(e)}, status=400)
 
 
 @csrf_exempt
 def update_attendance(request):
     employee_data = request.POST.get('employee_ids')
     date = request.POST.get('date')
-    employees = json.loads(employee_data)
     try:
-        attendance = get_object_or_404(Attendance, id=date)
-
-        for employee_dict in employees:
-            employee = get_object_or_404(
-                Employee, admin_id=employee_dict.get('id'))
-            attendance_report = get_object_or_404(AttendanceReport, employee=employee, attendance=attendance)
-            attendance_report.status = employee_dict.get('status')
-            attendance_report.save()
+        employees = json.loads(employee_data)
+        attendance = Attendance.objects.get(id=date)
+        results = update_attendance_bulk(attendance, employees)
     except Exception as e:
-        return None
+        return JsonResponse({'status': 'ERROR', 'error': str(e)}, status=400)
 
-    return HttpResponse("OK")
+    return JsonResponse({'status': 'OK', 'results': results})
 
 
 def manager_apply_leave(request):
@@ -322,9 +286,8 @@ def manager_gps_attendance(request):
     team_employees = Employee.objects.filter(division=manager.division)
     
     # Get today's team check-ins
-    today_team_checkins = GPSCheckIn.objects.filter(
-        employee__in=team_employees,
-        check_in_time__date=today
+    today_team_checkins = GPSCheckIn.objects.for_day(today).filter(
+        employee__in=team_employees
     ).select_related('employee', 'employee__admin').order_by('-check_in_time')
     
     checked_in_count = today_team_checkins.count()
@@ -396,9 +359,9 @@ def manager_gps_history(request):
     
     # Apply filtering
     if start_date:
-        checkins = checkins.filter(check_in_time__date__gte=start_date)
+        checkins = checkins.between(start_date=start_date)
     if end_date:
-        checkins = checkins.filter(check_in_time__date__lte=end_date)
+        checkins = checkins.between(end_date=end_date)
     if employee_filter:
         checkins = checkins.filter(employee_id=employee_filter)
     
@@ -1,8 +1,13 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.utils.deprecation import MiddlewareMixin
 from django.urls import reverse
 from django.shortcuts import redirect
 from django.utils import timezone
 
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .db_routing import pin_to_primary, replica_alias, track_writes, untracked_writes
+
 
 class LoginCheckMiddleWare(MiddlewareMixin):
     def process_view(self, request, view_func, view_args, view_kwargs):
@@ -12,7 +17,8 @@ class LoginCheckMiddleWare(MiddlewareMixin):
             # Update user online status and last seen timestamp
             user.is_online = True
             user.last_seen = timezone.now()
-            user.save(update_fields=['is_online', 'last_seen'])
+            with untracked_writes():
+                user.save(update_fields=['is_online', 'last_seen'])
             if user.user_type == '1': # Is it the CEO/Admin
                 if modulename == 'main_app.employee_views':
                     return redirect(reverse('admin_home'))
@@ -29,3 +35,66 @@ class LoginCheckMiddleWare(MiddlewareMixin):
                 pass
             else:
                 return redirect(reverse('login_page'))
+
+
+class ReplicaPinMiddleware:
+    """Pins users who wrote something to the primary database while the replica catches up"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if replica_alias() is None:
+            return self.get_response(request)
+        with track_writes(request) as state:
+            response = self.get_response(request)
+        if state.wrote and state.user_id:
+            pin_to_primary(state.user_id)
+        return response
+
+    async def __acall__(self, request):
+        if replica_alias() is None:
+            return await self.get_response(request)
+        with track_writes(request) as state:
+            response = await self.get_response(request)
+        if state.wrote:
+            user_id = await sync_to_async(lambda: state.user_id)()
+            if user_id:
+                await sync_to_async(pin_to_primary)(user_id)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs in async mode, so that under ASGI the middleware
+    chain stays async and async views do not each hold a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _static_file(self, request):
+        if self.autorefresh:
+            return self.find_file(request.path_info)
+        return self.files.get(request.path_info)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        static_file = self._static_file(request)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.14 on 2026-10-19 11:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactIdentity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PHONE', 'Phone'), ('EMAIL', 'Email')], max_length=10)),
+                ('value', models.CharField(max_length=254)),
+                ('contact', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='identities', to='main_app.customercontact')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identities', to='main_app.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'value'], name='main_app_co_kind_1ac9f2_idx')],
+            },
+        ),
+    ]
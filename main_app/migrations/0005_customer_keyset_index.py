@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_export_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['created_at', 'id'], name='main_app_cu_created_6781b3_idx'),
+        ),
+    ]
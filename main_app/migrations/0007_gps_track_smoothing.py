@@ -0,0 +1,28 @@
+# Generated by Django 4.2.14 on 2026-10-19 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_gps_track_ingest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='is_outlier',
+            field=models.BooleanField(default=False, help_text='Rejected as an impossible jump; left out of routes and distances'),
+        ),
+        migrations.AddField(
+            model_name='gpstrack',
+            name='smoothed_latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='gpstrack',
+            name='smoothed_longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+    ]
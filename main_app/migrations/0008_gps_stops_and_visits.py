@@ -0,0 +1,64 @@
+# Generated by Django 4.2.14 on 2026-10-19 12:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_gps_track_smoothing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.CreateModel(
+            name='GPSStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arrived_at', models.DateTimeField()),
+                ('departed_at', models.DateTimeField()),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('radius_m', models.FloatField(default=0, help_text='Spread of the fixes around the stop centre')),
+                ('fix_count', models.IntegerField(default=0)),
+                ('is_open', models.BooleanField(default=False, help_text='The employee is still there')),
+                ('customer_distance_m', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='gps_stops', to='main_app.customer')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gps_stops', to='main_app.employee')),
+                ('geofence', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='gps_stops', to='main_app.employeegeofence')),
+            ],
+            options={
+                'ordering': ['-arrived_at'],
+                'unique_together': {('employee', 'arrived_at')},
+            },
+        ),
+        migrations.CreateModel(
+            name='JobCardVisit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arrived_at', models.DateTimeField()),
+                ('departed_at', models.DateTimeField()),
+                ('distance_m', models.FloatField(help_text='Distance from the stop centre to the customer location')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='job_card_visits', to='main_app.employee')),
+                ('job_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='main_app.jobcard')),
+                ('stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='main_app.gpsstop')),
+            ],
+            options={
+                'ordering': ['-arrived_at'],
+                'unique_together': {('job_card', 'stop')},
+            },
+        ),
+    ]
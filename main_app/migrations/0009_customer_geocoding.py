@@ -0,0 +1,22 @@
+# Generated by Django 4.2.14 on 2026-10-19 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_gps_stops_and_visits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='geocoded_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['updated_at'], name='main_app_cu_updated_2b8e1c_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.14 on 2026-10-19 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_customer_geocoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiprocessinglog',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,14 +1,83 @@
+import re
+from email.utils import parseaddr
+
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import UserManager
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from .cache_utils import bump_namespace, invalidate_on
+from .date_utils import date_range_window, day_window
+from .gps_utils import remember_position
+
+
+
+class DateRangeQuerySet(models.QuerySet):
+    """
+    Local-date filtering on ``date_field`` as half-open datetime ranges, so
+    composite indexes on the timestamp column stay usable (unlike ``__date``).
+    """
+    date_field = None
+
+    def for_day(self, day, field=None):
+        start, end = day_window(day)
+        field = field or self.date_field
+        return self.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+
+    def between(self, start_date=None, end_date=None, field=None):
+        """Inclusive local dates; either bound may be None"""
+        start, end = date_range_window(start_date, end_date)
+        field = field or self.date_field
+        lookups = {}
+        if start is not None:
+            lookups[f'{field}__gte'] = start
+        if end is not None:
+            lookups[f'{field}__lt'] = end
+        return self.filter(**lookups)
+
+
+class TimestampQuerySet(DateRangeQuerySet):
+    date_field = 'timestamp'
+
+
+class CreatedAtQuerySet(DateRangeQuerySet):
+    date_field = 'created_at'
+
+
+class JobCardQuerySet(DateRangeQuerySet):
+    date_field = 'due_date'
+
+
+class GPSCheckInQuerySet(DateRangeQuerySet):
+    date_field = 'check_in_time'
+
+
+class GPSStopQuerySet(DateRangeQuerySet):
+    date_field = 'arrived_at'
+
+
+class ManagerQuerySet(models.QuerySet):
+    def with_profile(self):
+        """Eager-load the user account and division rendered next to a manager"""
+        return self.select_related('admin', 'division')
 
 
+class EmployeeQuerySet(models.QuerySet):
+    def with_profile(self):
+        """Eager-load the user account, division and department rendered next to an employee"""
+        return self.select_related('admin', 'division', 'department')
+
+
+class AttendanceReportQuerySet(models.QuerySet):
+    def with_employee(self):
+        """Eager-load the employee (and their user account) of each report"""
+        return self.select_related('employee__admin', 'attendance')
+
 
 class CustomUserManager(UserManager):
     def _create_user(self, email, password, **extra_fields):
@@ -72,6 +141,8 @@ class Manager(models.Model):
     division = models.ForeignKey(Division, on_delete=models.DO_NOTHING, null=True, blank=False)
     admin = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
 
+    objects = ManagerQuerySet.as_manager()
+
     def __str__(self):
         return self.admin.last_name + " " + self.admin.first_name
 
@@ -91,6 +162,8 @@ class Employee(models.Model):
     division = models.ForeignKey(Division, on_delete=models.DO_NOTHING, null=True, blank=False)
     department = models.ForeignKey(Department, on_delete=models.DO_NOTHING, null=True, blank=False)
 
+    objects = EmployeeQuerySet.as_manager()
+
     def __str__(self):
         return self.admin.last_name + ", " + self.admin.first_name
 
@@ -110,6 +183,8 @@ class AttendanceReport(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AttendanceReportQuerySet.as_manager()
+
 
 class LeaveReportEmployee(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
@@ -211,6 +286,11 @@ class Customer(models.Model):
     code = models.CharField(max_length=60, unique=True)
     city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True)
     address = models.TextField(blank=True)
+    # Where visits to the customer are expected; GPS stops are matched against it
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Last geocoding attempt (services.geocoding); empty for coordinates entered by hand
+    geocoded_at = models.DateTimeField(null=True, blank=True, editable=False)
     phone_primary = models.CharField(max_length=30, blank=True)
     email = models.EmailField(blank=True)
     active = models.BooleanField(default=True)
@@ -218,6 +298,12 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -234,6 +320,90 @@ class CustomerContact(models.Model):
         return f"{self.name} - {self.customer.name}"
 
 
+class ContactIdentityManager(models.Manager):
+    def sync_customer(self, customer):
+        """Rebuild the customer-level identities (primary phone and email)"""
+        self.filter(customer=customer, contact__isnull=True).delete()
+        self.bulk_create(ContactIdentity.identities_for(customer.phone_primary, customer.email, customer.id))
+
+    def sync_contact(self, contact):
+        """Rebuild the identities of a single customer contact"""
+        self.filter(contact=contact).delete()
+        self.bulk_create(ContactIdentity.identities_for(contact.phone, contact.email,
+                                                        contact.customer_id, contact.id))
+
+
+class ContactIdentity(models.Model):
+    """Normalized phone/email index used to route inbound messages to customers"""
+    KIND_CHOICES = (
+        ("PHONE", "Phone"),
+        ("EMAIL", "Email"),
+    )
+    MIN_PHONE_DIGITS = 6
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.CharField(max_length=254)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="identities")
+    contact = models.ForeignKey(CustomerContact, on_delete=models.CASCADE, null=True, blank=True, related_name="identities")
+
+    objects = ContactIdentityManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'value']),
+        ]
+
+    @staticmethod
+    def normalize_phone(raw):
+        """Keep only the significant trailing digits so '+91 98450-12345' matches '09845012345'"""
+        digits = re.sub(r'\D', '', raw or '')
+        if len(digits) < ContactIdentity.MIN_PHONE_DIGITS:
+            return ''
+        return digits[-getattr(settings, 'CONTACT_PHONE_MATCH_DIGITS', 10):]
+
+    @staticmethod
+    def normalize_email(raw):
+        """Lowercase the address part, so 'Ravi <Ravi@Mill.com>' matches 'ravi@mill.com'"""
+        return (parseaddr(raw or '')[1] or raw or '').strip().lower()
+
+    @classmethod
+    def identities_for(cls, phone, email, customer_id, contact_id=None):
+        identities = []
+        phone = cls.normalize_phone(phone)
+        email = cls.normalize_email(email)
+        if phone:
+            identities.append(cls(kind='PHONE', value=phone, customer_id=customer_id, contact_id=contact_id))
+        if email:
+            identities.append(cls(kind='EMAIL', value=email, customer_id=customer_id, contact_id=contact_id))
+        return identities
+
+    def __str__(self):
+        return f"{self.kind} {self.value} -> {self.customer_id}"
+
+
+@receiver(post_save, sender=Customer)
+def sync_customer_identities(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ContactIdentity.objects.sync_customer(instance)
+    bump_namespace('contact_identity')
+
+
+@receiver(post_save, sender=CustomerContact)
+def sync_contact_identities(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ContactIdentity.objects.sync_contact(instance)
+    bump_namespace('contact_identity')
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=CustomerContact)
+def drop_contact_identities(sender, instance, **kwargs):
+    # Rows go away through the cascade; only the resolver cache needs flushing
+    bump_namespace('contact_identity')
+
+
 class Item(models.Model):
     CATEGORY_CHOICES = (
         ("YARN", "Yarn"),
@@ -248,6 +418,52 @@ class Item(models.Model):
         return self.name
 
 
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=CustomerContact)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=CustomerContact)
+@receiver(post_delete, sender=Item)
+def refresh_extraction_catalog(sender, **kwargs):
+    # Field report extraction engines rebuild their name automaton on next use
+    bump_namespace('extraction_catalog')
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def flush_customer_totals(sender, **kwargs):
+    bump_namespace('customer_totals')
+
+
+@receiver(pre_save, sender=Customer)
+def reset_geocoded_location(sender, instance, raw=False, **kwargs):
+    """A geocoded location follows the address; coordinates entered by hand are kept"""
+    if raw or instance.pk is None or instance.geocoded_at is None:
+        return
+    previous = Customer.objects.filter(pk=instance.pk).values('address', 'city_id', 'latitude', 'longitude').first()
+    if (previous and (previous['address'], previous['city_id']) != (instance.address, instance.city_id)
+            and (previous['latitude'], previous['longitude']) == (instance.latitude, instance.longitude)):
+        instance.latitude = instance.longitude = instance.geocoded_at = None
+
+
+@receiver(post_save, sender=Customer)
+def geocode_customer_address(sender, instance, raw=False, **kwargs):
+    if raw or instance.latitude is not None or instance.geocoded_at is not None or not instance.address.strip():
+        return
+    from services.geocoding import queue_geocoding
+    queue_geocoding()
+
+
+@receiver(post_delete, sender=Customer)
+def drop_customer_location(sender, **kwargs):
+    # The in-memory customer location index syncs saves by updated_at; deletes need a rebuild
+    bump_namespace('customer_locations')
+
+
+# Dropdown / lookup lists served by services.reference_data
+invalidate_on('reference_data', City, Item)
+
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ("DRAFT", "Draft"),
@@ -264,6 +480,8 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CreatedAtQuerySet.as_manager()
+
     def __str__(self):
         return f"Order #{self.id} - {self.customer.name}"
 
@@ -294,6 +512,8 @@ class JobCardAction(models.Model):
     note_text = models.TextField(blank=True)
     structured_json = models.JSONField(null=True, blank=True)
 
+    objects = TimestampQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.action} on {self.jobcard} by {self.actor}"
 
@@ -320,6 +540,81 @@ class CommunicationLog(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     linkages = models.JSONField(null=True, blank=True)
 
+    objects = TimestampQuerySet.as_manager()
+
+
+class InboundMessage(models.Model):
+    """Raw inbound webhook payloads, stored as received and processed by workers"""
+    CHANNEL_CHOICES = (
+        ("WHATSAPP", "WhatsApp"),
+        ("EMAIL", "Email"),
+    )
+    STATUS_CHOICES = (
+        ("PENDING", "Pending"),
+        ("PROCESSED", "Processed"),
+        ("FAILED", "Failed"),
+    )
+
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    provider_message_id = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['channel', 'provider_message_id'],
+                condition=~models.Q(provider_message_id=''),
+                name='unique_inbound_provider_message',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} {self.provider_message_id or self.id} ({self.status})"
+
+
+class ExportJob(models.Model):
+    """Background data export, written to storage and downloaded when done"""
+    FORMAT_CHOICES = (
+        ("csv", "CSV"),
+        ("xlsx", "Excel"),
+    )
+    STATUS_CHOICES = (
+        ("PENDING", "Pending"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    )
+
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='export_jobs')
+    dataset = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default="csv")
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+    file = models.FileField(upload_to='exports/%Y/%m/', blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a worker claimed the job; RUNNING jobs with a stale claim are failed
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.dataset}.{self.format} ({self.status})"
+
 
 class Targets(models.Model):
     staff = models.ForeignKey(Employee, on_delete=models.CASCADE)
@@ -475,6 +770,8 @@ class AIProcessingLog(models.Model):
     error_message = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    # When a batch worker moved the log to PROCESSING; stale claims are requeued
+    claimed_at = models.DateTimeField(null=True, blank=True)
 
 
 
@@ -538,6 +835,23 @@ class EmployeeTask(models.Model):
         return None
 
 
+@receiver(post_save, sender=Manager)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=Division)
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=LeaveReportManager)
+@receiver(post_save, sender=EmployeeTask)
+@receiver(post_delete, sender=Manager)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Division)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=LeaveReportManager)
+@receiver(post_delete, sender=EmployeeTask)
+def flush_dashboard_metrics(sender, **kwargs):
+    """Home dashboard counters depend on these models"""
+    bump_namespace('dashboard_metrics')
+
+
 class JobCard(models.Model):
     """Job Card system for task assignment and tracking"""
     
@@ -594,6 +908,8 @@ class JobCard(models.Model):
     
     # Timestamps
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = JobCardQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_date']
@@ -605,6 +921,8 @@ class JobCard(models.Model):
     
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        # Dashboard job card stats are cached per scope
+        bump_namespace('jobcard_stats')
     
     def __str__(self):
         return f"JC-{self.id} - {self.get_type_display() or 'Job Card'}"
@@ -689,6 +1007,11 @@ class JobCard(models.Model):
         return colors.get(self.priority, 'secondary')
 
 
+@receiver(post_delete, sender=JobCard)
+def flush_jobcard_stats(sender, **kwargs):
+    bump_namespace('jobcard_stats')
+
+
 class JobCardComment(models.Model):
     """Comments and updates on job cards"""
     job_card = models.ForeignKey(JobCard, on_delete=models.CASCADE, related_name='comments')
@@ -868,7 +1191,16 @@ class GPSTrack(models.Model):
     heading = models.FloatField(null=True, blank=True, help_text='Direction in degrees')
     battery_level = models.IntegerField(null=True, blank=True, help_text='Device battery percentage')
     is_active = models.BooleanField(default=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # When the fix was received; set explicitly when buffered fixes are flushed later
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Unique per buffered fix so that replaying a flush never duplicates rows
+    ingest_id = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    # Kalman-smoothed position (services.track_cleaning); empty until cleaned and for outliers
+    smoothed_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    smoothed_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    is_outlier = models.BooleanField(default=False, help_text='Rejected as an impossible jump; left out of routes and distances')
+
+    objects = TimestampQuerySet.as_manager()
     
     class Meta:
         ordering = ['-timestamp']
@@ -881,6 +1213,13 @@ class GPSTrack(models.Model):
         return f'{self.employee.admin.first_name} - {self.get_status_display()} at {self.timestamp.strftime("%H:%M")}'
 
 
+@receiver(post_save, sender=GPSTrack)
+def remember_latest_track(sender, instance, created=False, raw=False, **kwargs):
+    """Live location endpoints read each employee's newest fix from the cache"""
+    if created and not raw:
+        remember_position(instance)
+
+
 class GPSCheckIn(models.Model):
     """GPS-based check-in/check-out records"""
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='gps_checkins')
@@ -898,6 +1237,8 @@ class GPSCheckIn(models.Model):
     is_approved = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = GPSCheckInQuerySet.as_manager()
     
     class Meta:
         ordering = ['-check_in_time']
@@ -953,6 +1294,12 @@ class EmployeeGeofence(models.Model):
         return f'{self.name} ({self.get_fence_type_display()})'
 
 
+# Employee, check-in and geofence state cached for the GPS ingest path (services.gps_ingest)
+invalidate_on('gps_ingest', Employee, GPSCheckIn, EmployeeGeofence)
+# Geofences indexed in memory for visit matching (services.dwell)
+invalidate_on('visit_places', EmployeeGeofence)
+
+
 class GPSRoute(models.Model):
     """Track employee routes and movements"""
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='gps_routes')
@@ -976,6 +1323,58 @@ class GPSRoute(models.Model):
         return f'{self.employee.admin.first_name} - {self.date}'
 
 
+class GPSStop(models.Model):
+    """A place an employee stayed at, detected from their GPS track (services.dwell)"""
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='gps_stops')
+    arrived_at = models.DateTimeField()
+    departed_at = models.DateTimeField()
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    radius_m = models.FloatField(default=0, help_text='Spread of the fixes around the stop centre')
+    fix_count = models.IntegerField(default=0)
+    is_open = models.BooleanField(default=False, help_text='The employee is still there')
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='gps_stops')
+    geofence = models.ForeignKey(EmployeeGeofence, on_delete=models.SET_NULL, null=True, blank=True, related_name='gps_stops')
+    customer_distance_m = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = GPSStopQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-arrived_at']
+        unique_together = ['employee', 'arrived_at']
+
+    @property
+    def dwell_minutes(self):
+        return round((self.departed_at - self.arrived_at).total_seconds() / 60)
+
+    def __str__(self):
+        return f'{self.employee.admin.first_name} at {self.customer or self.geofence or "unknown place"} ({self.arrived_at.strftime("%H:%M")})'
+
+
+class JobCardVisit(models.Model):
+    """GPS evidence that a job card's assignee was at its customer"""
+    job_card = models.ForeignKey(JobCard, on_delete=models.CASCADE, related_name='visits')
+    stop = models.ForeignKey(GPSStop, on_delete=models.CASCADE, related_name='visits')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='job_card_visits')
+    arrived_at = models.DateTimeField()
+    departed_at = models.DateTimeField()
+    distance_m = models.FloatField(help_text='Distance from the stop centre to the customer location')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-arrived_at']
+        unique_together = ['job_card', 'stop']
+
+    @property
+    def dwell_minutes(self):
+        return round((self.departed_at - self.arrived_at).total_seconds() / 60)
+
+    def __str__(self):
+        return f'Visit for {self.job_card.job_card_number} at {self.arrived_at.strftime("%Y-%m-%d %H:%M")}'
+
+
 class GPSSession(models.Model):
     """Active GPS tracking sessions"""
     SESSION_TYPE_CHOICES = [
@@ -0,0 +1,41 @@
+"""
+Fast JSON responses for the AJAX and GPS endpoints
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+import json
+
+_encoder = DjangoJSONEncoder()
+
+
+def dumps(data) -> bytes:
+    """
+    Serialize ``data`` to JSON bytes; orjson when installed, the stdlib
+    otherwise. Types neither handles natively (Decimal, UUID, lazy strings,
+    timedelta) fall back to DjangoJSONEncoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Drop-in for JsonResponse. Any iterable payload (a list, or a ``values()``
+    / ``values_list()`` queryset) is accepted when ``safe=False`` and encoded
+    once, straight from the rows.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        if not isinstance(data, (dict, list, tuple)):
+            data = list(data)
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
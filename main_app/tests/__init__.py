@@ -0,0 +1,5 @@
+# Per-process caches for tests that touch cached GPS state, so no Redis is needed
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-shared'},
+    'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-l1'},
+}
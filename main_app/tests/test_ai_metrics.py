@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase, override_settings
+
+from main_app.tests import LOCMEM_CACHES
+from services.ai_processor import AIPipelineMetrics
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AIPipelineMetricsTests(SimpleTestCase):
+    def setUp(self):
+        AIPipelineMetrics.reset()
+
+    def test_snapshot(self):
+        AIPipelineMetrics.record_batch(10, 2.0, rule_hits=6, cache_hits=1, model_calls=3,
+                                       model_latencies=[0.2, 0.9, 1.2])
+        snapshot = AIPipelineMetrics.snapshot()
+        self.assertEqual(snapshot['reports'], 10)
+        self.assertEqual(snapshot['reports_per_second'], 5.0)
+        self.assertEqual(snapshot['cache_hit_rate'], 0.25)
+        self.assertEqual(snapshot['rule_hit_rate'], 0.6)
+        self.assertEqual(snapshot['model_latency_ms'], {
+            'mean': 766.7, 'p50': 1000, 'p90': 1500, 'p99': 1500, 'samples': 3,
+        })
+
+    def test_slow_calls_land_past_the_last_bucket(self):
+        AIPipelineMetrics.record_batch(1, 90.0, model_calls=1, model_latencies=[90.0])
+        self.assertIsNone(AIPipelineMetrics.snapshot()['model_latency_ms']['p50'])
+
+    def test_concurrent_workers_keep_every_sample(self):
+        def record(_):
+            AIPipelineMetrics.record_batch(1, 0.1, model_calls=5, model_latencies=[0.05] * 5)
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(record, range(200)))
+        snapshot = AIPipelineMetrics.snapshot()
+        self.assertEqual(snapshot['batches'], 200)
+        self.assertEqual(snapshot['model_latency_ms']['samples'], 1000)
+        self.assertEqual(snapshot['model_latency_ms']['p99'], 100)
+
+    def test_empty(self):
+        latency = AIPipelineMetrics.snapshot()['model_latency_ms']
+        self.assertEqual(latency, {'mean': None, 'p50': None, 'p90': None, 'p99': None, 'samples': 0})
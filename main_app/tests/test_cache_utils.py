@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from main_app.cache_utils import bump_namespace, get_or_compute, local_cache, make_key, namespace_version
+from main_app.models import Item
+from main_app.tests import LOCMEM_CACHES
+
+# Nothing listens on port 1, so every shared cache call fails to connect
+UNREACHABLE_REDIS = {
+    'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:1/0'},
+    'local': LOCMEM_CACHES['local'],
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NamespaceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache().clear()
+
+    def test_bump_changes_the_keys(self):
+        before = make_key('things', 1)
+        bump_namespace('things')
+        self.assertNotEqual(make_key('things', 1), before)
+
+    def test_get_or_compute_reads_through(self):
+        calls = []
+        compute = lambda: calls.append(1) or 'value'
+        self.assertEqual(get_or_compute('things', [1], compute), 'value')
+        local_cache().clear()
+        self.assertEqual(get_or_compute('things', [1], compute), 'value')
+        self.assertEqual(len(calls), 1)
+        bump_namespace('things')
+        get_or_compute('things', [1], compute)
+        self.assertEqual(len(calls), 2)
+
+
+@override_settings(CACHES=UNREACHABLE_REDIS)
+class SharedCacheOutageTests(TestCase):
+    def setUp(self):
+        local_cache().clear()
+
+    def test_reads_fall_back_to_computing(self):
+        with self.assertLogs('main_app.cache_utils', 'WARNING'):
+            self.assertEqual(get_or_compute('things', [1], lambda: 'value'), 'value')
+        # The fallback version is kept in L1, so the key is stable for a while
+        self.assertEqual(namespace_version('things'), namespace_version('things'))
+
+    def test_bump_is_skipped(self):
+        with self.assertLogs('main_app.cache_utils', 'WARNING'):
+            before = make_key('things', 1)
+            bump_namespace('things')
+        # This process stops serving the old version even though L2 was not bumped
+        self.assertNotEqual(make_key('things', 1), before)
+
+    def test_saves_do_not_fail(self):
+        with self.assertLogs('main_app.cache_utils', 'WARNING'):
+            item = Item.objects.create(name='Cotton yarn 40s')
+            item.delete()
+        self.assertFalse(Item.objects.exists())
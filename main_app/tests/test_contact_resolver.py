@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main_app.cache_utils import local_cache
+from main_app.models import ContactIdentity, Customer, CustomerContact
+from main_app.tests import LOCMEM_CACHES
+from services.contact_resolver import lookup_identity, resolve_customer
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_phone_formats_match(self):
+        for raw in ('+91 98450-12345', '09845012345', '(984) 501 2345', 'whatsapp:+919845012345'):
+            self.assertEqual(ContactIdentity.normalize_phone(raw), '9845012345', raw)
+
+    def test_short_or_empty_phone(self):
+        self.assertEqual(ContactIdentity.normalize_phone('12345'), '')
+        self.assertEqual(ContactIdentity.normalize_phone(None), '')
+
+    @override_settings(CONTACT_PHONE_MATCH_DIGITS=8)
+    def test_match_digits_setting(self):
+        self.assertEqual(ContactIdentity.normalize_phone('+91 98450-12345'), '45012345')
+
+    def test_email(self):
+        self.assertEqual(ContactIdentity.normalize_email('Ravi <Ravi@Mill.com>'), 'ravi@mill.com')
+        self.assertEqual(ContactIdentity.normalize_email(' Ravi@Mill.com '), 'ravi@mill.com')
+        self.assertEqual(ContactIdentity.normalize_email(''), '')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache().clear()
+        self.customer = Customer.objects.create(
+            name='Sri Lakshmi Textiles', code='SLT', phone_primary='+91 98450 12345', email='Accounts@SLT.in',
+        )
+
+    def identities(self, **filters):
+        return set(ContactIdentity.objects.filter(**filters).values_list('kind', 'value', 'contact_id'))
+
+    def test_customer_identities_follow_saves(self):
+        self.assertEqual(self.identities(customer=self.customer), {
+            ('PHONE', '9845012345', None), ('EMAIL', 'accounts@slt.in', None),
+        })
+        self.customer.phone_primary = ''
+        self.customer.email = 'sales@slt.in'
+        self.customer.save()
+        self.assertEqual(self.identities(customer=self.customer), {('EMAIL', 'sales@slt.in', None)})
+
+    def test_contact_identities_follow_saves(self):
+        contact = CustomerContact.objects.create(customer=self.customer, name='Ravi', phone='080-4123 4567')
+        self.assertEqual(self.identities(contact=contact), {('PHONE', '8041234567', contact.id)})
+        contact.phone = '080-4123 0000'
+        contact.save()
+        self.assertEqual(self.identities(contact=contact), {('PHONE', '8041230000', contact.id)})
+        # Customer-level identities are untouched by contact changes
+        self.assertEqual(len(self.identities(customer=self.customer, contact__isnull=True)), 2)
+
+    def test_resolve_by_phone_then_email(self):
+        self.assertEqual(resolve_customer(phone='whatsapp:+919845012345'), self.customer)
+        self.assertEqual(resolve_customer(phone='+1 555 0100 999', email='ACCOUNTS@slt.in'), self.customer)
+        self.assertIsNone(resolve_customer(phone='+1 555 0100 999', email='nobody@example.com'))
+
+    def test_customer_identity_wins_over_contact(self):
+        contact = CustomerContact.objects.create(customer=self.customer, name='Ravi', phone='9845012345')
+        self.assertEqual(lookup_identity('PHONE', '9845012345'), (self.customer.id, None))
+        self.customer.phone_primary = ''
+        self.customer.save()
+        self.assertEqual(lookup_identity('PHONE', '9845012345'), (self.customer.id, contact.id))
+
+    def test_cached_lookup_is_invalidated(self):
+        self.assertEqual(lookup_identity('PHONE', '8041234567'), (None, None))
+        contact = CustomerContact.objects.create(customer=self.customer, name='Ravi', phone='8041234567')
+        self.assertEqual(lookup_identity('PHONE', '8041234567'), (self.customer.id, contact.id))
+        contact.delete()
+        self.assertEqual(lookup_identity('PHONE', '8041234567'), (None, None))
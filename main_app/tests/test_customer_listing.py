@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+
+from main_app.cache_utils import local_cache
+from main_app.models import Customer
+from main_app.tests import LOCMEM_CACHES
+from services.customer_listing import customer_listing, customer_page, decode_cursor, encode_cursor
+
+T0 = datetime(2026, 1, 5, 10, 0, tzinfo=dt_timezone.utc)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CustomerListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache().clear()
+        for n in range(23):
+            customer = Customer.objects.create(name=f'Customer {n}', code=f'C{n:02}', active=n % 3 != 0)
+            # Groups of three share a timestamp, so pages must break ties on id
+            Customer.objects.filter(pk=customer.pk).update(created_at=T0 + timedelta(minutes=n // 3))
+        self.newest_first = list(Customer.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def ids(self, page):
+        return [customer.id for customer in page]
+
+    def test_cursor_round_trip(self):
+        customer = Customer.objects.get(code='C07')
+        self.assertEqual(decode_cursor(encode_cursor(customer)), (customer.created_at, customer.id))
+        for bad in ('', None, 'not base64!', encode_cursor(customer)[:-4], 'aGVsbG8'):
+            self.assertIsNone(decode_cursor(bad), bad)
+
+    def test_walk_forward(self):
+        seen = []
+        page = customer_page(page_size=4)
+        self.assertFalse(page.has_previous)
+        while True:
+            seen.extend(self.ids(page))
+            if not page.has_next:
+                break
+            page = customer_page(after=encode_cursor(page.object_list[-1]), page_size=4)
+            self.assertTrue(page.has_previous)
+        self.assertEqual(seen, self.newest_first)
+
+    def test_walk_backward_from_the_last_page(self):
+        page = customer_page(last=True, page_size=4)
+        self.assertEqual(self.ids(page), self.newest_first[-4:])
+        self.assertFalse(page.has_next)
+        seen = self.ids(page)
+        while page.has_previous:
+            page = customer_page(before=encode_cursor(page.object_list[0]), page_size=4)
+            seen = self.ids(page) + seen
+        # Stepping back onto the newest rows returns a full first page, which overlaps
+        self.assertEqual(self.ids(page), self.newest_first[:4])
+        self.assertEqual(list(dict.fromkeys(seen)), self.newest_first)
+
+    def test_malformed_cursor_starts_over(self):
+        self.assertEqual(self.ids(customer_page(after='garbage', page_size=4)), self.newest_first[:4])
+
+    def test_filters_and_totals(self):
+        listing = customer_listing(QueryDict('active=false&search=customer 1'), page_size=4)
+        self.assertEqual((listing['total_customers'], listing['active_customers'], listing['inactive_customers']),
+                         (23, 15, 8))
+        # Inactive customers named 'Customer 1…': 12, 15, 18
+        self.assertEqual(listing['filtered_count'], 3)
+        self.assertEqual(sorted(c.code for c in listing['customers']), ['C12', 'C15', 'C18'])
+        self.assertIn('active=false', listing['customers'].next_url)
+
+    def test_totals_follow_changes(self):
+        self.assertEqual(customer_listing(QueryDict())['total_customers'], 23)
+        Customer.objects.create(name='Newcomer', code='NEW')
+        self.assertEqual(customer_listing(QueryDict())['total_customers'], 24)
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from main_app.db_routing import (
+    PrimaryReplicaRouter, on_replica, read_alias, track_writes, untracked_writes, using_replica
+)
+from main_app.middleware import ReplicaPinMiddleware
+from main_app.models import Customer
+from main_app.tests import LOCMEM_CACHES
+
+router = PrimaryReplicaRouter()
+
+
+def request_for(user_id):
+    request = RequestFactory().get('/')
+    request.user = SimpleNamespace(pk=user_id, is_authenticated=bool(user_id))
+    return request
+
+
+def reads_in(request):
+    with track_writes(request), using_replica():
+        return router.db_for_read(Customer)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, DATABASE_REPLICA_LAG=10)
+@mock.patch('main_app.middleware.replica_alias', return_value='replica')
+@mock.patch('main_app.db_routing.replica_alias', return_value='replica')
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_reads_opt_in_to_the_replica(self, *_):
+        self.assertEqual(read_alias(), 'default')
+        with using_replica():
+            self.assertEqual(router.db_for_read(Customer), 'replica')
+            self.assertEqual(router.db_for_write(Customer), 'default')
+        self.assertEqual(on_replica(Customer.objects.all()).db, 'replica')
+
+    def test_no_replica_configured(self, routing_alias, _):
+        routing_alias.return_value = None
+        with using_replica():
+            self.assertEqual(read_alias(), 'default')
+
+    def test_write_pins_the_rest_of_the_request(self, *_):
+        with track_writes(request_for(1)) as state, using_replica():
+            self.assertEqual(router.db_for_read(Customer), 'replica')
+            router.db_for_write(Customer)
+            self.assertTrue(state.wrote)
+            self.assertEqual(router.db_for_read(Customer), 'default')
+
+    def test_untracked_writes_do_not_pin(self, *_):
+        with track_writes(request_for(1)) as state:
+            with untracked_writes():
+                router.db_for_write(Customer)
+            router.db_for_write(Session)
+            self.assertFalse(state.wrote)
+
+    def test_middleware_pins_the_writer(self, *_):
+        def writing_view(request):
+            router.db_for_write(Customer)
+            return 'response'
+
+        self.assertEqual(ReplicaPinMiddleware(writing_view)(request_for(1)), 'response')
+        self.assertEqual(reads_in(request_for(1)), 'default')
+        self.assertEqual(reads_in(request_for(2)), 'replica')
+        self.assertEqual(reads_in(request_for(None)), 'replica')
+        cache.clear()  # the pin has expired
+        self.assertEqual(reads_in(request_for(1)), 'replica')
+
+    def test_reading_view_does_not_pin(self, *_):
+        ReplicaPinMiddleware(lambda request: router.db_for_read(Customer))(request_for(1))
+        self.assertEqual(reads_in(request_for(1)), 'replica')
+
+    def test_async_middleware_pins_the_writer(self, *_):
+        async def writing_view(request):
+            router.db_for_write(Customer)
+            return 'response'
+
+        self.assertEqual(async_to_sync(ReplicaPinMiddleware(writing_view))(request_for(1)), 'response')
+        self.assertEqual(reads_in(request_for(1)), 'default')
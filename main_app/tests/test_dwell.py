@@ -0,0 +1,96 @@
+from django.test import SimpleTestCase
+
+from services.dwell import Params, StopDetector, detect_stops
+
+PARAMS = Params(radius_m=50, min_dwell_s=300, min_fixes=3, max_gap_s=1800, max_noise=2)
+T0 = 1_700_000_000
+# About 11 m per 0.0001 degree of latitude
+HOME = (12.9700, 77.5900)
+SHOP = (12.9800, 77.5900)
+
+
+def stay(place, start, minutes, every_s=60, jitter=0.0001):
+    """Fixes at ``place`` every ``every_s`` seconds, alternating a few metres either side"""
+    return [
+        (start + i * every_s, place[0] + (jitter if i % 2 else -jitter) / 2, place[1])
+        for i in range(minutes * 60 // every_s)
+    ]
+
+
+def drive(start, frm, to, count=5, every_s=60):
+    return [
+        (start + (i + 1) * every_s,
+         frm[0] + (to[0] - frm[0]) * (i + 1) / (count + 1),
+         frm[1] + (to[1] - frm[1]) * (i + 1) / (count + 1))
+        for i in range(count)
+    ]
+
+
+class StopDetectorTests(SimpleTestCase):
+    def test_two_stops_with_a_drive_between(self):
+        points = stay(HOME, T0, 20)
+        points += drive(points[-1][0], HOME, SHOP)
+        points += stay(SHOP, points[-1][0] + 60, 15)
+        points += drive(points[-1][0], SHOP, HOME)
+        closed, current = detect_stops(points, PARAMS)
+
+        self.assertEqual(len(closed), 2)
+        self.assertIsNone(current)
+        home, shop = closed
+        self.assertEqual(home.arrived_at, T0)
+        self.assertEqual(home.departed_at, T0 + 19 * 60)
+        self.assertEqual(home.fix_count, 20)
+        self.assertAlmostEqual(home.latitude, HOME[0], places=4)
+        self.assertAlmostEqual(shop.latitude, SHOP[0], places=4)
+        self.assertLessEqual(home.radius_m, PARAMS.radius_m)
+
+    def test_short_dwell_is_not_a_stop(self):
+        points = stay(HOME, T0, 4) + drive(T0 + 180, HOME, SHOP)
+        self.assertEqual(detect_stops(points, PARAMS), ([], None))
+
+    def test_too_few_fixes_is_not_a_stop(self):
+        points = [(T0, *HOME), (T0 + 600, *HOME)] + drive(T0 + 600, HOME, SHOP)
+        self.assertEqual(detect_stops(points, PARAMS)[0], [])
+
+    def test_stray_fixes_within_the_noise_limit(self):
+        points = stay(HOME, T0, 10)
+        stray = [(points[-1][0] + 30 * (i + 1), *SHOP) for i in range(PARAMS.max_noise)]
+        points += stray + stay(HOME, stray[-1][0] + 30, 10)
+        closed, current = detect_stops(points, PARAMS)
+        self.assertEqual(closed, [])
+        self.assertEqual(current.arrived_at, T0)
+        self.assertEqual(current.fix_count, 20)
+
+    def test_one_stray_fix_too_many_ends_the_stop(self):
+        points = stay(HOME, T0, 10)
+        points += [(points[-1][0] + 30 * (i + 1), *SHOP) for i in range(PARAMS.max_noise + 1)]
+        closed, _ = detect_stops(points, PARAMS)
+        self.assertEqual(len(closed), 1)
+        self.assertEqual(closed[0].departed_at, T0 + 9 * 60)
+
+    def test_long_gap_ends_the_stop(self):
+        first = stay(HOME, T0, 10)
+        second = stay(HOME, first[-1][0] + PARAMS.max_gap_s + 1, 10)
+        closed, current = detect_stops(first + second, PARAMS)
+        self.assertEqual([stop.arrived_at for stop in closed], [T0])
+        self.assertEqual(current.arrived_at, second[0][0])
+
+    def test_out_of_order_fixes_are_ignored(self):
+        points = stay(HOME, T0, 10)
+        points.insert(5, (T0, *SHOP))
+        _, current = detect_stops(points, PARAMS)
+        self.assertEqual(current.fix_count, 10)
+
+    def test_state_round_trip(self):
+        points = stay(HOME, T0, 20) + drive(T0 + 19 * 60, HOME, SHOP) + stay(SHOP, T0 + 26 * 60, 15)
+        expected = detect_stops(points, PARAMS)
+
+        closed = []
+        state = None
+        for chunk in (points[:7], points[7:23], points[23:]):
+            # As observe_fixes does between batches, through a plain dict
+            detector = StopDetector(PARAMS, dict(state) if state else None)
+            for point in chunk:
+                closed.extend(detector.add(*point))
+            state = detector.state
+        self.assertEqual((closed, detector.current()), expected)
@@ -0,0 +1,103 @@
+import io
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from xml.etree import ElementTree
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from main_app.models import CustomUser, ExportJob
+from main_app.tests import LOCMEM_CACHES
+from services.exports import _column_letter, fail_stale_exports, iter_csv, iter_xlsx, run_export_job
+
+NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def read_sheet(chunks):
+    """{cell ref: (type, text)} of the workbook's only sheet"""
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as workbook:
+        names = workbook.namelist()
+        sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+    cells = {}
+    for cell in sheet.iterfind('.//s:c', NS):
+        value = cell.find('s:v', NS)
+        if value is None:
+            value = cell.find('s:is/s:t', NS)
+        cells[cell.get('r')] = (cell.get('t'), value.text)
+    return names, cells
+
+
+@override_settings(TIME_ZONE='Asia/Kolkata')
+class WriterTests(SimpleTestCase):
+    def test_column_letters(self):
+        self.assertEqual([_column_letter(i) for i in (0, 25, 26, 51, 701, 702)], ['A', 'Z', 'AA', 'AZ', 'ZZ', 'AAA'])
+
+    def test_csv(self):
+        rows = [(1, 'a,b', None, date(2026, 1, 5)), (2, 'plain', Decimal('1.50'), None)]
+        self.assertEqual(''.join(iter_csv(['ID', 'Name', 'Amount', 'Day'], rows, batch_size=1)), (
+            'ID,Name,Amount,Day\r\n1,"a,b",,2026-01-05\r\n2,plain,1.50,\r\n'
+        ))
+
+    def test_xlsx_cells(self):
+        moment = datetime(2026, 1, 5, 4, 30, tzinfo=dt_timezone.utc)
+        rows = [(1, 'Tom & Jerry <Ltd>', True, Decimal('2.5'), moment, None, 'bell\x07')]
+        names, cells = read_sheet(iter_xlsx(['ID', 'Name', 'Approved', 'Amount', 'When', 'Empty', 'Odd'], rows))
+        self.assertIn('[Content_Types].xml', names)
+        self.assertEqual(cells['A1'], ('inlineStr', 'ID'))
+        self.assertEqual(cells['A2'], (None, '1'))
+        self.assertEqual(cells['B2'], ('inlineStr', 'Tom & Jerry <Ltd>'))
+        self.assertEqual(cells['C2'], ('b', '1'))
+        self.assertEqual(cells['D2'], (None, '2.5'))
+        # Datetimes are written in local time
+        self.assertEqual(cells['E2'], ('inlineStr', '2026-01-05 10:00:00'))
+        self.assertNotIn('F2', cells)
+        # Characters XML cannot carry are dropped
+        self.assertEqual(cells['G2'], ('inlineStr', 'bell'))
+
+    def test_xlsx_streams_in_batches(self):
+        chunks = list(iter_xlsx(['N'], ((n,) for n in range(1000)), batch_size=100))
+        self.assertGreater(len(chunks), 5)
+        _, cells = read_sheet(chunks)
+        self.assertEqual(len(cells), 1001)
+        self.assertEqual(cells['A1001'], (None, '999'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            email='ceo@example.com', password='x', user_type=1, first_name='C', last_name='E'
+        )
+
+    def job(self, status, started_minutes_ago=None, created_minutes_ago=0):
+        now = timezone.now()
+        job = ExportJob.objects.create(requested_by=self.admin, dataset='orders', status=status)
+        started_at = None if started_minutes_ago is None else now - timedelta(minutes=started_minutes_ago)
+        ExportJob.objects.filter(pk=job.pk).update(
+            started_at=started_at, created_at=now - timedelta(minutes=created_minutes_ago)
+        )
+        return job
+
+    @override_settings(EXPORT_JOB_TIMEOUT_S=3600)
+    def test_fail_stale_exports(self):
+        stale = self.job('RUNNING', started_minutes_ago=90, created_minutes_ago=95)
+        running = self.job('RUNNING', started_minutes_ago=10, created_minutes_ago=95)
+        unclaimed = self.job('RUNNING', created_minutes_ago=120)
+        pending = self.job('PENDING', created_minutes_ago=120)
+        self.assertEqual(fail_stale_exports(), 2)
+        statuses = dict(ExportJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {
+            stale.pk: 'FAILED', running.pk: 'RUNNING', unclaimed.pk: 'FAILED', pending.pk: 'PENDING',
+        })
+        self.assertTrue(ExportJob.objects.get(pk=stale.pk).finished_at)
+
+    def test_job_runs_once(self):
+        job = self.job('PENDING')
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            done = run_export_job(job.pk)
+            self.assertEqual((done.status, done.row_count), ('DONE', 0))
+            with done.file.open('rb') as export:
+                self.assertTrue(export.read().startswith(b'ID,Order Date,Customer'))
+            self.assertIsNone(run_export_job(job.pk))
@@ -0,0 +1,81 @@
+from django.test import SimpleTestCase, override_settings
+
+from services.ai_processor import AITextProcessor
+from services.extraction import AhoCorasick, ExtractionEngine
+
+ENGINE = ExtractionEngine(
+    customers=[(1, 'Sri Lakshmi Textiles'), (2, 'Lakshmi Mills')],
+    contacts=[(10, 1, 'Ramesh Kumar')],
+    items=[(100, 'Cotton Yarn 40s', 'bales')],
+)
+
+
+def confident(extracted):
+    return AITextProcessor.rules_are_confident(extracted)
+
+
+@override_settings(AI_RULES_CONFIDENCE_THRESHOLD=0.8)
+class ExtractionEngineTests(SimpleTestCase):
+    def test_order_with_catalog_names(self):
+        result = ENGINE.extract(
+            'Visited Sri Lakshmi Textiles, met Ramesh Kumar. Order for 20 bales of cotton yarn 40s @ 250.'
+        )
+        self.assertEqual((result['customer_id'], result['contact_id'], result['item_id']), (1, 10, 100))
+        self.assertEqual(result['visit_outcome'], 'order_taken')
+        self.assertEqual(result['order_details'], {
+            'item': 'cotton yarn 40s', 'quantity': 20, 'unit': 'bales', 'rate': 250, 'amount': 5000,
+        })
+        self.assertTrue(confident(result))
+
+    def test_offsets_point_into_the_text(self):
+        text = 'Met RAMESH KUMAR at the shop'
+        result = ENGINE.extract(text)
+        match = next(m for m in result['matches'] if m['field'] == 'contact_person')
+        self.assertEqual(text[match['start']:match['end']], 'RAMESH KUMAR')
+        # The contact implies their customer
+        self.assertEqual(result['customer_id'], 1)
+
+    def test_longest_name_wins(self):
+        self.assertEqual(ENGINE.extract('Reached Sri Lakshmi Textiles')['customer_id'], 1)
+        self.assertEqual(ENGINE.extract('Reached Lakshmi Mills')['customer_id'], 2)
+
+    def test_names_match_whole_words_only(self):
+        matcher = AhoCorasick()
+        matcher.add('mills', 'm')
+        self.assertEqual(matcher.find('Lakshmi Mills'), [(8, 13, 'm')])
+        self.assertEqual(matcher.find('Millstone'), [])
+
+    def test_payment_collected(self):
+        result = ENGINE.extract('Sri Lakshmi Textiles paid Rs 45,000 by two cheques')
+        self.assertEqual(result['visit_outcome'], 'payment_collected')
+        self.assertEqual(result['payment_details'], {'amount': 45000, 'cheque_count': 2, 'method': 'cheques'})
+        self.assertTrue(confident(result))
+
+    def test_follow_up_date(self):
+        result = ENGINE.extract('Lakshmi Mills asked us to follow up in 3 days')
+        self.assertEqual(result['follow_up_required'], 'yes')
+        self.assertEqual(result['follow_up_date'], 'in 3 days')
+
+    def test_no_outcome_is_not_confident(self):
+        # A known customer and contact alone must not be classified visit_completed
+        # without the model, since that completes the job card
+        result = ENGINE.extract('Visited Sri Lakshmi Textiles and met Ramesh Kumar.')
+        self.assertEqual(result['visit_outcome'], 'visit_completed')
+        self.assertFalse(confident(result))
+
+    def test_order_without_details_is_not_confident(self):
+        result = ENGINE.extract('Met Ramesh Kumar at Sri Lakshmi Textiles, they will place an order.')
+        self.assertEqual(result['visit_outcome'], 'order_taken')
+        self.assertEqual(result['order_details'], {})
+        self.assertFalse(confident(result))
+
+    def test_complaint_is_confident(self):
+        result = ENGINE.extract('Met Ramesh Kumar at Sri Lakshmi Textiles, complaint about damaged bales.')
+        self.assertEqual(result['visit_outcome'], 'complaint')
+        self.assertTrue(confident(result))
+
+    def test_unknown_customer_is_not_confident(self):
+        result = ENGINE.extract('Visited Ganesh Traders, order for 10 bales at rate 200')
+        self.assertIsNone(result['customer_id'])
+        self.assertEqual(result['customer_name'], 'Ganesh Traders')
+        self.assertFalse(confident(result))
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main_app.models import CustomUser, Employee
+from main_app.tests import LOCMEM_CACHES
+from services.gps_filter import IngestFilter, client_timestamp, fix_ingest_id
+from services.gps_ingest import BufferFull, ingest_fixes
+from services.track_cleaning import StreamingCleaner
+
+NOW = datetime(2026, 1, 5, 10, 0, tzinfo=dt_timezone.utc)
+
+
+def fix(seconds, latitude=12.97, longitude=77.59, accuracy=10, status='WORKING', ingest_id=None):
+    return {
+        'latitude': latitude, 'longitude': longitude, 'accuracy': accuracy, 'status': status,
+        'client_timestamp': ingest_id is not None, 'ingest_id': ingest_id or f'server-{seconds}',
+    }, NOW + timedelta(seconds=seconds)
+
+
+class ClientTimestampTests(SimpleTestCase):
+    def test_offsets_are_normalised_to_utc(self):
+        local = client_timestamp({'timestamp': '2026-01-05T15:20:00+05:30'}, NOW)
+        utc = client_timestamp({'timestamp': '2026-01-05T09:55:00+00:00'}, NOW)
+        self.assertEqual(local.utcoffset(), timedelta(0))
+        # 09:50Z from India sorts before 09:55Z, as datetimes and as the ISO strings buffered
+        self.assertLess(local, utc)
+        self.assertLess(local.isoformat(), utc.isoformat())
+        self.assertEqual(fix_ingest_id(1, 'd', local),
+                         fix_ingest_id(1, 'd', client_timestamp({'timestamp': '2026-01-05T09:50:00Z'}, NOW)))
+
+    def test_epoch_and_implausible_values(self):
+        self.assertEqual(client_timestamp({'timestamp': NOW.timestamp() * 1000}, NOW), NOW)
+        self.assertIsNone(client_timestamp({'timestamp': (NOW + timedelta(hours=1)).isoformat()}, NOW))
+        self.assertIsNone(client_timestamp({'timestamp': '2026-13-45T00:00:00'}, NOW))
+        self.assertIsNone(client_timestamp({}, NOW))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GPS_MAX_ACCURACY_M=100, GPS_MIN_DISPLACEMENT_M=15, GPS_MIN_INTERVAL_S=60)
+class IngestFilterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def check(self, ingest_filter, *args, **kwargs):
+        return ingest_filter.check(*fix(*args, **kwargs))
+
+    def test_drop_reasons(self):
+        ingest_filter = IngestFilter(employee_id=1)
+        self.assertTrue(self.check(ingest_filter, 0))
+        self.assertFalse(self.check(ingest_filter, 10, accuracy=500))
+        self.assertFalse(self.check(ingest_filter, 20))  # within 15 m and 60 s
+        self.assertFalse(self.check(ingest_filter, 0, latitude=13.0))  # not newer
+        self.assertTrue(self.check(ingest_filter, 30, latitude=12.971))  # moved about 110 m
+        self.assertTrue(self.check(ingest_filter, 100, latitude=12.971))  # interval elapsed
+        self.assertTrue(self.check(ingest_filter, 110, latitude=12.971, status='CHECKED_OUT'))
+        self.assertEqual(ingest_filter.drop_counts(),
+                         {'malformed': 0, 'duplicate': 0, 'inaccurate': 1, 'stale': 1, 'stationary': 1})
+
+    def test_duplicates_and_forget(self):
+        ingest_filter = IngestFilter(employee_id=1)
+        self.assertTrue(self.check(ingest_filter, 0, ingest_id='abc'))
+        self.assertFalse(IngestFilter(employee_id=1).check(*fix(500, ingest_id='abc')))
+        ingest_filter.forget(fix(0, ingest_id='abc')[0])
+        self.assertTrue(IngestFilter(employee_id=1).check(*fix(500, ingest_id='abc')))
+
+    def test_state_is_shared_through_the_cache(self):
+        ingest_filter = IngestFilter(employee_id=1)
+        self.assertTrue(self.check(ingest_filter, 0))
+        ingest_filter.save()
+        self.assertFalse(self.check(IngestFilter(employee_id=1), 10))
+        self.assertTrue(self.check(IngestFilter(employee_id=2), 10))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IngestRollbackTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = CustomUser.objects.create_user(
+            email='gps@example.com', password='x', user_type=3, first_name='G', last_name='P'
+        )
+        self.user = CustomUser.objects.get(pk=user.pk)
+        self.employee = Employee.objects.get(admin=self.user)
+
+    def ping(self, minutes_ago, latitude=12.97):
+        return {
+            'latitude': latitude, 'longitude': 77.59, 'accuracy': 10,
+            'timestamp': (datetime.now(dt_timezone.utc) - timedelta(minutes=minutes_ago)).isoformat(),
+        }
+
+    @mock.patch('services.gps_ingest.gps_buffer')
+    def test_buffer_full_rolls_back_the_filter(self, gps_buffer):
+        accepted = []
+        gps_buffer.return_value.append.side_effect = accepted.append
+        ingest_fixes(self.user, [self.ping(10)], 'device')
+        filter_state = IngestFilter(self.employee.id).state
+        cleaner_state = StreamingCleaner(self.employee.id).state
+
+        gps_buffer.return_value.append.side_effect = BufferFull()
+        retry = [self.ping(5, latitude=12.971)]
+        with self.assertRaises(BufferFull):
+            ingest_fixes(self.user, retry, 'device')
+        self.assertEqual(IngestFilter(self.employee.id).state, filter_state)
+        self.assertEqual(StreamingCleaner(self.employee.id).state, cleaner_state)
+
+        # The device's retry of the same fix is not taken for a duplicate
+        gps_buffer.return_value.append.side_effect = accepted.append
+        result = ingest_fixes(self.user, retry, 'device')
+        self.assertEqual(len(result['kept']), 1)
+        self.assertEqual(len(accepted), 2)
+
+    @mock.patch('services.gps_ingest.gps_buffer')
+    def test_malformed_fixes_are_dropped_one_by_one(self, gps_buffer):
+        result = ingest_fixes(self.user, [self.ping(3), {'latitude': 'north'}, 'junk'], 'device')
+        self.assertEqual(len(result['kept']), 1)
+        self.assertEqual(result['dropped']['malformed'], 2)
+        with self.assertRaises(ValueError):
+            ingest_fixes(self.user, [{'latitude': 'north'}], 'device')
+
+    @mock.patch('services.gps_ingest.gps_buffer')
+    def test_offline_batch_with_mixed_offsets_is_time_ordered(self, gps_buffer):
+        older = datetime.now(dt_timezone.utc) - timedelta(minutes=10)
+        newer = older + timedelta(minutes=5)
+        result = ingest_fixes(self.user, [
+            {'latitude': 12.98, 'longitude': 77.59, 'timestamp': newer.isoformat()},
+            {'latitude': 12.97, 'longitude': 77.59,
+             'timestamp': older.astimezone(dt_timezone(timedelta(hours=5, minutes=30))).isoformat()},
+        ], 'device')
+        self.assertEqual(len(result['kept']), 2)
+        self.assertEqual(result['dropped']['stale'], 0)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase, override_settings
+
+from main_app.models import CommunicationLog, CustomUser, Customer, Employee, InboundMessage, Notification
+from main_app.tests import LOCMEM_CACHES
+from services.inbound_processor import InboundMessageProcessor, enqueue_inbound
+
+real_bulk_create = CommunicationLog.objects.bulk_create
+
+
+def failing_bulk_create(logs, *args, **kwargs):
+    """Rejects any batch that contains a 'poison' message, like a constraint violation would"""
+    if any('poison' in log.body for log in logs):
+        raise IntegrityError('poison')
+    return real_bulk_create(logs, *args, **kwargs)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@mock.patch('services.inbound_processor._kick_worker')
+class InboundProcessorTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            email='owner@example.com', password='x', user_type=3, first_name='O', last_name='W'
+        )
+        self.owner = Employee.objects.get(admin=user)
+        self.customer = Customer.objects.create(
+            name='Sri Lakshmi Textiles', code='SLT', phone_primary='+91 98450 12345', owner_staff=self.owner,
+        )
+
+    def whatsapp(self, body, sid=None, sender='whatsapp:+919845012345'):
+        payload = {'From': sender, 'Body': body}
+        if sid:
+            payload['MessageSid'] = sid
+        enqueue_inbound('WHATSAPP', payload)
+
+    def statuses(self):
+        return dict(InboundMessage.objects.values_list('payload__Body', 'status'))
+
+    def test_redelivery_is_dropped(self, kick):
+        self.whatsapp('hello', sid='SM1')
+        self.whatsapp('hello', sid='SM1')
+        enqueue_inbound('EMAIL', {'from': 'a@example.com', 'message_id': 'SM1'})
+        # Messages without a provider id are never deduplicated
+        self.whatsapp('no id')
+        self.whatsapp('no id')
+        self.assertEqual(InboundMessage.objects.count(), 4)
+        self.assertEqual(InboundMessage.objects.filter(channel='WHATSAPP', provider_message_id='SM1').count(), 1)
+
+    def test_non_mapping_payload_is_stored(self, kick):
+        enqueue_inbound('WHATSAPP', ['not', 'an', 'object'])
+        enqueue_inbound('EMAIL', None)
+        self.assertEqual(
+            list(InboundMessage.objects.order_by('id').values_list('payload', flat=True)),
+            [{'raw': ['not', 'an', 'object']}, {}],
+        )
+
+    def test_batch_is_matched_and_written(self, kick):
+        self.whatsapp('first', sid='SM1')
+        self.whatsapp('from a stranger', sid='SM2', sender='+1 555 0100 999')
+        self.assertEqual(InboundMessageProcessor().drain(), 2)
+        self.assertEqual(set(self.statuses().values()), {'PROCESSED'})
+        logs = dict(CommunicationLog.objects.values_list('body', 'customer_id'))
+        self.assertEqual(logs, {'first': self.customer.id, 'from a stranger': None})
+        self.assertEqual(Notification.objects.get().user_id, self.owner.admin_id)
+
+    def test_bad_message_is_isolated(self, kick):
+        for body in ('one', 'poison', 'three'):
+            self.whatsapp(body)
+        with mock.patch.object(CommunicationLog.objects, 'bulk_create', side_effect=failing_bulk_create), \
+                self.assertLogs('services.inbound_processor', 'WARNING'):
+            self.assertEqual(InboundMessageProcessor().process_batch(), 3)
+        self.assertEqual(self.statuses(), {'one': 'PROCESSED', 'poison': 'FAILED', 'three': 'PROCESSED'})
+        self.assertEqual(set(CommunicationLog.objects.values_list('body', flat=True)), {'one', 'three'})
+        # Notifications of the failed message were rolled back with its log
+        self.assertEqual(Notification.objects.count(), 2)
+        failed = InboundMessage.objects.get(status='FAILED')
+        self.assertEqual((failed.error, failed.attempts), ('poison', 1))
+
+    def test_infrastructure_error_leaves_the_batch_pending(self, kick):
+        self.whatsapp('one')
+        self.whatsapp('two')
+        with mock.patch.object(CommunicationLog.objects, 'bulk_create', side_effect=OperationalError('gone')), \
+                self.assertLogs('services.inbound_processor', 'WARNING'), \
+                self.assertRaises(OperationalError):
+            InboundMessageProcessor().process_batch()
+        self.assertEqual(set(self.statuses().values()), {'PENDING'})
+        self.assertFalse(CommunicationLog.objects.exists())
@@ -0,0 +1,62 @@
+import random
+
+from django.test import SimpleTestCase
+
+from services.spatial_index import GridIndex, haversine_m
+
+
+class GridIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.points = {i: (12.9 + rng.random() * 0.2, 77.5 + rng.random() * 0.2) for i in range(2000)}
+        self.index = GridIndex(cell_m=250)
+        for key, (lat, lng) in self.points.items():
+            self.index.add(key, lat, lng, key)
+
+    def brute_force(self, lat, lng, radius_m=float('inf')):
+        found = [(haversine_m(lat, lng, p_lat, p_lng), key) for key, (p_lat, p_lng) in self.points.items()]
+        return sorted(hit for hit in found if hit[0] <= radius_m)
+
+    def test_haversine(self):
+        # One degree of latitude is about 111.2 km
+        self.assertAlmostEqual(haversine_m(0, 0, 1, 0), 111195, delta=1)
+        self.assertEqual(haversine_m(12.9, 77.5, 12.9, 77.5), 0)
+
+    def test_within_matches_brute_force(self):
+        for lat, lng, radius in ((13.0, 77.6, 300), (12.95, 77.55, 1200), (12.9, 77.5, 40)):
+            found = self.index.within(lat, lng, radius)
+            self.assertEqual([key for _, key, _ in found], [key for _, key in self.brute_force(lat, lng, radius)])
+            self.assertEqual([distance for distance, _, _ in found], sorted(distance for distance, _, _ in found))
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lng in ((13.0, 77.6), (12.8, 77.4), (13.05, 77.55)):
+            found = self.index.nearest(lat, lng, 10)
+            self.assertEqual([key for _, key, _ in found], [key for _, key in self.brute_force(lat, lng)[:10]])
+
+    def test_nearest_respects_max_radius(self):
+        self.assertEqual(self.index.nearest(20.0, 80.0, 5, max_radius_m=1000), [])
+
+    def test_nearest_returns_everything_when_fewer_points(self):
+        index = GridIndex(cell_m=100)
+        index.add('a', 0.0, 0.0)
+        index.add('b', 0.0, 0.01)
+        self.assertEqual([key for _, key, _ in index.nearest(0.0, 0.0, 5)], ['a', 'b'])
+
+    def test_move_and_remove(self):
+        index = GridIndex(cell_m=100)
+        index.add('a', 12.9, 77.5, 'first')
+        index.add('a', 13.9, 77.5, 'moved')
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.within(12.9, 77.5, 500), [])
+        self.assertEqual(index.within(13.9, 77.5, 10)[0][2], 'moved')
+        index.remove('a')
+        index.remove('missing')
+        self.assertNotIn('a', index)
+        self.assertEqual(index.within(13.9, 77.5, 10), [])
+
+    def test_high_latitude_columns(self):
+        # Columns are narrower near the poles; a point due east must still be found
+        index = GridIndex(cell_m=250)
+        index.add('east', 70.0, 25.02)
+        found = index.within(70.0, 25.0, 1000)
+        self.assertEqual([key for _, key, _ in found], ['east'])
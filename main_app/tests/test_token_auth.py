@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from api.authentication import CachedTokenAuthentication
+from main_app.cache_utils import local_cache
+from main_app.models import CustomUser, Employee
+from main_app.tests import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@mock.patch('api.authentication.shared_cache_is_local', return_value=False)
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache().clear()
+        user = CustomUser.objects.create_user(
+            email='field@example.com', password='x', user_type=3, first_name='F', last_name='S'
+        )
+        self.user = CustomUser.objects.get(pk=user.pk)
+        self.token = Token.objects.create(user=self.user)
+        self.key = self.token.key
+        self.auth = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.auth.authenticate_credentials(self.key)
+
+    def test_cached_user(self, _):
+        user, token = self.authenticate()
+        self.assertEqual((user.pk, user.email, user.user_type), (self.user.pk, 'field@example.com', '3'))
+        self.assertEqual(user.employee_id, Employee.objects.get(admin=self.user).id)
+        self.assertEqual(token.key, self.key)
+        local_cache().clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate()[0].pk, self.user.pk)
+
+    def test_deleted_token_is_rejected(self, _):
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'Invalid token.'):
+            self.authenticate()
+
+    def test_deactivated_user_is_rejected(self, _):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaisesMessage(exceptions.AuthenticationFailed, 'User inactive or deleted.'):
+            self.authenticate()
+
+    def test_activity_updates_keep_the_cache(self, _):
+        self.authenticate()
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    def test_unknown_token(self, _):
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials('0' * 40)
+
+    def test_per_process_shared_cache_checks_the_database(self, shared_cache_is_local):
+        shared_cache_is_local.return_value = True
+        self.authenticate()
+        with self.assertNumQueries(1):
+            self.authenticate()
@@ -0,0 +1,112 @@
+import math
+import random
+
+from django.test import SimpleTestCase, override_settings
+
+from main_app.tests import LOCMEM_CACHES
+from services.spatial_index import haversine_m
+from services.track_cleaning import StreamingCleaner, clean_track, filter_params, path_length
+
+METRES_PER_DEGREE = 111195.0
+
+
+def walk(count=600, step_s=5, speed=1.4, noise_m=8, seed=1):
+    """A walk due east from (12.97, 77.59) with GPS noise: (times, lats, lngs, accuracies, true lngs)"""
+    rng = random.Random(seed)
+    lng_scale = METRES_PER_DEGREE * math.cos(math.radians(12.97))
+    times, lats, lngs, true_lngs = [], [], [], []
+    for i in range(count):
+        true_lng = 77.59 + speed * step_s * i / lng_scale
+        times.append(1_700_000_000 + step_s * i)
+        lats.append(12.97 + rng.gauss(0, noise_m) / METRES_PER_DEGREE)
+        lngs.append(true_lng + rng.gauss(0, noise_m) / lng_scale)
+        true_lngs.append(true_lng)
+    return times, lats, lngs, [noise_m] * count, true_lngs
+
+
+class CleanTrackTests(SimpleTestCase):
+    def test_smoothing_recovers_the_distance(self):
+        times, lats, lngs, accuracies, true_lngs = walk()
+        truth = path_length([12.97] * len(true_lngs), true_lngs)
+        cleaned = clean_track(times, lats, lngs, accuracies)
+        self.assertFalse(any(cleaned.outliers))
+        self.assertGreater(path_length(lats, lngs), truth * 2)
+        self.assertAlmostEqual(path_length(cleaned.latitudes, cleaned.longitudes) / truth, 1, delta=0.2)
+        # Walking pace, in km/h
+        self.assertAlmostEqual(sum(cleaned.speeds[100:]) / len(cleaned.speeds[100:]), 1.4 * 3.6, delta=1)
+
+    def test_smoothed_points_are_closer_to_the_truth(self):
+        times, lats, lngs, accuracies, true_lngs = walk()
+        cleaned = clean_track(times, lats, lngs, accuracies)
+
+        def error(latitudes, longitudes):
+            return sum(haversine_m(lat, lng, 12.97, true) for lat, lng, true in zip(latitudes, longitudes, true_lngs))
+
+        self.assertLess(error(cleaned.latitudes, cleaned.longitudes), error(lats, lngs) * 0.75)
+
+    def test_jump_is_an_outlier(self):
+        times, lats, lngs, accuracies, _ = walk()
+        lats[300] += 2000 / METRES_PER_DEGREE
+        cleaned = clean_track(times, lats, lngs, accuracies)
+        self.assertTrue(cleaned.outliers[300])
+        self.assertIsNone(cleaned.latitudes[300])
+        self.assertIsNone(cleaned.speeds[300])
+        self.assertEqual(sum(cleaned.outliers), 1)
+
+    def test_speed_gate(self):
+        times, lats, lngs, accuracies, _ = walk(count=20, noise_m=0)
+        params = filter_params()
+        # 1 km in 5 s is 720 km/h
+        lngs[10] += 1000 / (METRES_PER_DEGREE * math.cos(math.radians(12.97)))
+        self.assertTrue(clean_track(times, lats, lngs, accuracies, params).outliers[10])
+        self.assertFalse(any(clean_track(times, lats, lngs, accuracies, params._replace(
+            max_speed=1000, accel_limit=1000)).outliers))
+
+    def test_filter_restarts_after_a_gap(self):
+        times, lats, lngs, accuracies, _ = walk(count=40)
+        params = filter_params()
+        # 100 km away after a gap longer than reset_after: a new segment, not a jump
+        for i in range(20, 40):
+            times[i] += params.reset_after + 60
+            lats[i] += 100000 / METRES_PER_DEGREE
+        self.assertFalse(any(clean_track(times, lats, lngs, accuracies, params).outliers))
+
+    def test_filter_follows_a_persistent_move(self):
+        times, lats, lngs, accuracies, _ = walk(count=40)
+        params = filter_params()
+        for i in range(20, 40):
+            lats[i] += 50000 / METRES_PER_DEGREE
+        outliers = clean_track(times, lats, lngs, accuracies, params).outliers
+        # Rejected at first, then accepted once max_rejects in a row restart the filter
+        self.assertTrue(all(outliers[20:20 + params.max_rejects]))
+        self.assertFalse(any(outliers[20 + params.max_rejects + 1:]))
+
+    def test_empty_and_single_fix(self):
+        self.assertEqual(clean_track([], [], [], []).latitudes, [])
+        cleaned = clean_track([1_700_000_000], [12.97], [77.59], [None])
+        self.assertAlmostEqual(cleaned.latitudes[0], 12.97)
+        self.assertEqual(cleaned.outliers, [False])
+        self.assertEqual(path_length([12.97], [77.59]), 0.0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StreamingCleanerTests(SimpleTestCase):
+    def test_matches_the_forward_pass(self):
+        from datetime import datetime, timezone
+
+        times, lats, lngs, accuracies, _ = walk(count=100)
+        lats[50] += 2000 / METRES_PER_DEGREE
+        batch = clean_track(times, lats, lngs, accuracies, smooth=False)
+        for i, (t, lat, lng, accuracy) in enumerate(zip(times, lats, lngs, accuracies)):
+            # A new cleaner per fix: the state goes through the cache as it does between requests
+            cleaner = StreamingCleaner(employee_id=1)
+            fix = {'latitude': lat, 'longitude': lng, 'accuracy': accuracy}
+            kept = cleaner.update(fix, datetime.fromtimestamp(t, tz=timezone.utc))
+            cleaner.save()
+            self.assertEqual(fix['is_outlier'], batch.outliers[i])
+            self.assertEqual(kept, not batch.outliers[i])
+            if kept:
+                self.assertAlmostEqual(fix['smoothed_latitude'], batch.latitudes[i], places=5)
+                self.assertAlmostEqual(fix['smoothed_longitude'], batch.longitudes[i], places=5)
+            else:
+                self.assertIsNone(fix['smoothed_latitude'])
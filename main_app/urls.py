@@ -17,7 +17,7 @@ from django.urls import path
 
 from main_app.EditSalaryView import EditSalaryView
 
-from . import ceo_views, manager_views, employee_views, views, jobcard_views, gps_views
+from . import ceo_views, manager_views, employee_views, views, jobcard_views, gps_views, export_views
 
 urlpatterns = [
     path("", views.login_page, name='login_page'),
@@ -177,6 +177,7 @@ urlpatterns = [
     path('api/gps/checkout/', gps_views.api_gps_checkout, name='api_gps_checkout'),
     path('api/gps/location-update/', gps_views.api_gps_location_update, name='api_gps_location_update'),
     path('api/employee-current-location/', gps_views.api_employee_current_location, name='api_employee_current_location'),
+    path('api/customers/nearby/', gps_views.api_nearby_customers, name='api_nearby_customers'),
     path('api/department/<int:department_id>/details/', gps_views.api_department_details, name='api_department_details'),
     
     # Real-Time GPS API Endpoints
@@ -184,6 +185,11 @@ urlpatterns = [
     path('api/employee-route-history/', gps_views.api_employee_route_history, name='api_employee_route_history'),
     path('api/geofence-status/', gps_views.api_geofence_status, name='api_geofence_status'),
 
+    # Data exports
+    path('exports/<str:dataset>/', export_views.export_data, name='export_data'),
+    path('exports/jobs/<int:job_id>/', export_views.export_job_status, name='export_job_status'),
+    path('exports/jobs/<int:job_id>/download/', export_views.export_job_download, name='export_job_download'),
+
     # Employee
     path("employee/home/", employee_views.employee_home, name='employee_home'),
     path("employee/view/attendance/", employee_views.employee_view_attendance,
@@ -1,7 +1,10 @@
 """
 Utility functions for the staff management system
 """
+import functools
 from typing import Tuple, List, Dict, Any
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib import messages
@@ -23,18 +26,20 @@ def redirect_to_user_home(user_type: str):
     return redirect(reverse(get_home_for_user_type(user_type)))
 
 
-def get_attendance_stats(departments) -> Tuple[List[str], List[int]]:
+def get_attendance_stats(division=None) -> Tuple[List[str], List[int]]:
     """
-    Get attendance statistics for a list of departments
+    Get attendance statistics for all departments (or those of a division)
     Returns department names and their attendance counts
     """
+    from services.attendance import department_attendance_counts
+
     department_list = []
     attendance_list = []
     
-    for department in departments:
-        attendance_count = Attendance.objects.filter(department=department).count()
-        department_list.append(department.name[:7] if len(department.name) > 7 else department.name)
-        attendance_list.append(attendance_count)
+    for department in department_attendance_counts(division):
+        name = department['name']
+        department_list.append(name[:7] if len(name) > 7 else name)
+        attendance_list.append(department['attendance_count'])
     
     return department_list, attendance_list
 
@@ -100,3 +105,21 @@ def format_user_display_name(user) -> str:
         return last_name
     else:
         return user.email or "Unknown User"
+
+
+async def aget_user(request):
+    """request.user resolved without blocking the event loop (the lazy user may need a query)"""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+def async_login_required(view_func):
+    """login_required for async views; Django 4.2's decorators only wrap sync views"""
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
@@ -6,11 +6,14 @@ from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.db.models import F
 from .models import Attendance, Department, JobCard, Customer, City, Item, JobCardAction, CommunicationLog
 from django.shortcuts import get_object_or_404
+from .responses import FastJsonResponse
 from .utils import get_home_for_user_type, redirect_to_user_home, validate_required_fields, add_error_message, add_success_message
 from datetime import date, datetime, timedelta
 from django.utils import timezone
+from services.inbound_processor import enqueue_inbound
 
 # Create your views here.
 
@@ -57,17 +60,10 @@ def get_attendance(request):
     department_id = request.POST.get('department')
     try:
         department = get_object_or_404(Department, id=department_id)
-        attendance = Attendance.objects.filter(department=department)
-        attendance_list = []
-        for attd in attendance:
-            data = {
-                    "id": attd.id,
-                    "attendance_date": str(attd.date)
-                    }
-            attendance_list.append(data)
-        return JsonResponse(json.dumps(attendance_list), safe=False)
+        attendance = Attendance.objects.filter(department=department).values('id', attendance_date=F('date'))
+        return FastJsonResponse(attendance, safe=False)
     except Exception as e:
-        return None
+        return FastJsonResponse({'status': 'ERROR', 'error': str(e)}, status=400)
 
 
 def showFirebaseJS(request):
@@ -275,7 +271,7 @@ def cadence_generate(request):
     try:
         customers = Customer.objects.filter(active=True)
         for cust in customers:
-            comms = CommunicationLog.objects.filter(customer=cust, timestamp__date__gte=start_month, timestamp__date__lte=today).count()
+            comms = CommunicationLog.objects.between(start_month, today).filter(customer=cust).count()
             if comms < 2:
                 assigned = cust.owner_staff if cust.owner_staff_id else None
                 jc = JobCard.objects.create(
@@ -329,19 +325,18 @@ def email_send_stub(request):
 
 @csrf_exempt
 def whatsapp_webhook(request):
-    # Accept inbound message and log it
+    # Accept inbound message and queue it for the inbound worker
     try:
         if request.method == 'GET':
             return JsonResponse({'status': 'ok'})
         payload = json.loads(request.body.decode('utf-8')) if request.body else request.POST
+        if not isinstance(payload, dict):
+            return JsonResponse({'error': 'Expected a JSON object'}, status=400)
         phone = payload.get('from') or payload.get('phone')
-        body = payload.get('body', '')
-        # naive match by phone_primary
-        cust = Customer.objects.filter(phone_primary__icontains=phone).first() if phone else None
-        log = CommunicationLog.objects.create(
-            channel='WHATSAPP', direction='IN', customer=cust, subject='Inbound WhatsApp', body=body
-        )
-        return JsonResponse({'id': log.id})
+        if not phone:
+            return JsonResponse({'error': 'Missing sender'}, status=400)
+        enqueue_inbound('WHATSAPP', payload)
+        return JsonResponse({'status': 'received'})
     except Exception as exc:
         return JsonResponse({'error': str(exc)}, status=400)
 
@@ -363,6 +358,8 @@ def customers_list(request):
             'phone_primary': c.phone_primary,
             'email': c.email,
             'active': c.active,
+            'latitude': float(c.latitude) if c.latitude is not None else None,
+            'longitude': float(c.longitude) if c.longitude is not None else None,
         })
     return JsonResponse(out, safe=False)
 
@@ -381,6 +378,9 @@ def customers_create(request):
             phone_primary=payload.get('phone_primary', ''),
             email=payload.get('email', ''),
             active=payload.get('active', True),
+            # Without coordinates the address is geocoded in the background
+            latitude=payload.get('latitude') or None,
+            longitude=payload.get('longitude') or None,
             owner_staff=request.user.employee if request.user.is_authenticated and hasattr(request.user, 'employee') else None,
         )
         return JsonResponse({'id': c.id})
@@ -1,12 +1,48 @@
 import openai
+import bisect
+import hashlib
 import json
+import logging
+import random
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from main_app.cache_utils import bump_namespace, make_key
 from main_app.models import (
     JobCard, JobCardAction, Customer, Order, OrderItem, 
     Payment, Item, AIProcessingLog
 )
+from services.extraction import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt or model changes so cached extractions are not reused
+EXTRACTION_CACHE_NAMESPACE = 'ai_extraction_v1'
+
+
+def _retryable_openai_errors():
+    """Transient OpenAI errors worth retrying, resolved at call time rather than import time"""
+    return (
+        openai.error.RateLimitError,
+        openai.error.ServiceUnavailableError,
+        openai.error.APIConnectionError,
+        openai.error.Timeout,
+    )
+
+
+def normalize_report_text(text):
+    """Collapse case and whitespace so trivially different reports share a cache entry"""
+    return " ".join((text or "").lower().split())
+
+
+def report_text_hash(text):
+    return hashlib.sha256(normalize_report_text(text).encode('utf-8')).hexdigest()
 
 
 class AITextProcessor:
@@ -22,44 +58,64 @@ class AITextProcessor:
         """
         Process field report text and extract structured data
         """
+        action = JobCardAction.objects.select_related('jobcard').get(id=jobcard_action_id)
+        log = AIProcessingLog(jobcard_action=action, input_text=action.note_text)
+        stage = AIResultStage(self)
+
         try:
-            action = JobCardAction.objects.get(id=jobcard_action_id)
-            
-            # Create processing log
-            log = AIProcessingLog.objects.create(
-                jobcard_action=action,
-                input_text=action.note_text,
-                status='PROCESSING'
-            )
-            
-            # Process with OpenAI
-            processed_data = self._extract_entities(action.note_text)
-            
-            # Update log with results
-            log.processed_data = processed_data
-            log.confidence_score = processed_data.get('confidence', 0.0)
-            log.status = 'COMPLETED'
-            log.processed_at = datetime.now()
-            log.save()
-            
-            # Create follow-up tasks if needed
-            self._create_followup_tasks(action, processed_data)
-            
-            # Update job card with extracted data
-            self._update_jobcard_data(action, processed_data)
-            
-            return processed_data
-            
+            processed_data = self.extract_cached(action.note_text)
         except Exception as e:
-            log.status = 'FAILED'
-            log.error_message = str(e)
-            log.save()
-            raise e
-    
+            stage.add_failure(log, e)
+            stage.commit()
+            raise
+
+        # Log, structured JSON, job card status and follow-up are written together
+        stage.add_result(log, processed_data)
+        stage.commit()
+        return processed_data
+
+    def extract_cached(self, text):
+        """
+        Extract entities with the rule engine, falling back to the (cached)
+        model only when the engine is not confident
+        """
+        rules = self._fallback_extraction(text)
+        if self.rules_are_confident(rules):
+            return rules
+        key = make_key(EXTRACTION_CACHE_NAMESPACE, report_text_hash(text))
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            result = self._call_model(text)
+        except Exception as e:
+            logger.warning("OpenAI extraction failed, using rule based result: %s", e)
+            return rules
+        cache.set(key, result, getattr(settings, 'AI_RESULT_CACHE_TTL', 60 * 60 * 24 * 7))
+        return result
+
+    @staticmethod
+    def rules_are_confident(extracted):
+        return extracted.get('confidence', 0.0) >= getattr(settings, 'AI_RULES_CONFIDENCE_THRESHOLD', 0.8)
+
     def _extract_entities(self, text):
         """
         Use OpenAI to extract entities from field report text
         """
+        try:
+            return self._call_model(text)
+        except Exception as e:
+            logger.warning("OpenAI extraction failed, using rule based fallback: %s", e)
+            return self._fallback_extraction(text)
+
+    def _call_model(self, text):
+        """
+        Single OpenAI extraction call with exponential backoff on rate limits and
+        transient errors. Raises when the model is unavailable or returns bad JSON.
+        """
+        if not openai.api_key:
+            raise RuntimeError("OPENAI_API_KEY is not configured")
+
         prompt = f"""
         Extract structured information from this field visit report:
         "{text}"
@@ -77,143 +133,88 @@ class AITextProcessor:
         
         Return only valid JSON format.
         """
-        
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an AI assistant that extracts structured data from sales field reports. Always return valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.1
-            )
-            
-            result = response.choices[0].message.content.strip()
-            
-            # Try to parse JSON
+
+        max_retries = getattr(settings, 'AI_MAX_RETRIES', 4)
+        retryable = _retryable_openai_errors()
+        for attempt in range(max_retries + 1):
             try:
-                return json.loads(result)
-            except json.JSONDecodeError:
-                # Fallback to regex extraction
-                return self._fallback_extraction(text)
-                
-        except Exception as e:
-            print(f"OpenAI API error: {e}")
-            return self._fallback_extraction(text)
+                response = openai.ChatCompletion.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "You are an AI assistant that extracts structured data from sales field reports. Always return valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=500,
+                    temperature=0.1,
+                    request_timeout=getattr(settings, 'AI_REQUEST_TIMEOUT', 30),
+                )
+                break
+            except retryable:
+                if attempt == max_retries:
+                    raise
+                # Exponential backoff with jitter so parallel workers do not retry in lockstep
+                time.sleep(min(2 ** attempt, 30) + random.uniform(0, 1))
+
+        result = response.choices[0].message.content.strip()
+        return json.loads(result)
     
     def _fallback_extraction(self, text):
         """
-        Fallback extraction using regex patterns
-        """
-        extracted = {
-            'customer_name': '',
-            'contact_person': '',
-            'visit_outcome': 'visit_completed',
-            'order_details': {},
-            'payment_details': {},
-            'follow_up_required': 'no',
-            'follow_up_date': '',
-            'follow_up_reason': '',
-            'confidence': 0.6
-        }
-        
-        # Extract customer names (common patterns)
-        customer_patterns = [
-            r'(?:met|visited|at)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-            r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:company|ltd|pvt)',
-        ]
-        
-        for pattern in customer_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                extracted['customer_name'] = match.group(1)
-                break
-        
-        # Extract order quantities
-        qty_pattern = r'(\d+)\s*(?:bales?|kg|tons?)'
-        qty_match = re.search(qty_pattern, text, re.IGNORECASE)
-        if qty_match:
-            extracted['order_details']['quantity'] = int(qty_match.group(1))
-        
-        # Extract rates/prices
-        rate_pattern = r'(?:rate|price|₹)\s*(\d+(?:,\d+)*)'
-        rate_match = re.search(rate_pattern, text, re.IGNORECASE)
-        if rate_match:
-            extracted['order_details']['rate'] = float(rate_match.group(1).replace(',', ''))
-        
-        # Extract payment amounts
-        payment_pattern = r'(?:collected|received|paid)\s*₹?\s*(\d+(?:,\d+)*)'
-        payment_match = re.search(payment_pattern, text, re.IGNORECASE)
-        if payment_match:
-            extracted['payment_details']['amount'] = float(payment_match.group(1).replace(',', ''))
-        
-        # Check for follow-up indicators
-        followup_keywords = ['follow', 'call back', 'visit again', 'after', 'next week', 'tomorrow']
-        if any(keyword in text.lower() for keyword in followup_keywords):
-            extracted['follow_up_required'] = 'yes'
-            extracted['follow_up_reason'] = 'mentioned in report'
-        
-        return extracted
-    
-    def _create_followup_tasks(self, action, processed_data):
-        """
-        Create follow-up job cards based on extracted data
-        """
-        if processed_data.get('follow_up_required') == 'yes':
-            # Calculate follow-up date
-            follow_up_date = None
-            if processed_data.get('follow_up_date'):
-                try:
-                    # Try to parse date from text
-                    follow_up_date = self._parse_date(processed_data['follow_up_date'])
-                except:
-                    # Default to 3 days from now
-                    follow_up_date = datetime.now() + timedelta(days=3)
-            else:
-                follow_up_date = datetime.now() + timedelta(days=3)
-            
-            # Create follow-up job card
-            JobCard.objects.create(
-                type='FOLLOWUP',
-                priority='MEDIUM',
-                status='PENDING',
-                assigned_to=action.jobcard.assigned_to,
-                customer=action.jobcard.customer,
-                city=action.jobcard.city,
-                due_at=follow_up_date,
-                created_by=action.actor,
-                created_reason=f"Auto-generated from field report: {processed_data.get('follow_up_reason', 'Follow-up required')}",
-                related_item=action.jobcard.related_item
-            )
+        Rule based extraction against the customer / item catalog
+        """
+        return get_engine().extract(text)
     
-    def _update_jobcard_data(self, action, processed_data):
+    def _build_followup_jobcard(self, action, processed_data):
         """
-        Update job card with extracted structured data
+        Unsaved follow-up job card for a report that asks for one, else None
         """
-        # Update the action's structured_json field
-        action.structured_json = processed_data
-        action.save()
-        
-        # Mark original job card as completed if visit was successful
-        if processed_data.get('visit_outcome') in ['order_taken', 'payment_collected', 'visit_completed']:
-            action.jobcard.status = 'COMPLETED'
-            action.jobcard.save()
+        if processed_data.get('follow_up_required') != 'yes':
+            return None
+
+        # Calculate follow-up date
+        follow_up_date = None
+        if processed_data.get('follow_up_date'):
+            try:
+                # Try to parse date from text
+                follow_up_date = self._parse_date(processed_data['follow_up_date'])
+            except Exception:
+                # Default to 3 days from now
+                follow_up_date = timezone.now() + timedelta(days=3)
+        else:
+            follow_up_date = timezone.now() + timedelta(days=3)
+
+        jobcard = action.jobcard
+        return JobCard(
+            type='FOLLOWUP',
+            priority='MEDIUM',
+            status='PENDING',
+            assigned_to_id=jobcard.assigned_to_id,
+            customer_id=jobcard.customer_id,
+            city_id=jobcard.city_id,
+            due_date=follow_up_date,
+            assigned_by_id=action.actor_id,
+            description=f"Auto-generated from field report: {processed_data.get('follow_up_reason', 'Follow-up required')}",
+            related_item_id=jobcard.related_item_id
+        )
+
+    @staticmethod
+    def _completes_jobcard(processed_data):
+        return processed_data.get('visit_outcome') in ['order_taken', 'payment_collected', 'visit_completed']
     
     def _parse_date(self, date_text):
         """
         Parse date from natural language text
         """
         # Simple date parsing - can be enhanced
-        today = datetime.now()
+        today = timezone.now()
         
         if 'tomorrow' in date_text.lower():
             return today + timedelta(days=1)
         elif 'next week' in date_text.lower():
             return today + timedelta(days=7)
-        elif 'after' in date_text.lower():
-            # Extract number of days
-            match = re.search(r'after\s+(\d+)\s+days?', date_text.lower())
+        else:
+            # "after N days" / "in N days", as matched by extraction.FOLLOW_UP_DATE_RE
+            match = re.search(r'\b(?:after|in)\s+(\d+)\s+days?', date_text.lower())
             if match:
                 days = int(match.group(1))
                 return today + timedelta(days=days)
@@ -222,6 +223,322 @@ class AITextProcessor:
         return today + timedelta(days=3)
 
 
+class AIBatchProcessor:
+    """
+    Processes queued field reports in batches. Identical reports are extracted
+    once, cache misses go to the model concurrently with bounded parallelism,
+    and logs / structured JSON are written back in bulk.
+    """
+
+    def __init__(self, processor=None, batch_size=None, max_workers=None):
+        self.processor = processor or AITextProcessor()
+        self.batch_size = batch_size or getattr(settings, 'AI_BATCH_SIZE', 50)
+        self.max_workers = max_workers or getattr(settings, 'AI_MAX_CONCURRENCY', 4)
+
+    @staticmethod
+    def enqueue(actions):
+        """Queue actions for the next batch by creating PENDING processing logs"""
+        return AIProcessingLog.objects.bulk_create([
+            AIProcessingLog(jobcard_action=action, input_text=action.note_text, status='PENDING')
+            for action in actions if action.note_text
+        ])
+
+    def run(self, max_batches=None):
+        """Process batches until nothing is pending; returns the number of reports handled"""
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            handled = self.process_batch()
+            if not handled:
+                break
+            total += handled
+            batches += 1
+        return total
+
+    def process_batch(self):
+        logs = self._claim_batch()
+        if not logs:
+            return 0
+
+        started = time.monotonic()
+        stats = {'reports': len(logs)}
+        try:
+            results = self._extract_unique({log.id: log.input_text for log in logs}, stats)
+
+            stage = AIResultStage(self.processor)
+            for log in logs:
+                outcome = results[report_text_hash(log.input_text)]
+                if isinstance(outcome, Exception):
+                    stage.add_failure(log, outcome)
+                else:
+                    stage.add_result(log, outcome)
+            stage.commit()
+        except Exception:
+            # Hand the batch back rather than leave it PROCESSING
+            self._release(logs)
+            raise
+
+        stats['elapsed'] = time.monotonic() - started
+        AIPipelineMetrics.record_batch(**stats)
+        return len(logs)
+
+    def _claim_batch(self):
+        """Move the next batch of PENDING logs to PROCESSING so other workers skip them"""
+        with transaction.atomic():
+            pending = AIProcessingLog.objects.filter(status='PENDING').order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True, of=('self',))
+            logs = list(pending.select_related('jobcard_action__jobcard')[:self.batch_size])
+            if logs:
+                AIProcessingLog.objects.filter(id__in=[log.id for log in logs]).update(
+                    status='PROCESSING', claimed_at=timezone.now()
+                )
+        return logs
+
+    @staticmethod
+    def _release(logs):
+        AIProcessingLog.objects.filter(id__in=[log.id for log in logs], status='PROCESSING').update(
+            status='PENDING', claimed_at=None
+        )
+
+    @staticmethod
+    def requeue_stale():
+        """
+        Move logs claimed more than AI_CLAIM_TIMEOUT_S ago back to PENDING: their
+        worker died or timed out. Returns how many were requeued.
+        """
+        cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'AI_CLAIM_TIMEOUT_S', 900))
+        return AIProcessingLog.objects.filter(status='PROCESSING').filter(
+            Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True)
+        ).update(status='PENDING', claimed_at=None)
+
+    def _extract_unique(self, texts, stats=None):
+        """
+        Map report hash -> extracted data (or the exception raised). Reports the
+        rule engine is confident about never reach the model; the rest are
+        served from the cache or sent to the model once per distinct report.
+        Counters and model latencies are accumulated into ``stats``.
+        """
+        stats = {} if stats is None else stats
+        by_hash = {}
+        for text in texts.values():
+            by_hash.setdefault(report_text_hash(text), text)
+
+        rules = {}
+        results = {}
+        for digest, text in by_hash.items():
+            try:
+                rules[digest] = self.processor._fallback_extraction(text)
+            except Exception as e:
+                rules[digest] = e
+            if not isinstance(rules[digest], Exception) and self.processor.rules_are_confident(rules[digest]):
+                results[digest] = rules[digest]
+        stats['rule_hits'] = len(results)
+
+        keys = {
+            digest: make_key(EXTRACTION_CACHE_NAMESPACE, digest)
+            for digest in by_hash if digest not in results
+        }
+        cached = cache.get_many(list(keys.values()))
+        stats['cache_hits'] = sum(1 for key in keys.values() if key in cached)
+        results.update({digest: cached[key] for digest, key in keys.items() if key in cached})
+        misses = [digest for digest in keys if digest not in results]
+        stats['model_calls'] = len(misses)
+        if not misses:
+            return results
+
+        def extract(digest):
+            started = time.monotonic()
+            try:
+                outcome, from_model = self.processor._call_model(by_hash[digest]), True
+            except Exception as e:
+                logger.warning("OpenAI extraction failed, using rule based result: %s", e)
+                outcome, from_model = rules[digest], False
+            return digest, outcome, from_model, time.monotonic() - started
+
+        fresh = {}
+        latencies = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(misses))) as pool:
+            for digest, outcome, from_model, latency in pool.map(extract, misses):
+                results[digest] = outcome
+                latencies.append(latency)
+                if from_model:
+                    fresh[keys[digest]] = outcome
+        stats['model_latencies'] = latencies
+        stats['model_failures'] = len(misses) - len(fresh)
+        if fresh:
+            cache.set_many(fresh, getattr(settings, 'AI_RESULT_CACHE_TTL', 60 * 60 * 24 * 7))
+        return results
+
+
+class AIResultStage:
+    """
+    Collects the writes produced by AI runs (processing logs, action JSON,
+    job card completions and follow-ups) and applies them in one transaction
+    with bulk statements.
+    """
+
+    LOG_FIELDS = ['processed_data', 'confidence_score', 'status', 'error_message', 'processed_at']
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.logs = []
+        self.actions = []
+        self.completed_jobcard_ids = set()
+        self.followups = []
+        self.now = timezone.now()
+
+    def add_result(self, log, processed_data):
+        action = log.jobcard_action
+        log.processed_data = processed_data
+        log.confidence_score = processed_data.get('confidence', 0.0)
+        log.status = 'COMPLETED'
+        log.processed_at = self.now
+        self.logs.append(log)
+
+        action.structured_json = processed_data
+        self.actions.append(action)
+        if self.processor._completes_jobcard(processed_data):
+            self.completed_jobcard_ids.add(action.jobcard_id)
+        followup = self.processor._build_followup_jobcard(action, processed_data)
+        if followup:
+            self.followups.append(followup)
+
+    def add_failure(self, log, error):
+        log.status = 'FAILED'
+        log.error_message = str(error)
+        self.logs.append(log)
+
+    def commit(self):
+        new_logs = [log for log in self.logs if log.pk is None]
+        claimed_logs = [log for log in self.logs if log.pk is not None]
+        with transaction.atomic():
+            AIProcessingLog.objects.bulk_create(new_logs)
+            AIProcessingLog.objects.bulk_update(claimed_logs, self.LOG_FIELDS)
+            JobCardAction.objects.bulk_update(self.actions, ['structured_json'])
+            if self.completed_jobcard_ids:
+                JobCard.objects.filter(id__in=self.completed_jobcard_ids).update(
+                    status='COMPLETED', updated_at=self.now
+                )
+            JobCard.objects.bulk_create(self.followups)
+            if self.completed_jobcard_ids or self.followups:
+                # Bulk writes skip JobCard.save, so flush the dashboard stats here
+                bump_namespace('jobcard_stats')
+
+
+class AIPipelineMetrics:
+    """
+    Throughput counters for the batch pipeline, kept in the shared cache so
+    every worker contributes. Used to size AI_MAX_CONCURRENCY / worker pools.
+
+    Model latencies go into a histogram of per-bucket counters, so concurrent
+    workers only ever increment and never overwrite each other's samples.
+    Percentiles are reported as the upper bound of their bucket.
+    """
+
+    PREFIX = 'ai_metrics'
+    COUNTERS = (
+        'batches', 'reports', 'rule_hits', 'cache_hits', 'model_calls', 'model_failures', 'busy_ms',
+        'latency_total_ms',
+    )
+    # Upper bounds (ms) of the latency buckets; slower calls land in a final overflow bucket
+    LATENCY_BUCKETS_MS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 20000, 30000, 60000)
+
+    @classmethod
+    def _key(cls, name):
+        return f"{cls.PREFIX}:{name}"
+
+    @classmethod
+    def _bucket_names(cls):
+        return [f'latency_le_{bound}' for bound in cls.LATENCY_BUCKETS_MS] + ['latency_over']
+
+    @classmethod
+    def _incr(cls, name, amount):
+        key = cls._key(name)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.set(key, amount, None)
+
+    @classmethod
+    def record_batch(cls, reports, elapsed, rule_hits=0, cache_hits=0, model_calls=0,
+                     model_failures=0, model_latencies=()):
+        cls._incr('batches', 1)
+        cls._incr('reports', reports)
+        cls._incr('rule_hits', rule_hits)
+        cls._incr('cache_hits', cache_hits)
+        cls._incr('model_calls', model_calls)
+        cls._incr('model_failures', model_failures)
+        cls._incr('busy_ms', int(elapsed * 1000))
+        if model_latencies:
+            buckets = cls._bucket_names()
+            counts = {}
+            for latency in model_latencies:
+                name = buckets[bisect.bisect_left(cls.LATENCY_BUCKETS_MS, latency * 1000)]
+                counts[name] = counts.get(name, 0) + 1
+            for name, count in counts.items():
+                cls._incr(name, count)
+            cls._incr('latency_total_ms', int(sum(model_latencies) * 1000))
+
+    @classmethod
+    def _percentile(cls, bucket_counts, pct):
+        """Upper bound of the bucket holding the pct-th percentile (None past the last bound)"""
+        total = sum(bucket_counts)
+        if not total:
+            return None
+        rank = max(1, -(-total * pct // 100))
+        seen = 0
+        for bound, count in zip(cls.LATENCY_BUCKETS_MS + (None,), bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+    @classmethod
+    def snapshot(cls):
+        bucket_keys = [cls._key(name) for name in cls._bucket_names()]
+        values = cache.get_many([cls._key(name) for name in cls.COUNTERS] + bucket_keys)
+        counters = {name: values.get(cls._key(name), 0) for name in cls.COUNTERS}
+        latency_total_ms = counters.pop('latency_total_ms')
+        bucket_counts = [values.get(key, 0) for key in bucket_keys]
+        samples = sum(bucket_counts)
+        lookups = counters['cache_hits'] + counters['model_calls']
+        distinct_reports = counters['rule_hits'] + lookups
+        busy_seconds = counters['busy_ms'] / 1000.0
+        return {
+            **counters,
+            'reports_per_second': round(counters['reports'] / busy_seconds, 2) if busy_seconds else None,
+            'cache_hit_rate': round(counters['cache_hits'] / lookups, 3) if lookups else None,
+            'rule_hit_rate': round(counters['rule_hits'] / distinct_reports, 3) if distinct_reports else None,
+            'model_latency_ms': {
+                'mean': round(latency_total_ms / samples, 1) if samples else None,
+                'p50': cls._percentile(bucket_counts, 50),
+                'p90': cls._percentile(bucket_counts, 90),
+                'p99': cls._percentile(bucket_counts, 99),
+                'samples': samples,
+            },
+            'max_concurrency': getattr(settings, 'AI_MAX_CONCURRENCY', 4),
+        }
+
+    @classmethod
+    def reset(cls):
+        cache.delete_many([cls._key(name) for name in cls.COUNTERS + tuple(cls._bucket_names())])
+
+
+def queue_field_reports(actions):
+    """Queue field reports for batch processing and schedule one debounced batch run"""
+    queued = AIBatchProcessor.enqueue(actions)
+    delay = getattr(settings, 'AI_BATCH_DELAY', 5)
+    if queued and cache.add('ai:batch-scheduled', 1, delay):
+        try:
+            from api.tasks import process_pending_field_reports
+            process_pending_field_reports.apply_async(countdown=delay, retry=False)
+        except Exception as e:
+            # The periodic beat run picks the reports up if the broker is unavailable
+            logger.warning("Could not schedule field report batch: %s", e)
+    return queued
+
+
 # Example usage and test function
 def test_ai_processor():
     """
@@ -0,0 +1,174 @@
+"""
+Attendance taking and summaries.
+
+Manager attendance is written in bulk (a fixed number of queries however
+large the department). Dashboard counts are grouped in the database
+(``values('department').annotate(...)``) and memoized per scope; every bulk
+write invalidates them.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from main_app.cache_utils import bump_namespace, get_or_compute
+from main_app.models import Attendance, AttendanceReport, Department, Employee
+
+CACHE_NAMESPACE = 'attendance_summary'
+
+
+def _cached(scope, compute):
+    return get_or_compute(
+        CACHE_NAMESPACE, (scope,), compute, getattr(settings, 'ATTENDANCE_SUMMARY_CACHE_TTL', 300)
+    )
+
+
+def invalidate_attendance_summaries():
+    bump_namespace(CACHE_NAMESPACE)
+
+
+def department_attendance_counts(division=None):
+    """
+    Number of attendance days taken per department (all departments, or those
+    of ``division``). Returns a list of {'id', 'name', 'attendance_count'}.
+    """
+    scope = f'departments:{division.id if division else "all"}'
+
+    def compute():
+        departments = Department.objects.order_by('id')
+        attendance = Attendance.objects.all()
+        if division is not None:
+            departments = departments.filter(division=division)
+            attendance = attendance.filter(department__division=division)
+        counts = dict(
+            attendance.order_by().values('department').annotate(total=Count('id')).values_list('department', 'total')
+        )
+        return [
+            {'id': department_id, 'name': name, 'attendance_count': counts.get(department_id, 0)}
+            for department_id, name in departments.values_list('id', 'name')
+        ]
+
+    return _cached(scope, compute)
+
+
+def employee_attendance_summary(employee):
+    """
+    Present / absent counts of one employee: overall and per department of
+    the employee's division
+    """
+    def compute():
+        rows = AttendanceReport.objects.filter(employee=employee).order_by().values(
+            'attendance__department'
+        ).annotate(
+            present=Count('id', filter=Q(status=True)),
+            absent=Count('id', filter=Q(status=False)),
+        )
+        by_department = {row['attendance__department']: row for row in rows}
+        departments = Department.objects.filter(division_id=employee.division_id).order_by('id')
+        per_department = []
+        for department_id, name in departments.values_list('id', 'name'):
+            row = by_department.get(department_id, {})
+            per_department.append({
+                'name': name,
+                'present': row.get('present', 0),
+                'absent': row.get('absent', 0),
+            })
+        total_present = sum(row['present'] for row in by_department.values())
+        return {
+            'total_attendance': total_present + sum(row['absent'] for row in by_department.values()),
+            'total_present': total_present,
+            'departments': per_department,
+        }
+
+    return _cached(f'employee:{employee.id}', compute)
+
+
+def _parse_status(value):
+    return str(value).strip().lower() in ('1', 'true', 'on', 'yes')
+
+
+def _parse_ids(rows):
+    """Map each posted row to an int id, or None when the id is missing or malformed"""
+    ids = []
+    for row in rows:
+        try:
+            ids.append(int(row.get('id')))
+        except (TypeError, ValueError):
+            ids.append(None)
+    return ids
+
+
+def save_attendance_bulk(department, date, rows):
+    """
+    Take attendance for ``department`` on ``date``. ``rows`` are
+    {'id': employee id, 'status': 0/1}. Reports that already exist are left
+    untouched. Returns (attendance, results) with one result per row:
+    {'id', 'result': 'created' | 'exists' | 'error', 'error'?}.
+    """
+    ids = _parse_ids(rows)
+    results = []
+    with transaction.atomic():
+        attendance, _ = Attendance.objects.get_or_create(department=department, date=date)
+        employee_ids = set(
+            Employee.objects.filter(id__in=[i for i in ids if i is not None]).values_list('id', flat=True)
+        )
+        existing = set(
+            AttendanceReport.objects.filter(
+                attendance=attendance, employee_id__in=employee_ids
+            ).values_list('employee_id', flat=True)
+        )
+
+        new_reports = []
+        for row, employee_id in zip(rows, ids):
+            if employee_id not in employee_ids:
+                results.append({'id': row.get('id'), 'result': 'error', 'error': 'Employee not found'})
+            elif employee_id in existing:
+                results.append({'id': employee_id, 'result': 'exists'})
+            else:
+                existing.add(employee_id)
+                new_reports.append(AttendanceReport(
+                    employee_id=employee_id, attendance=attendance, status=_parse_status(row.get('status'))
+                ))
+                results.append({'id': employee_id, 'result': 'created'})
+        AttendanceReport.objects.bulk_create(new_reports)
+    invalidate_attendance_summaries()
+    return attendance, results
+
+
+def update_attendance_bulk(attendance, rows):
+    """
+    Update existing reports of ``attendance``. ``rows`` are
+    {'id': employee user (admin) id, 'status': 0/1}. Returns one result per
+    row: {'id', 'result': 'updated' | 'unchanged' | 'error', 'error'?}.
+    """
+    ids = _parse_ids(rows)
+    results = []
+    with transaction.atomic():
+        employees = dict(
+            Employee.objects.filter(admin_id__in=[i for i in ids if i is not None]).values_list('admin_id', 'id')
+        )
+        reports = {
+            report.employee_id: report
+            for report in AttendanceReport.objects.select_for_update().filter(
+                attendance=attendance, employee_id__in=employees.values()
+            )
+        }
+
+        now = timezone.now()
+        changed = {}
+        for row, admin_id in zip(rows, ids):
+            report = reports.get(employees.get(admin_id))
+            if report is None:
+                results.append({'id': row.get('id'), 'result': 'error', 'error': 'Attendance report not found'})
+                continue
+            status = _parse_status(row.get('status'))
+            if report.status == status:
+                results.append({'id': admin_id, 'result': 'unchanged'})
+                continue
+            report.status = status
+            report.updated_at = now
+            changed[report.pk] = report
+            results.append({'id': admin_id, 'result': 'updated'})
+        AttendanceReport.objects.bulk_update(changed.values(), ['status', 'updated_at'])
+    invalidate_attendance_summaries()
+    return results
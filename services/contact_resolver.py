@@ -0,0 +1,48 @@
+"""
+Resolve inbound message senders (phone numbers / email addresses) to customers
+using the normalized ContactIdentity index.
+"""
+from django.core.cache import cache
+from django.db.models import F
+
+from main_app.cache_utils import make_key
+from main_app.models import ContactIdentity, Customer
+
+CACHE_NAMESPACE = 'contact_identity'
+CACHE_TTL = 60 * 15
+_MISS = (None, None)
+
+
+def lookup_identity(kind, value):
+    """
+    Return (customer_id, contact_id) for a normalized identity, or (None, None).
+    Customer-level identities win over contact-level ones.
+    """
+    if not value:
+        return _MISS
+    key = make_key(CACHE_NAMESPACE, kind, value)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    match = ContactIdentity.objects.filter(kind=kind, value=value).order_by(
+        F('contact').asc(nulls_first=True), 'id'
+    ).values_list('customer_id', 'contact_id').first()
+    result = match or _MISS
+    cache.set(key, result, CACHE_TTL)
+    return result
+
+
+def resolve_customer(phone=None, email=None):
+    """
+    Find the customer an inbound message belongs to. Phone is tried first,
+    then email. Returns a Customer (with owner staff loaded) or None.
+    """
+    customer_id = None
+    if phone:
+        customer_id, _ = lookup_identity('PHONE', ContactIdentity.normalize_phone(phone))
+    if customer_id is None and email:
+        customer_id, _ = lookup_identity('EMAIL', ContactIdentity.normalize_email(email))
+    if customer_id is None:
+        return None
+    return Customer.objects.select_related('owner_staff__admin').filter(pk=customer_id).first()
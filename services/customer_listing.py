@@ -0,0 +1,165 @@
+"""
+Customer listing for the management screens.
+
+Pages are fetched with keyset pagination on (created_at, id), newest first,
+so every page costs one indexed range scan instead of COUNT(*) + OFFSET.
+Active/inactive totals come from one conditional aggregate that is cached
+until a customer changes; filtered result counts are only computed when a
+filter is applied.
+"""
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils.http import urlencode
+
+from main_app.cache_utils import get_or_compute
+from main_app.models import Customer
+
+CACHE_NAMESPACE = 'customer_totals'
+PAGE_SIZE = 20
+
+
+def encode_cursor(customer):
+    raw = f"{customer.created_at.isoformat()}|{customer.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor, or None when it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, customer_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(customer_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def customer_totals():
+    """{'total', 'active', 'inactive'} over all customers, cached until a customer changes"""
+    def compute():
+        row = Customer.objects.order_by().aggregate(
+            total_count=Count('id'),
+            active_count=Count('id', filter=Q(active=True)),
+            inactive_count=Count('id', filter=Q(active=False)),
+        )
+        return {'total': row['total_count'], 'active': row['active_count'], 'inactive': row['inactive_count']}
+
+    return get_or_compute(CACHE_NAMESPACE, ('all',), compute, getattr(settings, 'CUSTOMER_TOTALS_CACHE_TTL', 600))
+
+
+def filter_customers(search='', city='', active=''):
+    condition = Q()
+    if search:
+        condition &= (
+            Q(name__icontains=search) |
+            Q(code__icontains=search) |
+            Q(email__icontains=search) |
+            Q(phone_primary__icontains=search)
+        )
+    if city:
+        condition &= Q(city_id=city)
+    if active:
+        condition &= Q(active=active == 'true')
+    return condition
+
+
+class CustomerPage:
+    """One keyset page; iterates like a Paginator page"""
+
+    def __init__(self, customers, has_previous, has_next, filters):
+        self.object_list = customers
+        self.has_previous = has_previous
+        self.has_next = has_next
+        self.filters = filters
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    def _url(self, **cursor):
+        params = {key: value for key, value in self.filters.items() if value}
+        params.update(cursor)
+        return '?' + urlencode(params)
+
+    @property
+    def first_url(self):
+        return self._url()
+
+    @property
+    def last_url(self):
+        return self._url(last=1)
+
+    @property
+    def previous_url(self):
+        return self._url(before=encode_cursor(self.object_list[0])) if self.object_list else self.first_url
+
+    @property
+    def next_url(self):
+        return self._url(after=encode_cursor(self.object_list[-1])) if self.object_list else self.first_url
+
+
+def customer_page(search='', city='', active='', after=None, before=None, last=False, page_size=PAGE_SIZE):
+    """
+    One page of customers, newest first. ``after`` / ``before`` are cursors
+    from a previous page; ``last`` jumps to the oldest page.
+    """
+    filters = {'search': search, 'city': city, 'active': active}
+    queryset = Customer.objects.select_related('city', 'owner_staff__admin').filter(
+        filter_customers(search, city, active)
+    )
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before or last:
+        # Walk towards newer rows in ascending order, then flip the page back
+        if before:
+            created_at, customer_id = before
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=customer_id)
+            )
+        rows = list(queryset.order_by('created_at', 'id')[:page_size + 1])
+        if before and len(rows) <= page_size:
+            # Back at the newest rows: show a full first page
+            return customer_page(search, city, active, page_size=page_size)
+        return CustomerPage(rows[:page_size][::-1], len(rows) > page_size, has_next=bool(before), filters=filters)
+
+    if after:
+        created_at, customer_id = after
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=customer_id)
+        )
+    rows = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+    return CustomerPage(rows[:page_size], has_previous=bool(after), has_next=len(rows) > page_size, filters=filters)
+
+
+def customer_listing(params, page_size=PAGE_SIZE):
+    """Page, totals and filtered count for the customer management screen from GET ``params``"""
+    search = params.get('search', '').strip()
+    city = params.get('city', '')
+    active = params.get('active', '')
+    page = customer_page(
+        search, city, active,
+        after=params.get('after'), before=params.get('before'), last=bool(params.get('last')),
+        page_size=page_size,
+    )
+    totals = customer_totals()
+    if search or city or active:
+        filtered_count = Customer.objects.filter(filter_customers(search, city, active)).count()
+    else:
+        filtered_count = totals['total']
+    return {
+        'customers': page,
+        'total_customers': totals['total'],
+        'active_customers': totals['active'],
+        'inactive_customers': totals['inactive'],
+        'filtered_count': filtered_count,
+        'current_filters': page.filters,
+    }
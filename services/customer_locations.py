@@ -0,0 +1,136 @@
+"""
+Customer locations held in memory for "which customers are near here" queries.
+
+Each process keeps a spatial index (services.spatial_index.GridIndex) of the
+active customers with coordinates. It is built once and then kept current
+incrementally: at most every CUSTOMER_INDEX_SYNC_S seconds, customers whose
+``updated_at`` moved since the last sync are re-indexed (or dropped, when
+inactive or without coordinates). Deletes bump the ``customer_locations``
+cache namespace, which triggers a full rebuild, as does
+CUSTOMER_INDEX_REBUILD_S passing as a safety net for bulk updates that
+bypass ``updated_at``.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from main_app.cache_utils import namespace_version
+from main_app.models import Customer, JobCard
+from services.spatial_index import GridIndex
+
+NAMESPACE = 'customer_locations'
+
+_FIELDS = ('id', 'name', 'code', 'address', 'city__name', 'latitude', 'longitude', 'active', 'updated_at')
+
+
+class CustomerIndex:
+    def __init__(self, cell_m=None):
+        self.cell_m = cell_m or getattr(settings, 'CUSTOMER_INDEX_CELL_M', 250)
+        self.index = GridIndex(self.cell_m)
+        self.synced_at = None
+        self.version = None
+        self._checked = 0.0
+        self._built = 0.0
+        self._lock = threading.RLock()
+
+    def _apply(self, rows):
+        for customer_id, name, code, address, city, lat, lng, active, updated_at in rows:
+            if active and lat is not None and lng is not None:
+                self.index.add(customer_id, lat, lng, {
+                    'name': name, 'code': code, 'address': address, 'city': city,
+                    'latitude': float(lat), 'longitude': float(lng),
+                })
+            else:
+                self.index.remove(customer_id)
+            if self.synced_at is None or updated_at > self.synced_at:
+                self.synced_at = updated_at
+
+    def rebuild(self):
+        version = namespace_version(NAMESPACE)
+        with self._lock:
+            self.index = GridIndex(self.cell_m)
+            self.synced_at = None
+            self._apply(Customer.objects.filter(
+                active=True, latitude__isnull=False, longitude__isnull=False
+            ).values_list(*_FIELDS).iterator(chunk_size=5000))
+            if self.synced_at is None:
+                self.synced_at = timezone.now()
+            self.version = version
+            self._built = self._checked = time.monotonic()
+
+    def sync(self):
+        """Re-index customers changed since the last sync; returns how many"""
+        # Overlap the window so rows committed late, with an older updated_at, are not missed
+        since = self.synced_at - timedelta(seconds=getattr(settings, 'CUSTOMER_INDEX_SYNC_OVERLAP_S', 60))
+        rows = list(Customer.objects.filter(updated_at__gte=since).values_list(*_FIELDS))
+        with self._lock:
+            self._apply(rows)
+            self._checked = time.monotonic()
+        return len(rows)
+
+    def refresh(self):
+        """Bring the index up to date if it was last checked more than CUSTOMER_INDEX_SYNC_S ago"""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked < getattr(settings, 'CUSTOMER_INDEX_SYNC_S', 5):
+            return
+        if (self.version != namespace_version(NAMESPACE)
+                or now - self._built > getattr(settings, 'CUSTOMER_INDEX_REBUILD_S', 3600)):
+            self.rebuild()
+        else:
+            self.sync()
+
+    def within(self, lat, lng, radius_m):
+        self.refresh()
+        with self._lock:
+            return self.index.within(lat, lng, radius_m)
+
+    def nearest(self, lat, lng, count=1, max_radius_m=50000):
+        self.refresh()
+        with self._lock:
+            return self.index.nearest(lat, lng, count, max_radius_m)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def customer_index():
+    """This process's customer location index"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CustomerIndex()
+    return _index
+
+
+def nearby_customers(latitude, longitude, radius_m=None, limit=None, employee_id=None):
+    """
+    Active customers within ``radius_m`` of a point, closest first, at most
+    ``limit``. With ``employee_id``, each carries the number of that
+    employee's open job cards for the customer, so visits can be suggested.
+    """
+    radius_m = min(float(radius_m or getattr(settings, 'NEARBY_CUSTOMERS_RADIUS_M', 2000)),
+                   getattr(settings, 'NEARBY_CUSTOMERS_MAX_RADIUS_M', 50000))
+    limit = min(int(limit or 10), 100)
+    found = customer_index().nearest(latitude, longitude, limit, radius_m)
+    customers = [
+        {'id': customer_id, **item, 'distance_m': round(distance)}
+        for distance, customer_id, item in found
+    ]
+    if employee_id is not None and customers:
+        open_job_cards = dict(JobCard.objects.filter(
+            assigned_to_id=employee_id, customer_id__in=[customer['id'] for customer in customers],
+            status__in=('PENDING', 'IN_PROGRESS'),
+        ).values('customer_id').annotate(count=Count('id')).values_list('customer_id', 'count'))
+        for customer in customers:
+            customer['open_job_cards'] = open_job_cards.get(customer['id'], 0)
+    return customers
+
+
+anearby_customers = sync_to_async(nearby_customers)
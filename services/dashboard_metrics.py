@@ -0,0 +1,97 @@
+"""
+Cached counters for the CEO / manager / employee home dashboards.
+
+Metrics are cached per role and scope (org, division, employee) for a short
+TTL. Keys embed the versions of the ``dashboard_metrics`` namespace (bumped by
+model signals, see main_app.models) and of the attendance summary namespace,
+so any relevant write makes the next home page load recompute. Recomputes
+read from the replica when one is configured.
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from main_app.cache_utils import get_or_compute, namespace_version
+from main_app.db_routing import using_replica
+from main_app.models import Division, Employee, EmployeeTask, LeaveReportManager, Manager
+from main_app.utils import get_attendance_stats
+from services.attendance import CACHE_NAMESPACE as ATTENDANCE_NAMESPACE, employee_attendance_summary
+
+CACHE_NAMESPACE = 'dashboard_metrics'
+
+
+def dashboard_version():
+    """Changes whenever cached dashboard data may be stale; used to key template fragments"""
+    return f"{namespace_version(CACHE_NAMESPACE)}.{namespace_version(ATTENDANCE_NAMESPACE)}"
+
+
+def dashboard_cache_ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 120)
+
+
+def fragment_cache_context():
+    """Template context for the ``{% cache %}`` blocks around the dashboard charts"""
+    return {'dashboard_cache_ttl': dashboard_cache_ttl(), 'dashboard_version': dashboard_version()}
+
+
+def _cached(scope, compute):
+    def compute_on_replica():
+        with using_replica():
+            return compute()
+
+    return get_or_compute(
+        CACHE_NAMESPACE, (namespace_version(ATTENDANCE_NAMESPACE),) + scope, compute_on_replica,
+        dashboard_cache_ttl()
+    )
+
+
+def org_dashboard_metrics():
+    def compute():
+        department_list, attendance_list = get_attendance_stats()
+        return {
+            'total_manager': Manager.objects.count(),
+            'total_employees': Employee.objects.count(),
+            'total_division': Division.objects.count(),
+            'total_department': len(department_list),
+            'total_attendance': sum(attendance_list),
+            'department_list': department_list,
+            'attendance_list': attendance_list,
+        }
+
+    return _cached(('org',), compute)
+
+
+def manager_dashboard_metrics(manager):
+    def compute():
+        department_list, attendance_list = get_attendance_stats(manager.division)
+        return {
+            'total_employees': Employee.objects.filter(division_id=manager.division_id).count(),
+            'total_leave': LeaveReportManager.objects.filter(manager=manager).count(),
+            'total_department': len(department_list),
+            'total_attendance': sum(attendance_list),
+            'department_list': department_list,
+            'attendance_list': attendance_list,
+        }
+
+    return _cached(('division', manager.division_id, 'manager', manager.id), compute)
+
+
+def employee_dashboard_metrics(employee):
+    def compute():
+        tasks = EmployeeTask.objects.filter(employee=employee).order_by().aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            pending=Count('id', filter=Q(status__in=['assigned', 'in_progress'])),
+            overdue=Count('id', filter=Q(
+                status__in=['assigned', 'in_progress'], due_date__lt=timezone.localdate()
+            )),
+        )
+        return {
+            'attendance': employee_attendance_summary(employee),
+            'total_tasks': tasks['total'],
+            'completed_tasks': tasks['completed'],
+            'pending_tasks': tasks['pending'],
+            'overdue_tasks': tasks['overdue'],
+        }
+
+    return _cached(('employee', employee.id), compute)
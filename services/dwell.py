@@ -0,0 +1,309 @@
+"""
+Stop (dwell) detection and visit inference.
+
+``StopDetector`` clusters an employee's consecutive fixes, DBSCAN-style but
+bounded in time: a fix joins the current cluster when it lies within
+GPS_STOP_RADIUS_M of the cluster centre and follows the previous fix within
+GPS_STOP_MAX_GAP_S. Up to GPS_STOP_MAX_NOISE stray fixes in a row are
+treated as noise; one more and the cluster ends, the strays seeding the
+next one. A cluster that lasted GPS_STOP_MIN_DWELL_S with at least
+GPS_STOP_MIN_FIXES fixes is a stop.
+
+Stops are matched against customer locations (within GPS_VISIT_RADIUS_M,
+see services.customer_locations) and geofences through in-memory spatial
+indexes, and a stop at a customer
+becomes visit evidence (JobCardVisit) on that customer's open job cards
+assigned to the employee.
+
+Detection runs incrementally as fixes are written (``observe_fixes``, with
+each employee's open cluster kept in the shared cache) and as a batch over
+a day's smoothed track (``rebuild_stops``, called by
+services.track_cleaning.clean_day), which reconciles the day's stops.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from main_app.cache_utils import namespace_version
+from main_app.date_utils import day_window
+from main_app.models import EmployeeGeofence, GPSStop, JobCard, JobCardVisit
+from services.customer_locations import customer_index
+from services.spatial_index import GridIndex, haversine_m
+
+Params = namedtuple('Params', 'radius_m min_dwell_s min_fixes max_gap_s max_noise')
+Stop = namedtuple('Stop', 'arrived_at departed_at latitude longitude radius_m fix_count')
+
+PLACES_NAMESPACE = 'visit_places'
+
+
+def stop_params():
+    return Params(
+        radius_m=getattr(settings, 'GPS_STOP_RADIUS_M', 50),
+        min_dwell_s=getattr(settings, 'GPS_STOP_MIN_DWELL_S', 300),
+        min_fixes=getattr(settings, 'GPS_STOP_MIN_FIXES', 3),
+        max_gap_s=getattr(settings, 'GPS_STOP_MAX_GAP_S', 1800),
+        max_noise=getattr(settings, 'GPS_STOP_MAX_NOISE', 2),
+    )
+
+
+class StopDetector:
+    """
+    Clusters one employee's fixes, fed in time order through ``add``. The
+    state is a plain dict (see ``state``) so it can be kept in the cache
+    between batches of fixes.
+    """
+
+    def __init__(self, params=None, state=None):
+        self.params = params or stop_params()
+        state = state or {}
+        # Current cluster: first/last epoch seconds, coordinate sums, fix count, furthest fix
+        self.cluster = state.get('cluster')
+        self.noise = state.get('noise', [])
+        self.last_time = state.get('last_time')
+
+    @property
+    def state(self):
+        return {'cluster': self.cluster, 'noise': self.noise, 'last_time': self.last_time}
+
+    def _as_stop(self, cluster):
+        first, last, sum_lat, sum_lng, count, spread = cluster
+        if count < self.params.min_fixes or last - first < self.params.min_dwell_s:
+            return None
+        return Stop(first, last, sum_lat / count, sum_lng / count, spread, count)
+
+    def current(self):
+        """The open cluster as a Stop once it qualifies as one, else None"""
+        return self._as_stop(self.cluster) if self.cluster else None
+
+    def add(self, t, lat, lng):
+        """Feed one fix (epoch seconds, degrees); returns the stops it closed"""
+        if self.last_time is not None and t <= self.last_time:
+            return []
+        self.last_time = t
+        if self.cluster is None:
+            self.cluster = [t, t, lat, lng, 1, 0.0]
+            return []
+        cluster = self.cluster
+        if t - cluster[1] > self.params.max_gap_s:
+            return self._close([(t, lat, lng)])
+        distance = haversine_m(cluster[2] / cluster[4], cluster[3] / cluster[4], lat, lng)
+        if distance <= self.params.radius_m:
+            cluster[1] = t
+            cluster[2] += lat
+            cluster[3] += lng
+            cluster[4] += 1
+            cluster[5] = max(cluster[5], distance)
+            self.noise = []
+            return []
+        self.noise.append((t, lat, lng))
+        if len(self.noise) <= self.params.max_noise:
+            return []
+        return self._close(self.noise)
+
+    def _close(self, pending):
+        """End the current cluster and restart from the ``pending`` fixes"""
+        closed = self._as_stop(self.cluster)
+        self.cluster = None
+        self.noise = []
+        self.last_time = None
+        stops = [closed] if closed else []
+        for t, lat, lng in pending:
+            stops.extend(self.add(t, lat, lng))
+        return stops
+
+
+def detect_stops(points, params=None):
+    """
+    Stops in ``points`` ((epoch seconds, latitude, longitude) in time order).
+    Returns (closed stops, open stop or None): the last cluster is reported
+    separately because the employee may still be there.
+    """
+    detector = StopDetector(params)
+    stops = []
+    for t, lat, lng in points:
+        stops.extend(detector.add(t, lat, lng))
+    return stops, detector.current()
+
+
+class Places:
+    """Customer locations (services.customer_locations) and active geofences for stop matching"""
+
+    def __init__(self):
+        self.geofences = GridIndex(cell_m=1000)
+        self.max_geofence_radius = 0
+        for geofence_id, lat, lng, radius in EmployeeGeofence.objects.filter(is_active=True).values_list(
+            'id', 'center_latitude', 'center_longitude', 'radius_meters'
+        ):
+            self.geofences.add(geofence_id, lat, lng, radius)
+            self.max_geofence_radius = max(self.max_geofence_radius, radius)
+
+    def customer_at(self, lat, lng):
+        """(customer id, distance) of the closest customer within GPS_VISIT_RADIUS_M, or (None, None)"""
+        found = customer_index().nearest(lat, lng, 1, getattr(settings, 'GPS_VISIT_RADIUS_M', 150))
+        return (found[0][1], found[0][0]) if found else (None, None)
+
+    def geofence_at(self, lat, lng):
+        """Id of the geofence with the closest centre that contains the point, or None"""
+        for distance, geofence_id, radius in self.geofences.within(lat, lng, self.max_geofence_radius):
+            if distance <= radius:
+                return geofence_id
+        return None
+
+
+_places = None
+
+
+def places():
+    """This process's Places; the geofences are rebuilt when one has changed"""
+    global _places
+    version = namespace_version(PLACES_NAMESPACE)
+    if _places is None or _places[0] != version:
+        _places = (version, Places())
+    return _places[1]
+
+
+def _aware(t):
+    return datetime.fromtimestamp(t, tz=dt_timezone.utc)
+
+
+def _stop_values(stop, is_open, index):
+    """GPSStop fields for ``stop``, matched to a customer and geofence"""
+    customer_id, distance = index.customer_at(stop.latitude, stop.longitude)
+    return {
+        'arrived_at': _aware(stop.arrived_at),
+        'departed_at': _aware(stop.departed_at),
+        'latitude': round(stop.latitude, 6),
+        'longitude': round(stop.longitude, 6),
+        'radius_m': round(stop.radius_m, 1),
+        'fix_count': stop.fix_count,
+        'is_open': is_open,
+        'customer_id': customer_id,
+        'customer_distance_m': round(distance, 1) if distance is not None else None,
+        'geofence_id': index.geofence_at(stop.latitude, stop.longitude),
+    }
+
+
+def _store(employee_id, gps_stop, values):
+    """Create or update (``gps_stop``) a stored stop and record its visits"""
+    if gps_stop is None:
+        gps_stop = GPSStop.objects.create(employee_id=employee_id, **values)
+    else:
+        for field, value in values.items():
+            setattr(gps_stop, field, value)
+        gps_stop.save()
+    record_visits(gps_stop)
+    return gps_stop
+
+
+def _overlaps(gps_stop, values):
+    return gps_stop.arrived_at <= values['departed_at'] and gps_stop.departed_at >= values['arrived_at']
+
+
+def save_stop(employee_id, stop, is_open, index=None):
+    """
+    Store ``stop`` (updating the stored stop of the same day it overlaps, if
+    any), match it to a customer and geofence and record the visits it evidences
+    """
+    values = _stop_values(stop, is_open, index or places())
+    with transaction.atomic():
+        gps_stop = GPSStop.objects.select_for_update().for_day(timezone.localdate(values['arrived_at'])).filter(
+            employee_id=employee_id, arrived_at__lte=values['departed_at'], departed_at__gte=values['arrived_at'],
+        ).order_by('arrived_at').first()
+        return _store(employee_id, gps_stop, values)
+
+
+def record_visits(stop):
+    """Attach ``stop`` as visit evidence to its customer's job cards assigned to the employee"""
+    visits = JobCardVisit.objects.filter(stop=stop)
+    if stop.customer_id is None:
+        visits.delete()
+        return
+    visits.exclude(job_card__customer_id=stop.customer_id).delete()
+    day_start, day_end = day_window(timezone.localdate(stop.arrived_at))
+    job_cards = JobCard.objects.filter(
+        assigned_to_id=stop.employee_id, customer_id=stop.customer_id, created_date__lt=day_end,
+    ).exclude(status='CANCELLED').filter(
+        Q(status__in=('PENDING', 'IN_PROGRESS')) | Q(due_date__gte=day_start, due_date__lt=day_end)
+    )
+    for job_card_id in job_cards.values_list('id', flat=True):
+        JobCardVisit.objects.update_or_create(job_card_id=job_card_id, stop=stop, defaults={
+            'employee_id': stop.employee_id,
+            'arrived_at': stop.arrived_at,
+            'departed_at': stop.departed_at,
+            'distance_m': stop.customer_distance_m,
+        })
+
+
+def _state_key(employee_id):
+    return f"gps:dwell:{employee_id}"
+
+
+def observe_fixes(fixes):
+    """
+    Feed freshly written fixes (see services.gps_ingest) to each employee's
+    detector; stops are stored as soon as they qualify and updated until
+    they close. Returns the number of stops saved.
+    """
+    tracks = defaultdict(list)
+    for fix in fixes:
+        if fix.get('is_outlier'):
+            continue
+        lat = fix.get('smoothed_latitude') if fix.get('smoothed_latitude') is not None else fix['latitude']
+        lng = fix.get('smoothed_longitude') if fix.get('smoothed_longitude') is not None else fix['longitude']
+        tracks[fix['employee_id']].append((parse_datetime(fix['timestamp']).timestamp(), float(lat), float(lng)))
+    if not tracks:
+        return 0
+
+    keys = {employee_id: _state_key(employee_id) for employee_id in tracks}
+    states = cache.get_many(list(keys.values()))
+    saved = 0
+    for employee_id, points in tracks.items():
+        detector = StopDetector(state=states.get(keys[employee_id]))
+        for point in sorted(points):
+            for stop in detector.add(*point):
+                save_stop(employee_id, stop, is_open=False)
+                saved += 1
+        current = detector.current()
+        if current is not None:
+            save_stop(employee_id, current, is_open=True)
+            saved += 1
+        states[keys[employee_id]] = detector.state
+    cache.set_many(states, getattr(settings, 'GPS_FILTER_STATE_TTL', 43200))
+    return saved
+
+
+def rebuild_stops(employee_id, day, points, params=None):
+    """
+    Bring the employee's stops of ``day`` in line with the ones detected in
+    the day's cleaned ``points`` (see services.track_cleaning.clean_tracks).
+    Stored stops are updated in place where a detected stop overlaps them, so
+    they and their visits keep their ids; stops no longer detected are
+    deleted. Returns the number of stops.
+    """
+    track = [(point[0].timestamp(), point[1], point[2]) for point in points if not point[4]]
+    closed, current = detect_stops(track, params)
+    detected = [(stop, False) for stop in closed]
+    if current is not None:
+        # On a past day the last stop is over; today the employee may still be there
+        detected.append((current, day == timezone.localdate()))
+    index = places()
+    with transaction.atomic():
+        stored = list(GPSStop.objects.select_for_update().for_day(day).filter(
+            employee_id=employee_id).order_by('arrived_at'))
+        matched = []
+        for stop, is_open in detected:
+            values = _stop_values(stop, is_open, index)
+            gps_stop = next((candidate for candidate in stored if _overlaps(candidate, values)), None)
+            if gps_stop is not None:
+                stored.remove(gps_stop)
+            matched.append((gps_stop, values))
+        GPSStop.objects.filter(id__in=[gps_stop.id for gps_stop in stored]).delete()
+        for gps_stop, values in matched:
+            _store(employee_id, gps_stop, values)
+    return len(detected)
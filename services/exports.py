@@ -0,0 +1,443 @@
+"""
+Streaming data exports (CSV and XLSX).
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` and encoded as
+they arrive, so memory stays flat whatever the export size. Reads go to the
+read replica when one is configured, through a server-side cursor held open
+inside a transaction (which also works behind pgbouncer). Small exports are
+streamed straight to the browser through StreamingHttpResponse; large ones run
+as ExportJob background tasks that write the file to storage for download.
+
+Under ASGI, Django 4.2 reads a synchronous streaming iterator to the end
+before sending anything, so the response needs ``aiter_chunks`` there to
+keep memory flat.
+"""
+import csv
+import logging
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from main_app.date_utils import as_local_date, date_range_q
+from main_app.db_routing import streaming_alias, using_replica
+from main_app.models import ExportJob, GPSCheckIn, GPSTrack, JobCard, Manager, Order, Payment
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+class ExportDataset:
+    """
+    A named export: the model, its columns as (header, lookup) pairs, the
+    date field used for range filters and the lookup to the owning employee
+    (used to scope managers to their division).
+    """
+
+    def __init__(self, name, model, columns, date_field, employee_field):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.employee_field = employee_field
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def queryset(self, user, start_date=None, end_date=None, employee_id=None):
+        """Rows visible to ``user`` as value tuples, in primary key order"""
+        queryset = self.model._default_manager.all()
+        if user.user_type == '2':
+            manager = Manager.objects.filter(admin=user).first()
+            if manager is None:
+                raise PermissionDenied('Manager profile not found')
+            queryset = queryset.filter(**{f'{self.employee_field}__division': manager.division_id})
+        elif user.user_type != '1':
+            raise PermissionDenied('Exports are restricted to managers and administrators')
+
+        if start_date or end_date:
+            queryset = queryset.filter(self._date_q(start_date, end_date))
+        if employee_id:
+            queryset = queryset.filter(**{f'{self.employee_field}_id': employee_id})
+        return queryset.order_by('pk').values_list(*[lookup for _, lookup in self.columns])
+
+    def _date_q(self, start_date, end_date):
+        field = self.model._meta.get_field(self.date_field)
+        if field.get_internal_type() == 'DateTimeField':
+            return date_range_q(self.date_field, start_date, end_date)
+        condition = Q()
+        if start_date:
+            condition &= Q(**{f'{self.date_field}__gte': as_local_date(start_date)})
+        if end_date:
+            condition &= Q(**{f'{self.date_field}__lte': as_local_date(end_date)})
+        return condition
+
+
+DATASETS = {dataset.name: dataset for dataset in [
+    ExportDataset('gps_tracks', GPSTrack, [
+        ('ID', 'id'),
+        ('Employee ID', 'employee_id'),
+        ('First Name', 'employee__admin__first_name'),
+        ('Last Name', 'employee__admin__last_name'),
+        ('Timestamp', 'timestamp'),
+        ('Latitude', 'latitude'),
+        ('Longitude', 'longitude'),
+        ('Accuracy (m)', 'accuracy'),
+        ('Speed (km/h)', 'speed'),
+        ('Heading', 'heading'),
+        ('Battery (%)', 'battery_level'),
+        ('Status', 'status'),
+        ('Address', 'address'),
+    ], date_field='timestamp', employee_field='employee'),
+    ExportDataset('gps_checkins', GPSCheckIn, [
+        ('ID', 'id'),
+        ('Employee ID', 'employee_id'),
+        ('First Name', 'employee__admin__first_name'),
+        ('Last Name', 'employee__admin__last_name'),
+        ('Check-in Time', 'check_in_time'),
+        ('Check-in Latitude', 'check_in_latitude'),
+        ('Check-in Longitude', 'check_in_longitude'),
+        ('Check-in Address', 'check_in_address'),
+        ('Check-out Time', 'check_out_time'),
+        ('Check-out Latitude', 'check_out_latitude'),
+        ('Check-out Longitude', 'check_out_longitude'),
+        ('Check-out Address', 'check_out_address'),
+        ('Distance (km)', 'total_distance_km'),
+        ('Approved', 'is_approved'),
+        ('Work Summary', 'work_summary'),
+    ], date_field='check_in_time', employee_field='employee'),
+    ExportDataset('job_cards', JobCard, [
+        ('ID', 'id'),
+        ('Type', 'type'),
+        ('Status', 'status'),
+        ('Priority', 'priority'),
+        ('Assigned To (First Name)', 'assigned_to__admin__first_name'),
+        ('Assigned To (Last Name)', 'assigned_to__admin__last_name'),
+        ('Assigned By', 'assigned_by__email'),
+        ('Customer', 'customer__name'),
+        ('City', 'city__name'),
+        ('Created', 'created_date'),
+        ('Due', 'due_date'),
+        ('Description', 'description'),
+    ], date_field='created_date', employee_field='assigned_to'),
+    ExportDataset('orders', Order, [
+        ('ID', 'id'),
+        ('Order Date', 'order_date'),
+        ('Customer', 'customer__name'),
+        ('Staff (First Name)', 'created_by_staff__admin__first_name'),
+        ('Staff (Last Name)', 'created_by_staff__admin__last_name'),
+        ('Status', 'status'),
+        ('Total Bales', 'total_bales'),
+        ('Total Amount', 'total_amount'),
+        ('Created', 'created_at'),
+    ], date_field='order_date', employee_field='created_by_staff'),
+    ExportDataset('payments', Payment, [
+        ('ID', 'id'),
+        ('Payment Date', 'payment_date'),
+        ('Customer', 'customer__name'),
+        ('Order ID', 'order_id'),
+        ('Method', 'method'),
+        ('Amount', 'amount'),
+        ('Notes', 'notes'),
+        ('Created', 'created_at'),
+    ], date_field='payment_date', employee_field='order__created_by_staff'),
+]}
+
+
+def get_dataset(name):
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise ValueError(f"Unknown export dataset '{name}'")
+
+
+def _cell(value):
+    """Plain value for a cell: local datetimes, ISO dates, '' for NULL"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(headers, rows, batch_size=500):
+    """Yield CSV text a batch of rows at a time"""
+    writer = csv.writer(_Echo())
+    buffer = [writer.writerow(headers)]
+    for row in rows:
+        buffer.append(writer.writerow([_cell(value) for value in row]))
+        if len(buffer) >= batch_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+_XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+# Characters XML 1.0 does not allow, even escaped
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    value = _cell(value)
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    if value == '':
+        return ''
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class _ChunkSink:
+    """Write-only, unseekable stream collecting what ZipFile writes until drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_xlsx(headers, rows, batch_size=500):
+    """
+    Yield a single-sheet XLSX workbook as bytes. Strings are written inline
+    (no shared string table) and the zip is streamed with data descriptors, so
+    memory use does not grow with the number of rows.
+    """
+    sink = _ChunkSink()
+    workbook = zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED)
+    for name, content in _XLSX_STATIC_PARTS.items():
+        workbook.writestr(name, content)
+
+    columns = [_column_letter(index) for index in range(len(headers))]
+
+    def row_xml(number, values):
+        cells = ''.join(_xlsx_cell(f'{column}{number}', value) for column, value in zip(columns, values))
+        return f'<row r="{number}">{cells}</row>'
+
+    with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+        sheet.write((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            + row_xml(1, headers)
+        ).encode())
+        buffer = []
+        for number, row in enumerate(rows, start=2):
+            buffer.append(row_xml(number, row))
+            if len(buffer) >= batch_size:
+                sheet.write(''.join(buffer).encode())
+                buffer = []
+                yield sink.drain()
+        sheet.write((''.join(buffer) + '</sheetData></worksheet>').encode())
+    workbook.close()
+    yield sink.drain()
+
+
+def iter_rows(queryset):
+    """Rows of ``queryset`` through a server-side cursor on the streaming alias"""
+    alias = streaming_alias()
+    with transaction.atomic(using=alias):
+        yield from queryset.using(alias).iterator(chunk_size=_chunk_size())
+
+
+def iter_export(dataset, rows, format_type):
+    if format_type == 'csv':
+        return iter_csv(dataset.headers, rows)
+    if format_type == 'xlsx':
+        return iter_xlsx(dataset.headers, rows)
+    raise ValueError(f"Unsupported export format '{format_type}'")
+
+
+def export_filename(dataset, format_type):
+    return f"{dataset.name}_{timezone.localtime().strftime('%Y%m%d_%H%M%S')}.{format_type}"
+
+
+def stream_export(user, dataset_name, format_type, **filters):
+    """Chunks of the export for a StreamingHttpResponse"""
+    dataset = get_dataset(dataset_name)
+    return iter_export(dataset, iter_rows(dataset.queryset(user, **filters)), format_type)
+
+
+async def aiter_chunks(chunks, batch_size=64):
+    """
+    ``chunks`` as an async iterator, ``batch_size`` chunks per hop to the
+    request's thread (where the database cursor lives)
+    """
+    chunks = iter(chunks)
+    next_batch = sync_to_async(lambda: list(islice(chunks, batch_size)))
+    while True:
+        batch = await next_batch()
+        if not batch:
+            return
+        for chunk in batch:
+            yield chunk
+
+
+def needs_background_export(user, dataset_name, **filters):
+    """True when the export is too large to stream inside a request"""
+    limit = getattr(settings, 'EXPORT_STREAM_MAX_ROWS', 100000)
+    dataset = get_dataset(dataset_name)
+    with using_replica():
+        return dataset.queryset(user, **filters)[limit:limit + 1].exists()
+
+
+def queue_export(user, dataset_name, format_type, **filters):
+    """Record an ExportJob and hand it to a worker"""
+    get_dataset(dataset_name)
+    if format_type not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported export format '{format_type}'")
+    params = {key: str(value) for key, value in filters.items() if value}
+    job = ExportJob.objects.create(
+        requested_by=user, dataset=dataset_name, format=format_type, params=params
+    )
+    try:
+        from api.tasks import run_export_job
+        run_export_job.apply_async(args=[job.id], retry=False)
+    except Exception as e:
+        # The periodic beat run picks pending jobs up if the broker is unavailable
+        logger.warning("Could not schedule export job %s: %s", job.id, e)
+    return job
+
+
+def run_export_job(job_id):
+    """Claim a pending job and run it; None when another worker got it first"""
+    if not ExportJob.objects.filter(pk=job_id, status='PENDING').update(status='RUNNING', started_at=timezone.now()):
+        return None
+    return run_export(ExportJob.objects.select_related('requested_by').get(pk=job_id))
+
+
+def run_export(job):
+    """Write the export of ``job`` to a temporary file, then to storage"""
+    dataset = get_dataset(job.dataset)
+    counter = {'rows': 0}
+
+    def counted(rows):
+        for row in rows:
+            counter['rows'] += 1
+            yield row
+
+    try:
+        rows = iter_rows(dataset.queryset(job.requested_by, **job.params))
+        with tempfile.TemporaryFile() as output:
+            for chunk in iter_export(dataset, counted(rows), job.format):
+                output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            output.seek(0)
+            job.file.save(export_filename(dataset, job.format), File(output), save=False)
+    except Exception as e:
+        logger.exception("Export job %s failed", job.id)
+        job.status = 'FAILED'
+        job.error = str(e)
+    else:
+        job.status = 'DONE'
+        job.row_count = counter['rows']
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'file', 'row_count', 'finished_at'])
+    return job
+
+
+def fail_stale_exports():
+    """
+    Fail RUNNING jobs claimed more than EXPORT_JOB_TIMEOUT_S ago: their worker
+    died or was killed. They are not requeued, as the same export could kill
+    the next worker too; the user sees the failure and can ask again.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT_S', 3600))
+    return ExportJob.objects.filter(status='RUNNING').filter(
+        Q(started_at__lt=cutoff) | Q(started_at__isnull=True, created_at__lt=cutoff)
+    ).update(status='FAILED', error='The export did not finish; please request it again', finished_at=now)
+
+
+def run_pending_exports(limit=5):
+    """Run export jobs that were never picked up (e.g. the broker was down), after failing stale ones"""
+    fail_stale_exports()
+    stale_before = timezone.now() - timedelta(minutes=1)
+    pending = ExportJob.objects.filter(status='PENDING', created_at__lt=stale_before).order_by('id')
+    return sum(1 for job_id in pending.values_list('id', flat=True)[:limit] if run_export_job(job_id))
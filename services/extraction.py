@@ -0,0 +1,302 @@
+"""
+Rule based extraction engine for field reports.
+
+Customer, contact and item names from the catalog are compiled into a single
+Aho-Corasick automaton; quantities, rates, payments and follow-up hints are
+matched with precompiled regexes. Every extracted value carries its character
+offsets and a confidence so callers can decide when a report still needs the
+language model.
+"""
+import re
+import threading
+from collections import deque
+
+from main_app.cache_utils import namespace_version
+
+CATALOG_NAMESPACE = 'extraction_catalog'
+MIN_NAME_LENGTH = 3
+
+_NUMBER = r'(\d+(?:,\d+)*(?:\.\d+)?)'
+RATE_RE = re.compile(r'(?:\brate\b|\bprice\b|@|₹|\brs\.?|\binr\b)\s*(?:of\s*)?(?:₹|rs\.?\s*)?' + _NUMBER, re.IGNORECASE)
+PAYMENT_RE = re.compile(r'\b(?:collected|received|paid|payment of)\s*(?:₹|rs\.?|inr)?\s*' + _NUMBER, re.IGNORECASE)
+CHEQUE_RE = re.compile(r'\b(\d+|one|two|three|four|five)\s+(?:cheques?|checks?)\b', re.IGNORECASE)
+PAYMENT_METHOD_RE = re.compile(r'\b(cheques?|checks?|cash|online|upi|neft|rtgs|bank transfer)\b', re.IGNORECASE)
+FOLLOW_UP_RE = re.compile(r'\b(follow[\s-]?up|call back|visit again|will transfer|next visit|remind)\b', re.IGNORECASE)
+FOLLOW_UP_DATE_RE = re.compile(r'\b(tomorrow|next week|(?:after|in)\s+\d+\s+days?)\b', re.IGNORECASE)
+ORDER_RE = re.compile(r'\border(?:ed|s)?\b', re.IGNORECASE)
+COMPLAINT_RE = re.compile(r'\b(complain(?:t|ed|s)?|defect(?:ive)?|damaged|quality issue|return(?:ed)?)\b', re.IGNORECASE)
+CONTACT_FALLBACK_RE = re.compile(r'\b(?i:met)\s+(?:(?i:mr|mrs|ms|shri)\.?\s+)?([A-Z][a-z]+)')
+CUSTOMER_FALLBACK_RES = (
+    re.compile(r'(?:met|visited|at)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)', re.IGNORECASE),
+    re.compile(r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:company|ltd|pvt)', re.IGNORECASE),
+)
+DEFAULT_UNITS = ('bales', 'bale', 'kgs', 'kg', 'tons', 'ton', 'pcs', 'boxes', 'box', 'meters', 'metres', 'mtrs')
+WORD_NUMBERS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5}
+
+
+def _fold(text):
+    """Lowercase without changing the string length, so offsets map back to the original text"""
+    return ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+def _to_number(raw):
+    value = float(raw.replace(',', ''))
+    return int(value) if value.is_integer() else value
+
+
+class AhoCorasick:
+    """Case-insensitive multi-pattern matcher over whole words"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._built = False
+
+    def add(self, pattern, payload):
+        pattern = ' '.join(_fold(pattern).split())
+        if len(pattern) < MIN_NAME_LENGTH:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append((len(pattern), payload))
+        self._built = False
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._built = True
+        return self
+
+    def find(self, text):
+        """
+        Return non-overlapping (start, end, payload) matches, preferring the
+        leftmost and then the longest pattern, that sit on word boundaries
+        """
+        if not self._built:
+            self.build()
+        folded = _fold(text)
+        candidates = []
+        node = 0
+        for index, ch in enumerate(folded):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, payload in self._output[node]:
+                start, end = index - length + 1, index + 1
+                if start > 0 and folded[start - 1].isalnum():
+                    continue
+                if end < len(folded) and folded[end].isalnum():
+                    continue
+                candidates.append((start, end, payload))
+
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        matches = []
+        last_end = -1
+        for start, end, payload in candidates:
+            if start >= last_end:
+                matches.append((start, end, payload))
+                last_end = end
+        return matches
+
+
+class ExtractionEngine:
+    """Extracts structured visit data from a field report without calling the model"""
+
+    def __init__(self, customers=(), contacts=(), items=(), units=()):
+        self.names = AhoCorasick()
+        for customer_id, name in customers:
+            self.names.add(name, ('customer', customer_id, None))
+        for contact_id, customer_id, name in contacts:
+            self.names.add(name, ('contact', contact_id, customer_id))
+        for item_id, name, uom in items:
+            self.names.add(name, ('item', item_id, uom))
+        self.names.build()
+
+        unit_words = sorted({u.lower() for u in tuple(units) + DEFAULT_UNITS if u}, key=len, reverse=True)
+        self.quantity_re = re.compile(
+            _NUMBER + r'\s*(' + '|'.join(re.escape(u) for u in unit_words) + r')\b', re.IGNORECASE
+        )
+
+    @classmethod
+    def from_catalog(cls):
+        from main_app.models import Customer, CustomerContact, Item
+
+        return cls(
+            customers=Customer.objects.filter(active=True).values_list('id', 'name'),
+            contacts=CustomerContact.objects.filter(customer__active=True).values_list('id', 'customer_id', 'name'),
+            items=Item.objects.values_list('id', 'name', 'uom'),
+            units=Item.objects.values_list('uom', flat=True).distinct(),
+        )
+
+    def extract(self, text):
+        """
+        Return the same fields as the model prompt plus ``customer_id``,
+        ``contact_id``, ``item_id`` and ``matches`` (offsets and confidence of
+        every value used). ``confidence`` is the engine's overall certainty.
+        """
+        text = text or ''
+        matches = []
+
+        def record(field, start, end, confidence):
+            matches.append({
+                'field': field, 'start': start, 'end': end,
+                'text': text[start:end], 'confidence': confidence,
+            })
+
+        extracted = {
+            'customer_name': '',
+            'customer_id': None,
+            'contact_person': '',
+            'contact_id': None,
+            'item_id': None,
+            'visit_outcome': 'visit_completed',
+            'order_details': {},
+            'payment_details': {},
+            'follow_up_required': 'no',
+            'follow_up_date': '',
+            'follow_up_reason': '',
+        }
+
+        contact_customer_id = None
+        for start, end, (kind, object_id, extra) in self.names.find(text):
+            if kind == 'customer' and extracted['customer_id'] is None:
+                extracted['customer_id'] = object_id
+                extracted['customer_name'] = text[start:end]
+                record('customer_name', start, end, 0.95)
+            elif kind == 'contact' and extracted['contact_id'] is None:
+                extracted['contact_id'] = object_id
+                extracted['contact_person'] = text[start:end]
+                contact_customer_id = extra
+                record('contact_person', start, end, 0.85)
+            elif kind == 'item' and extracted['item_id'] is None:
+                extracted['item_id'] = object_id
+                extracted['order_details']['item'] = text[start:end]
+                record('order_details.item', start, end, 0.9)
+
+        if extracted['customer_id'] is None and contact_customer_id is not None:
+            # A known contact implies their customer even if the company is not named
+            extracted['customer_id'] = contact_customer_id
+        if extracted['customer_id'] is None:
+            for pattern in CUSTOMER_FALLBACK_RES:
+                match = pattern.search(text)
+                if match:
+                    extracted['customer_name'] = match.group(1)
+                    record('customer_name', match.start(1), match.end(1), 0.4)
+                    break
+        if not extracted['contact_person']:
+            match = CONTACT_FALLBACK_RE.search(text)
+            if match:
+                extracted['contact_person'] = match.group(1)
+                record('contact_person', match.start(1), match.end(1), 0.5)
+
+        match = self.quantity_re.search(text)
+        if match:
+            extracted['order_details']['quantity'] = _to_number(match.group(1))
+            extracted['order_details']['unit'] = match.group(2).lower()
+            record('order_details.quantity', match.start(), match.end(), 0.9)
+        match = RATE_RE.search(text)
+        if match:
+            extracted['order_details']['rate'] = _to_number(match.group(1))
+            record('order_details.rate', match.start(1), match.end(1), 0.85)
+        if 'quantity' in extracted['order_details'] and 'rate' in extracted['order_details']:
+            extracted['order_details']['amount'] = (
+                extracted['order_details']['quantity'] * extracted['order_details']['rate']
+            )
+
+        match = PAYMENT_RE.search(text)
+        if match:
+            extracted['payment_details']['amount'] = _to_number(match.group(1))
+            record('payment_details.amount', match.start(1), match.end(1), 0.85)
+        match = CHEQUE_RE.search(text)
+        if match:
+            count = match.group(1).lower()
+            extracted['payment_details']['cheque_count'] = WORD_NUMBERS.get(count) or int(count)
+            record('payment_details.cheque_count', match.start(), match.end(), 0.8)
+        match = PAYMENT_METHOD_RE.search(text)
+        if match and (extracted['payment_details'] or 'transfer' in text.lower()):
+            extracted['payment_details']['method'] = match.group(1).lower()
+            record('payment_details.method', match.start(), match.end(), 0.7)
+
+        follow_up = FOLLOW_UP_RE.search(text)
+        follow_up_date = FOLLOW_UP_DATE_RE.search(text)
+        if follow_up or follow_up_date:
+            extracted['follow_up_required'] = 'yes'
+            hint = follow_up or follow_up_date
+            extracted['follow_up_reason'] = text[hint.start():hint.end()]
+            record('follow_up_required', hint.start(), hint.end(), 0.75)
+        if follow_up_date:
+            extracted['follow_up_date'] = follow_up_date.group(1)
+            record('follow_up_date', follow_up_date.start(), follow_up_date.end(), 0.8)
+
+        complaint = COMPLAINT_RE.search(text)
+        if extracted['order_details'].get('quantity') or ORDER_RE.search(text):
+            extracted['visit_outcome'] = 'order_taken'
+        elif extracted['payment_details']:
+            extracted['visit_outcome'] = 'payment_collected'
+        elif complaint:
+            extracted['visit_outcome'] = 'complaint'
+            record('visit_outcome', complaint.start(), complaint.end(), 0.7)
+
+        extracted['matches'] = matches
+        extracted['confidence'] = self._confidence(extracted)
+        extracted['source'] = 'rules'
+        return extracted
+
+    @staticmethod
+    def _confidence(extracted):
+        """Overall certainty: a catalog customer plus a clear outcome is needed to skip the model"""
+        score = 0.3
+        if extracted['customer_id']:
+            score += 0.35
+        elif extracted['customer_name']:
+            score += 0.1
+        if extracted['contact_person']:
+            score += 0.05
+        order = extracted['order_details']
+        if order.get('quantity') and (order.get('item') or order.get('rate')):
+            score += 0.2
+        elif extracted['payment_details'].get('amount'):
+            score += 0.2
+        elif extracted['payment_details'] or extracted['visit_outcome'] == 'complaint':
+            # Only an outcome the report states counts; the visit_completed default
+            # and a bare "order" without details do not
+            score += 0.1
+        if extracted['follow_up_required'] == 'yes' and not extracted['follow_up_date']:
+            score -= 0.05
+        return round(min(max(score, 0.0), 0.95), 2)
+
+
+_engine = None
+_engine_version = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the engine for the current catalog, rebuilding it after catalog changes"""
+    global _engine, _engine_version
+    version = namespace_version(CATALOG_NAMESPACE)
+    if _engine is None or _engine_version != version:
+        with _engine_lock:
+            if _engine is None or _engine_version != version:
+                _engine = ExtractionEngine.from_catalog()
+                _engine_version = version
+    return _engine
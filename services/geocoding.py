@@ -0,0 +1,136 @@
+"""
+Geocoding of customer addresses.
+
+Customers with an address but no coordinates are geocoded by a worker
+(``geocode_pending``), kicked shortly after a customer is saved and run
+periodically as a safety net, but only when GEOCODING_ENABLED: addresses
+are sent to a third party. The provider is Google's Geocoding API when
+GOOGLE_MAPS_API_KEY is set, otherwise OpenStreetMap Nominatim, which allows
+one request per second. That pace (GEOCODING_MIN_INTERVAL_S) is enforced
+across processes through the shared cache. Results are cached per address,
+so customers sharing an address cost a single lookup.
+"""
+import hashlib
+import logging
+import math
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from main_app.models import Customer
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
+GOOGLE_URL = 'https://maps.googleapis.com/maps/api/geocode/json'
+
+_NOT_FOUND = 'not-found'
+_RATE_KEY = 'geocoding:rate'
+
+
+def _throttle():
+    """Wait until no process has sent a provider request in the last GEOCODING_MIN_INTERVAL_S"""
+    interval = math.ceil(getattr(settings, 'GEOCODING_MIN_INTERVAL_S', 1))
+    while not cache.add(_RATE_KEY, 1, interval):
+        time.sleep(0.1)
+
+
+def _lookup_google(query, key):
+    response = requests.get(GOOGLE_URL, params={'address': query, 'key': key}, timeout=10)
+    response.raise_for_status()
+    results = response.json().get('results') or []
+    if not results:
+        return None
+    location = results[0]['geometry']['location']
+    return float(location['lat']), float(location['lng'])
+
+
+def _lookup_nominatim(query):
+    response = requests.get(
+        getattr(settings, 'GEOCODING_URL', '') or NOMINATIM_URL,
+        params={'q': query, 'format': 'json', 'limit': 1},
+        headers={'User-Agent': getattr(settings, 'GEOCODING_USER_AGENT', 'axpect-sms')},
+        timeout=10,
+    )
+    response.raise_for_status()
+    results = response.json()
+    if not results:
+        return None
+    return float(results[0]['lat']), float(results[0]['lon'])
+
+
+def geocode(query):
+    """(latitude, longitude) of an address, or None when it cannot be found; raises requests errors"""
+    key = f"geocode:{hashlib.sha1(query.strip().lower().encode()).hexdigest()}"
+    cached = cache.get(key)
+    if cached is not None:
+        return None if cached == _NOT_FOUND else cached
+    api_key = getattr(settings, 'GOOGLE_MAPS_API_KEY', '')
+    _throttle()
+    location = _lookup_google(query, api_key) if api_key else _lookup_nominatim(query)
+    cache.set(key, location or _NOT_FOUND, getattr(settings, 'GEOCODING_CACHE_TTL', 30 * 86400))
+    return location
+
+
+def customer_query(customer):
+    """The text geocoded for a customer: its address and city"""
+    parts = [customer.address.strip()]
+    if customer.city_id:
+        parts.append(customer.city.name)
+    return ', '.join(part for part in parts if part)
+
+
+def pending_customers():
+    """Customers with an address and no coordinates that were not tried recently"""
+    retry_before = timezone.now() - timedelta(days=getattr(settings, 'GEOCODING_RETRY_DAYS', 7))
+    return Customer.objects.filter(latitude__isnull=True, active=True).exclude(address='').filter(
+        Q(geocoded_at__isnull=True) | Q(geocoded_at__lt=retry_before)
+    )
+
+
+def geocode_customer(customer):
+    """Look up and store the customer's coordinates; True when found"""
+    location = geocode(customer_query(customer))
+    now = timezone.now()
+    values = {'geocoded_at': now, 'updated_at': now}
+    if location is not None:
+        values.update(latitude=round(location[0], 6), longitude=round(location[1], 6))
+    # A plain update: nothing else about the customer changed. The bumped
+    # updated_at is what the customer location index syncs on.
+    Customer.objects.filter(pk=customer.pk, latitude__isnull=True).update(**values)
+    return location is not None
+
+
+def geocode_pending(limit=None):
+    """Geocode up to ``limit`` pending customers; returns (found, tried)"""
+    if not getattr(settings, 'GEOCODING_ENABLED', False):
+        return 0, 0
+    limit = limit or getattr(settings, 'GEOCODING_BATCH_SIZE', 200)
+    found = tried = 0
+    for customer in pending_customers().select_related('city').order_by('id')[:limit]:
+        try:
+            found += geocode_customer(customer)
+        except requests.RequestException as e:
+            # The provider is unavailable; the next run picks the rest up
+            logger.warning("Geocoding stopped at customer %s: %s", customer.id, e)
+            break
+        tried += 1
+    return found, tried
+
+
+def queue_geocoding():
+    """Schedule one debounced geocoding run"""
+    delay = getattr(settings, 'GEOCODING_DELAY', 10)
+    if not getattr(settings, 'GEOCODING_ENABLED', False) or not cache.add('geocoding:scheduled', 1, delay):
+        return
+    try:
+        from api.tasks import geocode_customers
+        geocode_customers.apply_async(countdown=delay, retry=False)
+    except Exception as e:
+        # The periodic beat run geocodes the customers if the broker is unavailable
+        logger.warning("Could not schedule customer geocoding: %s", e)
@@ -0,0 +1,55 @@
+"""
+Department level GPS attendance summaries for the GPS dashboards.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main_app.models import Department, GPSCheckIn
+
+
+def _employees_per_department(checkins):
+    """Correlated subquery: distinct employees of the outer department among ``checkins``"""
+    return Coalesce(Subquery(
+        checkins.filter(employee__department=OuterRef('pk')).order_by()
+        .values('employee__department').annotate(count=Count('employee', distinct=True)).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def department_attendance_summary(day=None, division=None, department_ids=None):
+    """
+    Employee, checked-in and active (not yet checked out) counts for every
+    department from one query. Check-ins are counted in subqueries limited
+    to the day, so history never joins in. ``division`` restricts both the
+    departments and the employees counted; ``department_ids`` limits the rows.
+    """
+    day = day or timezone.localdate()
+    employees = Q()
+    checkins = GPSCheckIn.objects.for_day(day)
+    departments = Department.objects.all()
+    if division is not None:
+        departments = departments.filter(division=division)
+        employees = Q(employee__division=division)
+        checkins = checkins.filter(employee__division=division)
+    if department_ids is not None:
+        departments = departments.filter(id__in=department_ids)
+
+    departments = departments.annotate(
+        employee_count=Count('employee', filter=employees, distinct=True),
+        checked_in_count=_employees_per_department(checkins),
+        active_count=_employees_per_department(checkins.filter(check_out_time__isnull=True)),
+    ).select_related('division').order_by('id')
+
+    return [
+        {
+            'department': department,
+            'employee_count': department.employee_count,
+            'checked_in_count': department.checked_in_count,
+            'active_count': department.active_count,
+            'checked_in_percentage': round(
+                department.checked_in_count / department.employee_count * 100, 1
+            ) if department.employee_count else 0,
+        }
+        for department in departments
+    ]
@@ -0,0 +1,124 @@
+"""
+Ingest filter for GPS fixes: keeps only points worth storing.
+
+A fix is dropped when
+
+* ``malformed``: its coordinates or numeric fields cannot be parsed
+  (counted by services.gps_ingest, which never passes it here);
+* ``duplicate``: the same (device, client timestamp) was seen before, e.g.
+  a retry after a lost response (remembered for GPS_IDEMPOTENCY_TTL);
+* ``inaccurate``: its reported accuracy is worse than GPS_MAX_ACCURACY_M;
+* ``stale``: it is not newer than the last point kept for the employee;
+* ``stationary``: it is within GPS_MIN_DISPLACEMENT_M of the last kept
+  point and less than GPS_MIN_INTERVAL_S after it, with the same status.
+  A device that does not move is therefore still stored once per interval.
+
+The last kept point per employee lives in the shared cache, so every web
+process filters against the same state.
+"""
+import hashlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from main_app.gps_utils import calculate_distance
+
+DROP_REASONS = ('malformed', 'duplicate', 'inaccurate', 'stale', 'stationary')
+
+
+def _state_key(employee_id):
+    return f"gps:filter:{employee_id}"
+
+
+def client_timestamp(data, now=None):
+    """
+    The device's timestamp of a fix (ISO 8601 or epoch seconds / milliseconds)
+    as an aware UTC datetime, or None when missing, unparseable or implausible.
+    """
+    value = data.get('client_timestamp') or data.get('timestamp')
+    if value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        try:
+            moment = parse_datetime(str(value))
+        except ValueError:
+            # Well formed but not a real date
+            return None
+        if moment is not None and timezone.is_naive(moment):
+            moment = timezone.make_aware(moment, dt_timezone.utc)
+    else:
+        moment = datetime.fromtimestamp(number / 1000 if number > 1e11 else number, tz=dt_timezone.utc)
+    if moment is None:
+        return None
+    now = now or timezone.now()
+    skew = timedelta(seconds=getattr(settings, 'GPS_MAX_CLIENT_SKEW_S', 300))
+    max_age = timedelta(days=getattr(settings, 'GPS_MAX_FIX_AGE_DAYS', 7))
+    if moment > now + skew or moment < now - max_age:
+        return None
+    # The device's UTC offset must not change how fixes sort or their ingest id
+    return moment.astimezone(dt_timezone.utc)
+
+
+def fix_ingest_id(employee_id, device_id, client_ts):
+    """Stable id of a fix from its device and client timestamp; doubles as the GPSTrack.ingest_id"""
+    raw = f"{employee_id}|{device_id}|{client_ts.isoformat()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class IngestFilter:
+    """Filters the fixes of one employee; call ``check`` per fix in time order, then ``save``"""
+
+    def __init__(self, employee_id):
+        self.employee_id = employee_id
+        self.state = cache.get(_state_key(employee_id))
+        self.dropped = Counter()
+        self._changed = False
+
+    def _reason(self, fix, timestamp):
+        if fix.get('client_timestamp') and not cache.add(
+            f"gps:seen:{fix['ingest_id']}", 1, getattr(settings, 'GPS_IDEMPOTENCY_TTL', 86400)
+        ):
+            return 'duplicate'
+        accuracy = fix.get('accuracy') or 0
+        if accuracy > getattr(settings, 'GPS_MAX_ACCURACY_M', 100):
+            return 'inaccurate'
+        if self.state is None:
+            return None
+        last_latitude, last_longitude, last_timestamp, last_status = self.state
+        if timestamp <= last_timestamp:
+            return 'stale'
+        if fix['status'] != last_status:
+            return None
+        moved = calculate_distance(last_latitude, last_longitude, fix['latitude'], fix['longitude'])
+        elapsed = (timestamp - last_timestamp).total_seconds()
+        if moved < getattr(settings, 'GPS_MIN_DISPLACEMENT_M', 15) and elapsed < getattr(settings, 'GPS_MIN_INTERVAL_S', 60):
+            return 'stationary'
+        return None
+
+    def check(self, fix, timestamp):
+        """True to keep ``fix``; otherwise the drop is counted in ``dropped``"""
+        reason = self._reason(fix, timestamp)
+        if reason:
+            self.dropped[reason] += 1
+            return False
+        self.state = (fix['latitude'], fix['longitude'], timestamp, fix['status'])
+        self._changed = True
+        return True
+
+    def forget(self, fix):
+        """Undo the idempotency mark of a fix that could not be buffered, so its retry is accepted"""
+        if fix.get('client_timestamp'):
+            cache.delete(f"gps:seen:{fix['ingest_id']}")
+
+    def save(self):
+        if self._changed:
+            cache.set(_state_key(self.employee_id), self.state, getattr(settings, 'GPS_FILTER_STATE_TTL', 43200))
+
+    def drop_counts(self):
+        return {reason: self.dropped[reason] for reason in DROP_REASONS}
@@ -0,0 +1,446 @@
+"""
+Write-behind ingest for high-frequency GPS fixes.
+
+``ingest_fixes`` validates location pings, drops the ones not worth storing
+(services.gps_filter), smooths the rest and flags outliers among them
+(services.track_cleaning), appends them to the ingest buffer and returns
+straight away; nothing is written to the database on the request path.
+``GPSBufferFlusher`` takes fixes off the buffer every
+GPS_BUFFER_FLUSH_MS milliseconds or GPS_BUFFER_BATCH_SIZE fixes, whichever
+comes first, and writes them with one ``bulk_create`` plus the matching
+UserStatus and latest-position updates.
+
+Two buffers are available:
+
+* ``RedisStreamBuffer`` (the default, on GPS_BUFFER_REDIS_URL): a Redis stream read
+  through a consumer group. Fixes are acknowledged only after their rows
+  are committed, and fixes left unacknowledged by a crashed flusher are
+  claimed again after GPS_BUFFER_CLAIM_IDLE_MS. Every fix carries an
+  ``ingest_id`` that is unique on GPSTrack, so replaying them never
+  duplicates rows. Run ``manage.py flush_gps_buffer`` as a long-lived
+  process; the ``flush_gps_buffer`` beat task is a safety net.
+* ``MemoryBuffer`` (GPS_BUFFER=memory, for development): a per-process
+  queue flushed by a background thread. Fixes still buffered when the
+  process dies are lost although the device was told they were received,
+  so a warning is logged when it is used without DEBUG.
+
+When GPS_BUFFER_MAX_PENDING fixes are waiting, ``append`` raises BufferFull
+and the endpoint answers 503 so devices back off and retry.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from main_app.cache_utils import get_or_compute
+from main_app.gps_utils import calculate_distance, get_address_from_coordinates, remember_positions
+from main_app.models import Employee, EmployeeGeofence, GPSCheckIn, GPSTrack, UserStatus
+from services.gps_filter import IngestFilter, client_timestamp, fix_ingest_id
+from services.dwell import observe_fixes
+from services.track_cleaning import StreamingCleaner
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAMESPACE = 'gps_ingest'
+
+
+class BufferFull(Exception):
+    """The ingest buffer holds GPS_BUFFER_MAX_PENDING fixes; the client should retry later"""
+
+
+def _max_pending():
+    return getattr(settings, 'GPS_BUFFER_MAX_PENDING', 50000)
+
+
+class MemoryBuffer:
+    """In-process buffer; claimed fixes go back to the front of the queue when a flush fails"""
+
+    def __init__(self):
+        self._fixes = deque()
+        self._ready = threading.Condition()
+        self._flusher = None
+
+    def append(self, fix):
+        with self._ready:
+            if len(self._fixes) >= _max_pending():
+                raise BufferFull()
+            self._fixes.append((fix['ingest_id'], fix))
+            self._ready.notify()
+        self._ensure_flusher()
+
+    def pending_count(self):
+        return len(self._fixes)
+
+    def claim(self, consumer, count, block_ms=0):
+        with self._ready:
+            if not self._fixes and block_ms:
+                self._ready.wait(block_ms / 1000)
+            return [self._fixes.popleft() for _ in range(min(count, len(self._fixes)))]
+
+    def ack(self, entry_ids):
+        pass
+
+    def release(self, entries):
+        with self._ready:
+            self._fixes.extendleft(reversed(entries))
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._ready:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(
+                    target=GPSBufferFlusher(self).run_forever, name='gps-buffer-flusher', daemon=True
+                )
+                self._flusher.start()
+
+
+class RedisStreamBuffer:
+    """Redis stream plus consumer group; see the module docstring for the delivery guarantees"""
+
+    def __init__(self, url, stream='gps:fixes', group='gps-flushers'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.stream = stream
+        self.group = group
+        self._group_ready = False
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        import redis
+
+        try:
+            self.client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def append(self, fix):
+        if self.client.xlen(self.stream) >= _max_pending():
+            raise BufferFull()
+        self.client.xadd(self.stream, {'fix': json.dumps(fix)})
+
+    def pending_count(self):
+        # Entries are deleted once acknowledged, so the length is what still needs writing
+        return self.client.xlen(self.stream)
+
+    def claim(self, consumer, count, block_ms=0):
+        self._ensure_group()
+        # Fixes a crashed flusher claimed but never acknowledged come first
+        reclaimed = self.client.xautoclaim(
+            self.stream, self.group, consumer,
+            min_idle_time=getattr(settings, 'GPS_BUFFER_CLAIM_IDLE_MS', 30000), start_id='0-0', count=count,
+        )[1]
+        entries = [entry for entry in reclaimed if entry[1]]
+        if not entries:
+            response = self.client.xreadgroup(
+                self.group, consumer, {self.stream: '>'}, count=count, block=block_ms or None
+            )
+            entries = response[0][1] if response else []
+        return [(entry_id, json.loads(fields[b'fix'])) for entry_id, fields in entries]
+
+    def ack(self, entry_ids):
+        if entry_ids:
+            pipe = self.client.pipeline()
+            pipe.xack(self.stream, self.group, *entry_ids)
+            pipe.xdel(self.stream, *entry_ids)
+            pipe.execute()
+
+    def release(self, entries):
+        # Unacknowledged entries stay pending and are claimed again after the idle time
+        pass
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def gps_buffer():
+    """The process-wide ingest buffer"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                url = getattr(settings, 'GPS_BUFFER_REDIS_URL', '')
+                if getattr(settings, 'GPS_BUFFER', 'redis') == 'memory' or not url:
+                    if not settings.DEBUG:
+                        logger.warning("GPS fixes are buffered in process memory and are lost on restart; "
+                                       "use the Redis buffer in production")
+                    _buffer = MemoryBuffer()
+                else:
+                    _buffer = RedisStreamBuffer(url)
+    return _buffer
+
+
+def ingest_context(user_id, day):
+    """
+    What the request path needs to know about a user's employee for ``day``,
+    cached until an employee, check-in or geofence changes. None when the
+    user has no employee profile.
+    """
+    def compute():
+        employee = Employee.objects.filter(admin_id=user_id).values('id', 'department_id').first()
+        if employee is None:
+            return None
+        checked_in = GPSCheckIn.objects.for_day(day).filter(
+            employee_id=employee['id'], check_out_time__isnull=True
+        ).exists()
+        geofences = list(EmployeeGeofence.objects.filter(
+            department_id=employee['department_id'], is_active=True
+        ).values_list('name', 'center_latitude', 'center_longitude', 'radius_meters'))
+        return {
+            'employee_id': employee['id'],
+            'checked_in': checked_in,
+            'geofences': [(name, float(lat), float(lng), radius) for name, lat, lng, radius in geofences],
+        }
+
+    return get_or_compute(
+        CACHE_NAMESPACE, (user_id, day.isoformat()), compute, getattr(settings, 'GPS_INGEST_CONTEXT_TTL', 300)
+    )
+
+
+def parse_fix(data):
+    """Numeric fields of a location ping; raises ValueError / TypeError on bad input"""
+    return {
+        'latitude': float(data.get('latitude')),
+        'longitude': float(data.get('longitude')),
+        'accuracy': float(data.get('accuracy', 0)),
+        'speed': float(data.get('speed', 0)),
+        'battery': int(data.get('battery', 100)),
+        'heading': float(data.get('heading', 0)),
+    }
+
+
+def geofence_alerts(context, latitude, longitude):
+    alerts = []
+    for name, center_latitude, center_longitude, radius_meters in context['geofences']:
+        distance = calculate_distance(latitude, longitude, center_latitude, center_longitude)
+        if distance > radius_meters:
+            alerts.append({
+                'type': 'outside_geofence',
+                'message': f'Employee is {distance:.0f}m outside {name}',
+                'geofence': name,
+                'distance': distance,
+            })
+    return alerts
+
+
+def build_fix(context, user, data, device_id, now):
+    """A buffered fix from one ping; raises ValueError / TypeError for malformed coordinates"""
+    fields = parse_fix(data)
+    client_ts = client_timestamp(data, now)
+    if client_ts is not None:
+        ingest_id = fix_ingest_id(context['employee_id'], device_id, client_ts)
+    else:
+        ingest_id = uuid.uuid4().hex
+    return {
+        'ingest_id': ingest_id,
+        'employee_id': context['employee_id'],
+        'user_id': user.id,
+        'timestamp': (client_ts or now).isoformat(),
+        'client_timestamp': client_ts is not None,
+        'status': 'WORKING' if context['checked_in'] else 'CHECKED_OUT',
+        'address': get_address_from_coordinates(fields['latitude'], fields['longitude']),
+        **fields,
+    }
+
+
+def ingest_fixes(user, items, device_id=''):
+    """
+    Filter and buffer the location pings of ``user`` (one request may carry an
+    offline batch). Returns a dict with the parsed ``fixes`` in time order,
+    the ones ``kept``, the number ``dropped`` per reason (see
+    services.gps_filter) and geofence ``alerts`` for the newest usable fix.
+    Malformed pings are dropped and counted, so one bad fix does not make
+    the device retry its whole batch forever. Raises Employee.DoesNotExist,
+    BufferFull, or ValueError when no ping could be parsed.
+    """
+    now = timezone.now()
+    context = ingest_context(user.id, timezone.localdate(now))
+    if context is None:
+        raise Employee.DoesNotExist('No Employee matches the given query.')
+    fixes = []
+    malformed = 0
+    for data in items:
+        try:
+            fixes.append(build_fix(context, user, data, device_id, now))
+        except (AttributeError, TypeError, ValueError):
+            malformed += 1
+    if not fixes:
+        raise ValueError('Invalid coordinate format')
+    fixes.sort(key=lambda fix: parse_datetime(fix['timestamp']))
+
+    ingest_filter = IngestFilter(context['employee_id'])
+    ingest_filter.dropped['malformed'] = malformed
+    cleaner = StreamingCleaner(context['employee_id'])
+    kept = []
+    try:
+        for fix in fixes:
+            timestamp = parse_datetime(fix['timestamp'])
+            previous_state, previous_track = ingest_filter.state, cleaner.state
+            if not ingest_filter.check(fix, timestamp):
+                continue
+            # Outliers are stored too, flagged, so that history shows what was rejected
+            cleaner.update(fix, timestamp)
+            try:
+                gps_buffer().append(fix)
+            except BufferFull:
+                # Not stored: let the device's retry of this fix through
+                ingest_filter.state, cleaner.state = previous_state, previous_track
+                ingest_filter.forget(fix)
+                raise
+            kept.append(fix)
+    finally:
+        ingest_filter.save()
+        cleaner.save()
+
+    usable = [fix for fix in fixes if fix['accuracy'] <= getattr(settings, 'GPS_MAX_ACCURACY_M', 100)
+              and not fix.get('is_outlier')]
+    alerts = []
+    if usable and context['checked_in']:
+        alerts = geofence_alerts(context, usable[-1]['latitude'], usable[-1]['longitude'])
+    return {'fixes': fixes, 'kept': kept, 'dropped': ingest_filter.drop_counts(), 'alerts': alerts}
+
+
+def _track(fix):
+    return GPSTrack(
+        ingest_id=fix['ingest_id'],
+        employee_id=fix['employee_id'],
+        latitude=round(fix['latitude'], 6),
+        longitude=round(fix['longitude'], 6),
+        accuracy=fix['accuracy'],
+        speed=fix['speed'],
+        heading=fix['heading'],
+        battery_level=fix['battery'],
+        status=fix['status'],
+        address=fix['address'],
+        timestamp=parse_datetime(fix['timestamp']),
+        smoothed_latitude=fix.get('smoothed_latitude'),
+        smoothed_longitude=fix.get('smoothed_longitude'),
+        is_outlier=fix.get('is_outlier', False),
+    )
+
+
+def write_fixes(fixes):
+    """Store buffered fixes: GPSTrack rows, UserStatus, the cached latest positions and stops"""
+    tracks = [_track(fix) for fix in fixes]
+    # The newest fix of each user decides their status
+    statuses = {}
+    for fix, track in zip(fixes, tracks):
+        current = statuses.get(fix['user_id'])
+        if current is None or track.timestamp >= current[0]:
+            statuses[fix['user_id']] = (track.timestamp, fix['status'] == 'WORKING')
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Replayed fixes hit the unique ingest_id and are skipped
+        GPSTrack.objects.bulk_create(tracks, batch_size=1000, ignore_conflicts=True)
+        existing = set(UserStatus.objects.filter(user_id__in=statuses).values_list('user_id', flat=True))
+        for checked_in in (True, False):
+            user_ids = [user_id for user_id, (_, flag) in statuses.items() if flag == checked_in and user_id in existing]
+            if user_ids:
+                UserStatus.objects.filter(user_id__in=user_ids).update(
+                    status_type='online', is_checked_in=checked_in, last_activity=now
+                )
+        UserStatus.objects.bulk_create([
+            UserStatus(user_id=user_id, status_type='online', is_checked_in=checked_in)
+            for user_id, (_, checked_in) in statuses.items() if user_id not in existing
+        ], ignore_conflicts=True)
+    remember_positions(tracks)
+    try:
+        observe_fixes(fixes)
+    except Exception:
+        # Stops are rebuilt from the stored track by the clean_gps_tracks run
+        logger.exception("Stop detection failed for a batch of %d GPS fixes", len(fixes))
+    return len(tracks)
+
+
+# Errors caused by the content of a fix rather than by the database being unavailable
+_BAD_FIX_ERRORS = (IntegrityError, DataError, KeyError, TypeError, ValueError)
+
+
+class GPSBufferFlusher:
+    """Moves fixes from the ingest buffer to the database in batches"""
+
+    def __init__(self, buffer=None, batch_size=None, flush_ms=None, consumer=None):
+        self.buffer = buffer or gps_buffer()
+        self.batch_size = batch_size or getattr(settings, 'GPS_BUFFER_BATCH_SIZE', 500)
+        self.flush_ms = flush_ms or getattr(settings, 'GPS_BUFFER_FLUSH_MS', 500)
+        self.consumer = consumer or f"{socket.gethostname()}:{os.getpid()}"
+
+    def collect(self, wait=True):
+        """Up to batch_size fixes, waiting at most flush_ms for the batch to fill"""
+        entries = []
+        deadline = time.monotonic() + self.flush_ms / 1000
+        while len(entries) < self.batch_size:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if wait and remaining_ms <= 0:
+                break
+            claimed = self.buffer.claim(self.consumer, self.batch_size - len(entries),
+                                        max(remaining_ms, 1) if wait else 0)
+            if not claimed:
+                break
+            entries.extend(claimed)
+        return entries
+
+    def flush_once(self, wait=True):
+        """Write one batch; returns the number of fixes taken off the buffer"""
+        entries = self.collect(wait)
+        if not entries:
+            return 0
+        try:
+            write_fixes([fix for _, fix in entries])
+        except _BAD_FIX_ERRORS:
+            # One malformed fix must not block the whole batch forever
+            self._write_one_by_one(entries)
+            return len(entries)
+        except Exception:
+            self.buffer.release(entries)
+            raise
+        self.buffer.ack([entry_id for entry_id, _ in entries])
+        return len(entries)
+
+    def _write_one_by_one(self, entries):
+        for position, (entry_id, fix) in enumerate(entries):
+            try:
+                write_fixes([fix])
+            except _BAD_FIX_ERRORS as e:
+                logger.warning("Dropping GPS fix %s: %s", fix.get('ingest_id'), e)
+            except Exception:
+                self.buffer.release(entries[position:])
+                raise
+            self.buffer.ack([entry_id])
+
+    def drain(self, max_batches=None):
+        """Flush without waiting until the buffer is empty; returns the number of fixes written"""
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            flushed = self.flush_once(wait=False)
+            if not flushed:
+                break
+            total += flushed
+            batches += 1
+        return total
+
+    def run_forever(self):
+        while True:
+            try:
+                self.flush_once()
+            except Exception:
+                logger.exception("GPS buffer flush failed; retrying")
+                time.sleep(self.flush_ms / 1000)
+            finally:
+                close_old_connections()
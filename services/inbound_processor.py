@@ -0,0 +1,211 @@
+"""
+Durable ingest path for inbound WhatsApp / email webhooks.
+
+Webhooks only append the raw payload to the InboundMessage inbox and return;
+InboundMessageProcessor drains the inbox in batches, matches senders to
+customers and writes communication logs and notifications in bulk.
+"""
+import logging
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DataError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from main_app.models import (
+    CommunicationLog, ContactIdentity, Customer, InboundMessage, Notification
+)
+from services.contact_resolver import lookup_identity
+
+logger = logging.getLogger(__name__)
+
+# Keys providers use for their message ids (Twilio, mail relays)
+PROVIDER_ID_KEYS = ('MessageSid', 'SmsMessageSid', 'message_id', 'Message-Id')
+DRAIN_KICK_KEY = 'inbound:drain-scheduled'
+# Errors caused by one message's data; anything else (e.g. a lost connection) fails the batch
+_BAD_MESSAGE_ERRORS = (IntegrityError, DataError, KeyError, TypeError, ValueError)
+
+
+def _payload_dict(data):
+    if hasattr(data, 'dict'):  # QueryDict from form-encoded providers
+        return data.dict()
+    if isinstance(data, Mapping):
+        return dict(data)
+    if data is None:
+        return {}
+    # A JSON array or scalar body is kept as is rather than rejected after delivery
+    return {'raw': data}
+
+
+def _provider_message_id(payload):
+    for key in PROVIDER_ID_KEYS:
+        value = payload.get(key)
+        if value:
+            return str(value)[:255]
+    return ''
+
+
+def enqueue_inbound(channel, data):
+    """
+    Append a webhook payload to the inbox. Redeliveries of a message id that
+    is already stored are dropped by the unique constraint.
+    """
+    payload = _payload_dict(data)
+    InboundMessage.objects.bulk_create([
+        InboundMessage(channel=channel, provider_message_id=_provider_message_id(payload), payload=payload)
+    ], ignore_conflicts=True)
+    _kick_worker()
+
+
+def _kick_worker():
+    """Schedule one drain per burst instead of one task per message"""
+    if not cache.add(DRAIN_KICK_KEY, 1, getattr(settings, 'INBOUND_DRAIN_DELAY', 2)):
+        return
+    try:
+        from api.tasks import process_whatsapp_messages
+        process_whatsapp_messages.apply_async(
+            countdown=getattr(settings, 'INBOUND_DRAIN_DELAY', 2), retry=False
+        )
+    except Exception as e:
+        # The periodic beat drain picks the message up if the broker is unavailable
+        logger.warning("Could not schedule inbound drain: %s", e)
+
+
+def parse_inbound(message):
+    """Normalize a stored payload into sender / subject / body fields"""
+    payload = message.payload
+    if message.channel == 'WHATSAPP':
+        return {
+            'from': payload.get('from') or payload.get('From') or payload.get('phone'),
+            'to': payload.get('to') or payload.get('To'),
+            'subject': 'WhatsApp Message',
+            'body': payload.get('body') or payload.get('Body') or '',
+        }
+    return {
+        'from': payload.get('from') or payload.get('sender'),
+        'to': payload.get('to'),
+        'subject': payload.get('subject', ''),
+        'body': payload.get('body', ''),
+    }
+
+
+class InboundMessageProcessor:
+    """Drains pending InboundMessage rows in batches"""
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'INBOUND_BATCH_SIZE', 500)
+
+    def drain(self, max_batches=None):
+        """Process batches until the inbox is empty; returns the number of messages handled"""
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            handled = self.process_batch()
+            if not handled:
+                break
+            total += handled
+            batches += 1
+        return total
+
+    def process_batch(self):
+        with transaction.atomic():
+            pending = InboundMessage.objects.filter(status='PENDING').order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                # Lets several workers drain concurrently without double processing
+                pending = pending.select_for_update(skip_locked=True)
+            messages = list(pending[:self.batch_size])
+            if not messages:
+                return 0
+
+            parsed = {}
+            failed = []
+            for message in messages:
+                try:
+                    parsed[message.id] = parse_inbound(message)
+                except Exception as e:
+                    message.status = 'FAILED'
+                    message.error = str(e)
+                    message.attempts += 1
+                    failed.append(message)
+
+            customers = self._match_customers(messages, parsed)
+            now = timezone.now()
+            sources = {
+                message.id: (message, parsed[message.id], customers.get(message.id))
+                for message in messages if message.id in parsed
+            }
+            try:
+                with transaction.atomic():
+                    self._write(sources.values(), now)
+            except Exception as e:
+                # Find the message(s) at fault instead of blocking the inbox with the whole batch
+                logger.warning("Inbound batch write failed, writing message by message: %s", e)
+                failed.extend(self._write_one_by_one(sources.values(), now))
+
+            if failed:
+                InboundMessage.objects.bulk_update(failed, ['status', 'error', 'attempts'])
+            written = set(sources) - {message.id for message in failed}
+            InboundMessage.objects.filter(id__in=written).update(
+                status='PROCESSED', processed_at=now, attempts=F('attempts') + 1
+            )
+        return len(messages)
+
+    @staticmethod
+    def _write(sources, now):
+        """Bulk write the communication logs and notifications of (message, fields, customer) triples"""
+        logs = []
+        notifications = []
+        for message, fields, customer in sources:
+            logs.append(CommunicationLog(
+                channel=message.channel,
+                direction='IN',
+                customer=customer,
+                user=None,
+                subject=(fields['subject'] or '')[:255],
+                body=fields['body'] or '',
+                linkages={'from': fields['from'], 'to': fields['to'], 'inbound_message_id': message.id},
+            ))
+            if message.channel == 'WHATSAPP' and customer and customer.owner_staff:
+                notifications.append(Notification(
+                    user=customer.owner_staff.admin,
+                    channel='PUSH',
+                    title='New WhatsApp message',
+                    message=f"Incoming WhatsApp from {fields['from']} for customer {customer.name}",
+                    sent_at=now,
+                ))
+        CommunicationLog.objects.bulk_create(logs)
+        Notification.objects.bulk_create(notifications)
+
+    def _write_one_by_one(self, sources, now):
+        """Write each message in its own savepoint; returns the messages that failed"""
+        failed = []
+        for message, fields, customer in sources:
+            try:
+                with transaction.atomic():
+                    self._write([(message, fields, customer)], now)
+            except _BAD_MESSAGE_ERRORS as e:
+                logger.warning("Inbound message %s failed: %s", message.id, e)
+                message.status = 'FAILED'
+                message.error = str(e)
+                message.attempts += 1
+                failed.append(message)
+        return failed
+
+    def _match_customers(self, messages, parsed):
+        """Resolve senders to customers with cached identity lookups and one customer query"""
+        customer_ids = {}
+        for message in messages:
+            fields = parsed.get(message.id)
+            if not fields or not fields['from']:
+                continue
+            if message.channel == 'WHATSAPP':
+                customer_id, _ = lookup_identity('PHONE', ContactIdentity.normalize_phone(fields['from']))
+            else:
+                customer_id, _ = lookup_identity('EMAIL', ContactIdentity.normalize_email(fields['from']))
+            if customer_id:
+                customer_ids[message.id] = customer_id
+
+        found = Customer.objects.select_related('owner_staff__admin').in_bulk(set(customer_ids.values()))
+        return {message_id: found.get(customer_id) for message_id, customer_id in customer_ids.items()}
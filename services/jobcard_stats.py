@@ -0,0 +1,66 @@
+"""
+Job card dashboard statistics.
+
+All status, priority and overdue buckets for a scope are computed in a single
+conditional-aggregate query and cached briefly per scope. Any job card write
+bumps the cache namespace (see main_app.models).
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from main_app.cache_utils import get_or_compute
+from main_app.models import JobCard
+
+CACHE_NAMESPACE = 'jobcard_stats'
+OPEN_STATUSES = ('PENDING', 'IN_PROGRESS')
+
+
+def compute_job_card_stats(queryset):
+    """One query: totals plus a count per status, per priority and overdue"""
+    aggregates = {
+        'total': Count('id'),
+        'active': Count('id', filter=Q(status__in=OPEN_STATUSES)),
+        'overdue': Count('id', filter=Q(status__in=OPEN_STATUSES, due_date__lt=timezone.now())),
+    }
+    for status, _ in JobCard.STATUS_CHOICES:
+        aggregates[f'status_{status}'] = Count('id', filter=Q(status=status))
+    for priority, _ in JobCard.PRIORITY_CHOICES:
+        aggregates[f'priority_{priority}'] = Count('id', filter=Q(priority=priority))
+
+    row = queryset.order_by().aggregate(**aggregates)
+    return {
+        'total': row['total'],
+        'active': row['active'],
+        'completed': row['status_COMPLETED'],
+        'overdue': row['overdue'],
+        'by_status': {status: row[f'status_{status}'] for status, _ in JobCard.STATUS_CHOICES},
+        'by_priority': {priority: row[f'priority_{priority}'] for priority, _ in JobCard.PRIORITY_CHOICES},
+    }
+
+
+def get_job_card_stats(scope, queryset):
+    """
+    Cached stats for a scope key (e.g. 'all', 'employee:12'); ``queryset`` must
+    be the unfiltered job cards of that scope
+    """
+    return get_or_compute(
+        CACHE_NAMESPACE, (scope,), lambda: compute_job_card_stats(queryset),
+        getattr(settings, 'JOBCARD_STATS_CACHE_TTL', 60),
+    )
+
+
+def admin_job_card_stats():
+    return get_job_card_stats('all', JobCard.objects.all())
+
+
+def manager_job_card_stats(user, manager):
+    """Job cards the manager assigned or that belong to their division"""
+    queryset = JobCard.objects.filter(
+        Q(assigned_by=user) | Q(assigned_to__division=manager.division)
+    )
+    return get_job_card_stats(f'manager:{user.id}:{manager.division_id}', queryset)
+
+
+def employee_job_card_stats(employee):
+    return get_job_card_stats(f'employee:{employee.id}', JobCard.objects.filter(assigned_to=employee))
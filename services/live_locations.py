@@ -0,0 +1,60 @@
+"""
+Latest known position per employee for the live GPS endpoints.
+
+Every new GPSTrack is written to the cache as its employee's latest position
+(see ``remember_latest_track`` in main_app.models). Readers take positions
+from there and fall back to GPSTrack, in one query for any number of
+employees, only for employees with nothing cached. The functions here are
+async and meant for the ASGI views in main_app.gps_views.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from main_app.gps_utils import latest_position_key, track_position
+from main_app.models import Employee, GPSCheckIn, GPSTrack
+
+
+async def alatest_positions(employee_ids):
+    """{employee_id: position} for the given employees; employees without any track are left out"""
+    employee_ids = list(employee_ids)
+    if not employee_ids:
+        return {}
+    cached = await cache.aget_many([latest_position_key(employee_id) for employee_id in employee_ids])
+    positions = {}
+    missing = []
+    for employee_id in employee_ids:
+        position = cached.get(latest_position_key(employee_id))
+        if position is None:
+            missing.append(employee_id)
+        else:
+            positions[employee_id] = position
+
+    if missing:
+        newest = GPSTrack.objects.filter(employee_id=OuterRef('pk'), is_outlier=False).order_by('-timestamp', '-id').values('id')[:1]
+        latest_ids = Employee.objects.filter(id__in=missing).values(track_id=Subquery(newest))
+        found = {}
+        async for track in GPSTrack.objects.filter(id__in=latest_ids):
+            found[track.employee_id] = track_position(track)
+        if found:
+            await cache.aset_many(
+                {latest_position_key(employee_id): position for employee_id, position in found.items()},
+                getattr(settings, 'LIVE_LOCATION_CACHE_TTL', 900),
+            )
+        positions.update(found)
+    return positions
+
+
+async def alatest_position(employee_id):
+    return (await alatest_positions([employee_id])).get(employee_id)
+
+
+def active_checkins(day):
+    """Today's open check-ins (not checked out yet)"""
+    return GPSCheckIn.objects.for_day(day).filter(check_out_time__isnull=True)
+
+
+async def achecked_in_employee_ids(day, employees):
+    """Ids of ``employees`` (a queryset) with an open check-in on ``day``"""
+    queryset = active_checkins(day).filter(employee__in=employees).values_list('employee_id', flat=True)
+    return {employee_id async for employee_id in queryset}
@@ -0,0 +1,19 @@
+"""
+Reference data for dropdowns and lookups, served from the two-tier cache.
+The namespace is bumped whenever a City or Item changes (see main_app.models).
+"""
+from main_app.cache_utils import cached
+from main_app.models import City, Item
+
+CACHE_NAMESPACE = 'reference_data'
+REFERENCE_TTL = 60 * 60
+
+
+@cached(CACHE_NAMESPACE, timeout=REFERENCE_TTL)
+def cities():
+    return list(City.objects.order_by('name'))
+
+
+@cached(CACHE_NAMESPACE, timeout=REFERENCE_TTL)
+def items():
+    return list(Item.objects.order_by('name'))
@@ -0,0 +1,85 @@
+"""
+In-memory spatial index for radius and nearest-point queries.
+
+Points are bucketed into a fixed grid of ``cell_m`` metre rows of latitude
+and equal-angle columns of longitude. A query measures only the points in
+the cells its radius overlaps, so lookups stay fast however many points are
+indexed. Points can be added, moved and removed one at a time.
+"""
+import math
+from collections import defaultdict
+
+EARTH_RADIUS_M = 6371000.0
+_DEGREE_M = math.pi / 180 * EARTH_RADIUS_M
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class GridIndex:
+    """Points by key; ``within`` and ``nearest`` return (distance_m, key, item) sorted by distance"""
+
+    def __init__(self, cell_m=500):
+        self.cell_m = cell_m
+        self._cell_deg = cell_m / _DEGREE_M
+        self._cells = defaultdict(dict)  # (row, column) -> {key: (lat, lng, item)}
+        self._where = {}  # key -> (row, column)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self._cell_deg), math.floor(lng / self._cell_deg)
+
+    def add(self, key, lat, lng, item=None):
+        """Index (or move) ``key`` at the given coordinates"""
+        self.remove(key)
+        cell = self._cell(float(lat), float(lng))
+        self._cells[cell][key] = (float(lat), float(lng), item)
+        self._where[key] = cell
+
+    def remove(self, key):
+        cell = self._where.pop(key, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def within(self, lat, lng, radius_m):
+        lat, lng = float(lat), float(lng)
+        rows = math.ceil(radius_m / self.cell_m)
+        # Columns are narrowest at the edge of the search area furthest from the equator
+        edge = min(abs(lat) + rows * self._cell_deg, 89.0)
+        columns = min(math.ceil(radius_m / (self.cell_m * math.cos(math.radians(edge)))),
+                      math.ceil(180 / self._cell_deg))
+        row, column = self._cell(lat, lng)
+        found = []
+        for r in range(row - rows, row + rows + 1):
+            for c in range(column - columns, column + columns + 1):
+                bucket = self._cells.get((r, c))
+                if not bucket:
+                    continue
+                for key, (point_lat, point_lng, item) in bucket.items():
+                    distance = haversine_m(lat, lng, point_lat, point_lng)
+                    if distance <= radius_m:
+                        found.append((distance, key, item))
+        found.sort(key=lambda hit: hit[0])
+        return found
+
+    def nearest(self, lat, lng, count=1, max_radius_m=50000):
+        """Up to ``count`` closest points no further than ``max_radius_m``"""
+        radius = self.cell_m
+        while True:
+            radius = min(radius, max_radius_m)
+            found = self.within(lat, lng, radius)
+            # Everything within ``radius`` is found, so the closest ``count`` of them are exact
+            if len(found) >= count or radius >= max_radius_m or len(found) == len(self):
+                return found[:count]
+            radius *= 4
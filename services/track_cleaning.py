@@ -0,0 +1,386 @@
+"""
+Track cleaning: outlier rejection and Kalman smoothing of GPS fixes.
+
+Each employee's fixes run through a constant-velocity Kalman filter in a
+local east/north plane (metres), with the reported accuracy as measurement
+noise. Before a fix updates the filter it must pass two gates:
+
+* speed: the distance from the previous position, less the fix's accuracy,
+  must not imply more than GPS_MAX_SPEED_KMH;
+* acceleration: the part of the jump away from the predicted position that
+  the filter's uncertainty cannot explain must not imply more than
+  GPS_MAX_ACCELERATION_MS2.
+
+Rejected fixes are kept but flagged ``is_outlier`` and never count towards
+distances or positions. After GPS_KALMAN_MAX_REJECTS rejections in a row,
+or a gap of GPS_KALMAN_RESET_S, the filter restarts at the next fix, so a
+real jump (e.g. after a tunnel) is accepted shortly after.
+
+Two entry points:
+
+* ``StreamingCleaner`` at ingest: forward filter only, state per employee
+  in the shared cache;
+* ``clean_day`` as a batch pass over GPSTrack history: forward filter plus
+  a Rauch-Tung-Striebel backward pass, so every point is smoothed with the
+  fixes after it too. It stores the smoothed coordinates and the day's
+  route summary (GPSRoute with its stops, GPSCheckIn.total_distance_km).
+
+The filter itself is a tight scalar loop (the covariance is the same for
+both axes, so it is tracked once); projection, segmentation and distances
+are vectorized with numpy when it is installed.
+"""
+import logging
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from main_app.date_utils import day_window
+from main_app.models import GPSCheckIn, GPSRoute, GPSTrack
+from services.dwell import rebuild_stops
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - pure Python fallback
+    np = None
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+_DEGREE_M = math.pi / 180 * EARTH_RADIUS_M
+# Velocity variance (m/s)^2 of a freshly started filter: the speed is unknown
+_INITIAL_SPEED_VARIANCE = 10.0 ** 2
+
+Params = namedtuple('Params', 'max_speed accel_limit accel_noise min_accuracy default_accuracy reset_after max_rejects')
+
+# Filter state: position (lat, lng), velocity (east, north m/s), per-axis
+# covariance [[p_pos, p_cross], [p_cross, p_vel]], epoch seconds, rejections in a row
+State = namedtuple('State', 'latitude longitude v_east v_north p_pos p_cross p_vel time rejects')
+
+CleanedTrack = namedtuple('CleanedTrack', 'latitudes longitudes speeds outliers')
+
+
+def filter_params():
+    return Params(
+        max_speed=getattr(settings, 'GPS_MAX_SPEED_KMH', 200) / 3.6,
+        accel_limit=getattr(settings, 'GPS_MAX_ACCELERATION_MS2', 10),
+        accel_noise=getattr(settings, 'GPS_KALMAN_ACCEL_NOISE', 1.5) ** 2,
+        min_accuracy=getattr(settings, 'GPS_KALMAN_MIN_ACCURACY_M', 5),
+        default_accuracy=getattr(settings, 'GPS_KALMAN_DEFAULT_ACCURACY_M', 25),
+        reset_after=getattr(settings, 'GPS_KALMAN_RESET_S', 600),
+        max_rejects=getattr(settings, 'GPS_KALMAN_MAX_REJECTS', 5),
+    )
+
+
+def _variance(accuracy, params):
+    if accuracy is None or accuracy != accuracy:  # missing or NaN
+        accuracy = params.default_accuracy
+    return max(float(accuracy), params.min_accuracy) ** 2
+
+
+def _forward(times, xs, ys, variances, params, start=None):
+    """
+    Forward Kalman pass over projected fixes (metres, epoch seconds).
+
+    ``start`` is an optional (x, y, vx, vy, p_pos, p_cross, p_vel, time,
+    rejects) tuple in the same plane. Returns per-fix lists: filtered states
+    (None for outliers), the predicted covariance before each accepted
+    update (None after a restart), the outlier flags and the final state.
+    """
+    max_speed, accel_limit, q, _, _, reset_after, max_rejects = params
+    filtered = []
+    predicted = []
+    outliers = []
+    state = start
+    for t, zx, zy, r in zip(times, xs, ys, variances):
+        if state is None or t - state[7] > reset_after or state[8] >= max_rejects:
+            state = (zx, zy, 0.0, 0.0, r, 0.0, _INITIAL_SPEED_VARIANCE, t, 0)
+            filtered.append(state)
+            predicted.append(None)
+            outliers.append(False)
+            continue
+        x, y, vx, vy, a, b, c, last, rejects = state
+        dt = max(t - last, 0.5)
+        # Predict with constant velocity; white-noise acceleration of spectral density q
+        px = x + vx * dt
+        py = y + vy * dt
+        pa = a + dt * (2 * b + dt * c) + q * dt ** 3 / 3
+        pb = b + dt * c + q * dt ** 2 / 2
+        pc = c + q * dt
+        s = pa + r
+        moved = math.hypot(zx - x, zy - y) - math.sqrt(r)
+        surprise = math.hypot(zx - px, zy - py) - 3 * math.sqrt(s)
+        if moved > max_speed * dt or 2 * surprise > accel_limit * dt * dt:
+            # Coast on the prediction; the grown covariance widens the gates for the next fix
+            state = (px, py, vx, vy, pa, pb, pc, t, rejects + 1)
+            filtered.append(None)
+            predicted.append(None)
+            outliers.append(True)
+            continue
+        k_pos = pa / s
+        k_vel = pb / s
+        ix = zx - px
+        iy = zy - py
+        state = (px + k_pos * ix, py + k_pos * iy, vx + k_vel * ix, vy + k_vel * iy,
+                 (1 - k_pos) * pa, (1 - k_pos) * pb, pc - k_vel * pb, t, 0)
+        filtered.append(state)
+        predicted.append((pa, pb, pc))
+        outliers.append(False)
+    return filtered, predicted, outliers, state
+
+
+def _smooth(filtered, predicted):
+    """Rauch-Tung-Striebel backward pass; smoothed (x, y, vx, vy) per accepted fix, None for outliers"""
+    smoothed = [None] * len(filtered)
+    after = None  # index of the next accepted fix
+    for i in range(len(filtered) - 1, -1, -1):
+        state = filtered[i]
+        if state is None:
+            continue
+        x, y, vx, vy, a, b, c, t = state[:8]
+        if after is None or predicted[after] is None:
+            # Last fix of a segment: the filtered state already saw everything
+            smoothed[i] = (x, y, vx, vy)
+            after = i
+            continue
+        dt = max(filtered[after][7] - t, 0.5)
+        pa, pb, pc = predicted[after]
+        det = pa * pc - pb * pb
+        # Gain C = P F' inv(P_pred), with P F' = [[a + b dt, b], [b + c dt, c]]
+        u00, u01, u10, u11 = a + b * dt, b, b + c * dt, c
+        g00 = (u00 * pc - u01 * pb) / det
+        g01 = (u01 * pa - u00 * pb) / det
+        g10 = (u10 * pc - u11 * pb) / det
+        g11 = (u11 * pa - u10 * pb) / det
+        sx, sy, svx, svy = smoothed[after]
+        dx, dvx = sx - (x + vx * dt), svx - vx
+        dy, dvy = sy - (y + vy * dt), svy - vy
+        smoothed[i] = (x + g00 * dx + g01 * dvx, y + g00 * dy + g01 * dvy,
+                       vx + g10 * dx + g11 * dvx, vy + g10 * dy + g11 * dvy)
+        after = i
+    return smoothed
+
+
+def _origin(latitudes, longitudes):
+    return latitudes[0], longitudes[0], math.cos(math.radians(latitudes[0]))
+
+
+def _project(latitudes, longitudes, origin):
+    lat0, lng0, scale = origin
+    if np is not None:
+        return ((np.asarray(longitudes) - lng0) * (scale * _DEGREE_M)).tolist(), \
+               ((np.asarray(latitudes) - lat0) * _DEGREE_M).tolist()
+    return [(lng - lng0) * scale * _DEGREE_M for lng in longitudes], \
+           [(lat - lat0) * _DEGREE_M for lat in latitudes]
+
+
+def _unproject(x, y, origin):
+    lat0, lng0, scale = origin
+    return lat0 + y / _DEGREE_M, lng0 + x / (scale * _DEGREE_M)
+
+
+def _segments(times, reset_after):
+    """(start, end) slices of ``times`` split at gaps longer than ``reset_after``"""
+    if not times:
+        return []
+    if np is not None:
+        cuts = (np.flatnonzero(np.diff(np.asarray(times)) > reset_after) + 1).tolist()
+    else:
+        cuts = [i for i in range(1, len(times)) if times[i] - times[i - 1] > reset_after]
+    bounds = [0] + cuts + [len(times)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def clean_track(times, latitudes, longitudes, accuracies, params=None, smooth=True):
+    """
+    Clean one employee's fixes, sorted by time (epoch seconds, degrees,
+    metres; accuracy may be None). Returns a CleanedTrack of per-fix lists:
+    smoothed latitude/longitude and speed (km/h) — None for outliers — and
+    the outlier flags. ``smooth=False`` skips the backward pass.
+    """
+    params = params or filter_params()
+    cleaned = CleanedTrack([None] * len(times), [None] * len(times), [None] * len(times), [False] * len(times))
+    for start, end in _segments(times, params.reset_after):
+        # Project each segment around its own first fix so the flat-earth error stays small
+        origin = _origin(latitudes[start:end], longitudes[start:end])
+        xs, ys = _project(latitudes[start:end], longitudes[start:end], origin)
+        variances = [_variance(accuracy, params) for accuracy in accuracies[start:end]]
+        filtered, predicted, outliers, _ = _forward(times[start:end], xs, ys, variances, params)
+        states = _smooth(filtered, predicted) if smooth else filtered
+        for offset, state in enumerate(states):
+            i = start + offset
+            cleaned.outliers[i] = outliers[offset]
+            if state is not None:
+                cleaned.latitudes[i], cleaned.longitudes[i] = _unproject(state[0], state[1], origin)
+                cleaned.speeds[i] = math.hypot(state[2], state[3]) * 3.6
+    return cleaned
+
+
+def path_length(latitudes, longitudes):
+    """Haversine length in metres of a path; None entries (outliers) are skipped"""
+    points = [(lat, lng) for lat, lng in zip(latitudes, longitudes) if lat is not None]
+    if len(points) < 2:
+        return 0.0
+    if np is not None:
+        lat, lng = np.radians(np.asarray(points, dtype=float)).T
+        a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+        return float(2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0))).sum())
+    total = 0.0
+    for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+        lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        total += 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+    return total
+
+
+def _state_key(employee_id):
+    return f"gps:kalman:{employee_id}"
+
+
+class StreamingCleaner:
+    """Forward filter for one employee's fixes at ingest; call ``update`` per fix in time order, then ``save``"""
+
+    def __init__(self, employee_id, params=None):
+        self.employee_id = employee_id
+        self.params = params or filter_params()
+        self.state = cache.get(_state_key(employee_id))
+        self._changed = False
+
+    def update(self, fix, timestamp):
+        """Set ``smoothed_latitude``/``smoothed_longitude``/``is_outlier`` on ``fix``; True unless it is an outlier"""
+        t = timestamp.timestamp()
+        start = None
+        state = self.state
+        if state is not None:
+            origin = _origin([state.latitude], [state.longitude])
+            start = (0.0, 0.0, state.v_east, state.v_north, state.p_pos, state.p_cross, state.p_vel,
+                     state.time, state.rejects)
+        else:
+            origin = _origin([fix['latitude']], [fix['longitude']])
+        (x,), (y,) = _project([fix['latitude']], [fix['longitude']], origin)
+        filtered, _, outliers, end = _forward(
+            [t], [x], [y], [_variance(fix.get('accuracy'), self.params)], self.params, start
+        )
+        latitude, longitude = _unproject(end[0], end[1], origin)
+        self.state = State(latitude, longitude, *end[2:])
+        self._changed = True
+        fix['is_outlier'] = outliers[0]
+        if filtered[0] is None:
+            fix['smoothed_latitude'] = fix['smoothed_longitude'] = None
+            return False
+        fix['smoothed_latitude'], fix['smoothed_longitude'] = round(latitude, 6), round(longitude, 6)
+        return True
+
+    def save(self):
+        if self._changed:
+            cache.set(_state_key(self.employee_id), self.state, getattr(settings, 'GPS_FILTER_STATE_TTL', 43200))
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def clean_tracks(queryset, params=None):
+    """
+    Smooth the fixes of ``queryset`` (one employee) and store the result on
+    the rows that changed. Returns the rows as (timestamp, latitude,
+    longitude, speed_kmh, is_outlier) tuples in time order, with the
+    smoothed position (None for outliers).
+    """
+    rows = list(queryset.order_by('timestamp', 'id').values_list(
+        'id', 'timestamp', 'latitude', 'longitude', 'accuracy',
+        'smoothed_latitude', 'smoothed_longitude', 'is_outlier',
+    ))
+    if not rows:
+        return []
+    cleaned = clean_track(
+        [row[1].timestamp() for row in rows],
+        [float(row[2]) for row in rows],
+        [float(row[3]) for row in rows],
+        [row[4] for row in rows],
+        params,
+    )
+    changed = []
+    for row, latitude, longitude, outlier in zip(rows, cleaned.latitudes, cleaned.longitudes, cleaned.outliers):
+        if latitude is not None:
+            latitude, longitude = round(latitude, 6), round(longitude, 6)
+        if (latitude, longitude, outlier) != (_float(row[5]), _float(row[6]), row[7]):
+            changed.append(GPSTrack(id=row[0], smoothed_latitude=latitude, smoothed_longitude=longitude,
+                                    is_outlier=outlier))
+    if changed:
+        GPSTrack.objects.bulk_update(changed, ['smoothed_latitude', 'smoothed_longitude', 'is_outlier'],
+                                     batch_size=1000)
+    return [(row[1], latitude, longitude, speed, outlier) for row, latitude, longitude, speed, outlier
+            in zip(rows, cleaned.latitudes, cleaned.longitudes, cleaned.speeds, cleaned.outliers)]
+
+
+def route_summary(points):
+    """Distance, speeds and stored coordinates of cleaned points (see ``clean_tracks``)"""
+    kept = [point for point in points if not point[4]]
+    if not kept:
+        return None
+    distance_km = path_length([point[1] for point in kept], [point[2] for point in kept]) / 1000
+    hours = (kept[-1][0] - kept[0][0]).total_seconds() / 3600
+    return {
+        'start_time': kept[0][0],
+        'end_time': kept[-1][0],
+        'total_distance_km': round(distance_km, 3),
+        'avg_speed_kmh': round(distance_km / hours, 1) if hours else 0,
+        'max_speed_kmh': round(max(point[3] for point in kept), 1),
+        'route_points': [
+            {'lat': point[1], 'lng': point[2], 'timestamp': point[0].isoformat()} for point in kept
+        ],
+    }
+
+
+def clean_day(employee_id, day, params=None):
+    """
+    Batch-clean an employee's fixes of one local day and store the route
+    summary: the day's GPSRoute, its stops (services.dwell) and the distance
+    of each check-in, all measured on the smoothed track. Returns the
+    GPSRoute, or None without fixes.
+    """
+    with transaction.atomic():
+        points = clean_tracks(GPSTrack.objects.for_day(day).filter(employee_id=employee_id), params)
+        summary = route_summary(points)
+        if summary is None:
+            return None
+        summary['stops_count'] = rebuild_stops(employee_id, day, points)
+        route, _ = GPSRoute.objects.update_or_create(employee_id=employee_id, date=day, defaults=summary)
+        day_end = day_window(day)[1]
+        for checkin in GPSCheckIn.objects.for_day(day).filter(employee_id=employee_id):
+            end = checkin.check_out_time or day_end
+            window = [point for point in points if checkin.check_in_time <= point[0] <= end]
+            distance_km = round(path_length([point[1] for point in window if not point[4]],
+                                            [point[2] for point in window if not point[4]]) / 1000, 3)
+            if distance_km != checkin.total_distance_km:
+                checkin.total_distance_km = distance_km
+                checkin.save(update_fields=['total_distance_km', 'updated_at'])
+    return route
+
+
+def clean_days(day, employee_ids=None):
+    """``clean_day`` for every employee with fixes on ``day`` (or just ``employee_ids``); returns the count"""
+    queryset = GPSTrack.objects.for_day(day)
+    if employee_ids is not None:
+        queryset = queryset.filter(employee_id__in=employee_ids)
+    cleaned = 0
+    for employee_id in queryset.order_by().values_list('employee_id', flat=True).distinct():
+        if clean_day(employee_id, day) is not None:
+            cleaned += 1
+    return cleaned
+
+
+def schedule_clean_day(employee_id, day):
+    """Clean the day in a worker once the fixes still in the ingest buffer have been written"""
+    try:
+        from api.tasks import clean_gps_tracks
+        clean_gps_tracks.apply_async(
+            kwargs={'day': day.isoformat(), 'employee_ids': [employee_id]},
+            countdown=getattr(settings, 'GPS_CLEAN_DELAY', 30), retry=False,
+        )
+    except Exception as e:
+        # The periodic beat run cleans the day if the broker is unavailable
+        logger.warning("Could not schedule GPS track cleaning for employee %s: %s", employee_id, e)